@@ -5,6 +5,14 @@
 #define BaudRate      (1000000ul)
 #define ID            (4u)
 
+// Binary frames (see serial_protocol.py): 0xFF 0xFF seq type len payload[len] checksum
+#define FRAME_SETPOINT (0x01)
+#define FRAME_ACK      (0x81)
+#define FRAME_NAK      (0x82)
+#define MAX_PAYLOAD    (24)
+#define ERROR_RANGE    (1)
+#define ERROR_CHECKSUM (2)
+
 int target_pos = 512; // Initial position
 const int MIN_POS = 0;   // Minimum position for AX-12A
 const int MAX_POS = 1023; // Maximum position for AX-12A
@@ -13,6 +21,10 @@ const int MAX_POS = 1023; // Maximum position for AX-12A
 String inputString = ""; // String to hold incoming serial data
 bool stringComplete = false; // Flag for completed input
 
+byte frame[MAX_PAYLOAD + 6]; // Buffer for an incoming binary frame
+byte frameLen = 0; // Bytes of the frame received so far
+bool frameComplete = false; // Flag for completed frame
+
 void setup()
 {
   Serial.begin(BaudRate); // Start Serial at AX-12A baud rate
@@ -24,11 +36,95 @@ void setup()
   Serial.println("Enter a position (0 to 1023 or negative for reverse):");
 }
 
+void moveMotor(int new_pos)
+{
+  // Switch Serial to AX-12A baud rate
+  Serial.end();
+  Serial.begin(BaudRate);
+
+  target_pos = new_pos;
+  ax12a.move(ID, target_pos); // Move motor to the target position
+  delay(50); // Allow motor to move
+
+  // Switch back to Serial Monitor baud rate
+  Serial.end();
+  Serial.begin(9600);
+}
+
+void sendReply(byte seq, byte type, const byte *payload, byte len)
+{
+  byte sum = seq + type + len;
+  Serial.write(0xFF);
+  Serial.write(0xFF);
+  Serial.write(seq);
+  Serial.write(type);
+  Serial.write(len);
+  for (byte i = 0; i < len; i++) {
+    Serial.write(payload[i]);
+    sum += payload[i];
+  }
+  Serial.write((byte)~sum);
+}
+
+void processFrame()
+{
+  byte seq = frame[2];
+  byte len = frame[4];
+  byte sum = 0;
+  for (byte i = 2; i < 5 + len; i++) {
+    sum += frame[i];
+  }
+  if ((byte)~sum != frame[5 + len]) {
+    byte nak[2] = {ID, ERROR_CHECKSUM};
+    sendReply(seq, FRAME_NAK, nak, 2);
+    return;
+  }
+  if (frame[3] != FRAME_SETPOINT) {
+    return;
+  }
+
+  // Payload holds (id, position lo, position hi) entries; act on our own ID only
+  for (byte i = 5; i + 2 < 5 + len; i += 3) {
+    if (frame[i] != ID) {
+      continue;
+    }
+    int new_pos = frame[i + 1] | (frame[i + 2] << 8);
+    if (new_pos >= MIN_POS && new_pos <= MAX_POS) {
+      moveMotor(new_pos);
+      byte ack[3] = {ID, lowByte(target_pos), highByte(target_pos)};
+      sendReply(seq, FRAME_ACK, ack, 3);
+    } else {
+      byte nak[2] = {ID, ERROR_RANGE};
+      sendReply(seq, FRAME_NAK, nak, 2);
+    }
+  }
+}
+
 void loop()
 {
   // Read input from Serial Monitor
   while (Serial.available()) {
-    char inChar = (char)Serial.read();
+    byte inByte = Serial.read();
+
+    // 0xFF never appears in text input, so it marks the start of a binary frame
+    if (frameLen > 0 || (inByte == 0xFF && inputString.length() == 0)) {
+      if (frameLen == 1 && inByte != 0xFF) {
+        frameLen = 0; // Not a frame header, resynchronize
+        continue;
+      }
+      frame[frameLen++] = inByte;
+      if (frameLen == 5 && frame[4] > MAX_PAYLOAD) {
+        frameLen = 0; // Corrupt length byte
+        continue;
+      }
+      if (frameLen >= 5 && frameLen == frame[4] + 6) {
+        frameComplete = true;
+        break;
+      }
+      continue;
+    }
+
+    char inChar = (char)inByte;
     if (inChar == '\n') { // Check for newline to complete the input
       stringComplete = true;
       break;
@@ -37,26 +133,23 @@ void loop()
     }
   }
 
+  // Process binary frame if complete
+  if (frameComplete) {
+    processFrame();
+    frameLen = 0;
+    frameComplete = false;
+  }
+
   // Process input if complete
   if (stringComplete) {
-    // Switch Serial to AX-12A baud rate
-    Serial.end();
-    Serial.begin(BaudRate);
-    
     // Convert string to integer
     int new_pos = inputString.toInt();
     
     // Validate the position
     if (new_pos >= MIN_POS && new_pos <= MAX_POS) {
-      target_pos = new_pos;
-      ax12a.move(ID, target_pos); // Move motor to the target position
-      delay(50); // Allow motor to move
+      moveMotor(new_pos);
     }
     
-    // Switch back to Serial Monitor baud rate
-    Serial.end();
-    Serial.begin(9600);
-    
     // Provide feedback
     if (new_pos >= MIN_POS && new_pos <= MAX_POS) {
       Serial.print("Moving to position: ");
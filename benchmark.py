@@ -0,0 +1,275 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+import instrumentation
+from fk_delta import get_xyz, get_xyz_batch
+from ik_delta import get_thetas, get_thetas_batch
+from motor_config import angle_to_position, angles_to_positions
+from serial_engine import ACK_TIMEOUT, SerialEngine
+from serial_protocol import (ERROR_RANGE, FRAME_ACK, FRAME_NAK, FRAME_SETPOINT, Frame, FrameDecoder,
+                             encode_reply, parse_setpoints)
+
+RESULTS_FILE = 'benchmark_results.json'
+BASELINE_FILE = 'benchmark_baseline.json'
+REGRESSION_THRESHOLD = 0.25  # Fail when a benchmark gets more than 25% worse
+BATCH_SIZE = 10000
+COMMANDS = 300  # Round trips per command-path benchmark
+
+# Test cases from the main() functions of fk_delta.py and ik_delta.py
+FK_CASE = (-0.358327, -0.358194, -0.358194)
+FK_EXPECTED_Z = (1.26746, -0.9)
+IK_CASE = (0.0, 0.0, -0.9)
+IK_EXPECTED = ((-0.358327, -2.51816), (-0.358194, -2.51810), (-0.358194, -2.51810))
+
+class FakeSerial:
+    """In-process stand-in for serial.Serial that answers like an Absolute movement sketch"""
+
+    def __init__(self, motor_id):
+        self.motor_id = motor_id
+        self.is_open = True
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._decoder = FrameDecoder()
+        self._cancelled = False
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def _reply(self, data):
+        with self._cond:
+            self._buffer += data
+            self._cond.notify()
+
+    def write(self, data):
+        for item in self._decoder.feed(bytes(data)):
+            if isinstance(item, Frame):
+                if item.type != FRAME_SETPOINT:
+                    continue
+                for motor_id, position in parse_setpoints(item.payload):
+                    if motor_id != self.motor_id:
+                        continue
+                    if 0 <= position <= 1023:
+                        self._reply(encode_reply(item.seq, FRAME_ACK,
+                                                 [motor_id, position & 0xFF, position >> 8]))
+                    else:
+                        self._reply(encode_reply(item.seq, FRAME_NAK, [motor_id, ERROR_RANGE]))
+            elif item.lstrip('-').isdigit() and 0 <= int(item) <= 1023:
+                self._reply(f"Moving to position: {int(item)}\r\nEnter a new position:\r\n".encode('ascii'))
+            else:
+                self._reply(b"Invalid position! Please enter a value between 0 and 1023.\r\n")
+        return len(data)
+
+    def read(self, size=1):
+        with self._cond:
+            if not self._buffer and not self._cancelled:
+                self._cond.wait(timeout=1)
+            self._cancelled = False
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+    def cancel_read(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify()
+
+    def close(self):
+        self.is_open = False
+        self.cancel_read()
+
+def _load_script(filename, name):
+    """Import one of the hyphenated control scripts as a module"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(__file__) or '.', filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _time_call(fn, number, repeat=5):
+    """Best-of-repeat seconds per call of fn()"""
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start_time) / number)
+    return best
+
+def check_correctness():
+    """Guard the benchmarks with the Mathematica test cases; raises AssertionError on mismatch"""
+    results = get_xyz(*FK_CASE)
+    assert results is not None, "get_xyz found no solution for the FK test case"
+    for result, expected_z in zip(results, FK_EXPECTED_Z):
+        assert abs(result['z'] - expected_z) < 1e-4, f"get_xyz z = {result['z']}, expected {expected_z}"
+        # The test-case angles are rounded to 6 digits, which moves the upper branch off-axis slightly
+        assert abs(result['x']) < 1e-3 and abs(result['y']) < 1e-3, f"get_xyz x, y = {result['x']}, {result['y']}"
+
+    result = get_thetas(*IK_CASE)
+    assert result is not None, "get_thetas found no solution for the IK test case"
+    for key, expected in zip(('valθ1_rad', 'valθ2_rad', 'valθ3_rad'), IK_EXPECTED):
+        assert np.allclose(result[key], expected, atol=1e-4), f"{key} = {result[key]}, expected {expected}"
+
+    xyz, valid = get_xyz_batch([FK_CASE])
+    assert valid[0] and np.allclose(xyz[0, :, 2], FK_EXPECTED_Z, atol=1e-4)
+    thetas_rad, _, reachable = get_thetas_batch([IK_CASE])
+    assert reachable[0] and np.allclose(thetas_rad[0], IK_EXPECTED, atol=1e-4)
+
+    assert angle_to_position(0, 3) == 500 and angle_to_position(90, 6) == 800
+    assert angles_to_positions([0, 90], 6).tolist() == [500, 800]
+
+def bench_kinematics(batch_size=BATCH_SIZE):
+    """Single-call latency (s/call) and batch throughput (items/s) for FK and IK"""
+    rng = np.random.default_rng(0)
+    thetas = rng.uniform(-0.6, 0.2, (batch_size, 3))
+    xyz = np.column_stack([rng.uniform(-0.2, 0.2, (batch_size, 2)), rng.uniform(-1.1, -0.7, batch_size)])
+    angles = rng.uniform(-90, 90, batch_size)
+    batch_repeat = 3
+    return {
+        'fk_single': (_time_call(lambda: get_xyz(*FK_CASE), 2000), 's/call'),
+        'fk_batch': (batch_size / _time_call(lambda: get_xyz_batch(thetas), batch_repeat), 'items/s'),
+        'ik_single': (_time_call(lambda: get_thetas(*IK_CASE), 5000), 's/call'),
+        'ik_batch': (batch_size / _time_call(lambda: get_thetas_batch(xyz), batch_repeat), 'items/s'),
+        'angle_to_position': (_time_call(lambda: angle_to_position(45.0, 3), 20000), 's/call'),
+        'angles_to_positions_batch': (batch_size / _time_call(lambda: angles_to_positions(angles, 3),
+                                                              batch_repeat), 'items/s'),
+    }
+
+def _fake_ports(ports):
+    for info in ports.values():
+        info['ser'] = FakeSerial(info['id'])
+
+def bench_command_path(commands=COMMANDS):
+    """validate_angles cost and send_positions round trips against FakeSerial ports"""
+    script = _load_script('degree-based-motor-control.py', 'degree_based_motor_control')
+    assert script.validate_angles(['45', '-30', '90']) == (True, [45.0, -30.0, 90.0])
+    assert not script.validate_angles(['45', '-30', '91'])[0]
+    results = {'validate_angles': (_time_call(lambda: script.validate_angles(['45', '-30', '90']), 20000),
+                                   's/call')}
+
+    _fake_ports(script.PORTS)
+    script.ENGINE.start()
+    try:
+        start_time = time.perf_counter()
+        for i in range(commands):
+            futures = script.send_positions([i % 90, -(i % 90), 45.0])
+            wait(futures.values(), timeout=ACK_TIMEOUT)
+            assert all(f.done() and f.exception() is None for f in futures.values())
+        results['send_positions_ascii'] = ((time.perf_counter() - start_time) / commands, 's/call')
+    finally:
+        script.ENGINE.stop()
+
+    ports = {port: dict(info) for port, info in script.PORTS.items()}
+    _fake_ports(ports)
+    with SerialEngine(ports, protocol='binary') as engine:
+        start_time = time.perf_counter()
+        for i in range(commands):
+            futures = engine.submit_all({port: i % 1024 for port in ports})
+            wait(futures.values(), timeout=ACK_TIMEOUT)
+            assert all(f.result() == i % 1024 for f in futures.values())
+        results['send_positions_binary'] = ((time.perf_counter() - start_time) / commands, 's/call')
+    return results
+
+def run_benchmarks():
+    """Run the correctness guards and every benchmark; returns a JSON-ready dict
+
+    With instrumentation enabled, the per-stage span breakdown is included
+    under 'instrumentation' (the timings then include its overhead).
+    """
+    check_correctness()
+    instrumentation.reset()
+    results = {}
+    results.update(bench_kinematics())
+    results.update(bench_command_path())
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'results': {name: {'value': value, 'unit': unit} for name, (value, unit) in results.items()},
+    }
+    if instrumentation.is_enabled():
+        report['instrumentation'] = instrumentation.snapshot()
+    return report
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """List (name, baseline, current, change) for benchmarks that got worse by more than threshold
+
+    change is the relative slowdown: time per call up, or throughput down.
+    """
+    regressions = []
+    for name, entry in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        old, new = baseline['results'][name]['value'], entry['value']
+        if entry['unit'] == 'items/s':
+            change = old / new - 1 if new > 0 else float('inf')
+        else:
+            change = new / old - 1 if old > 0 else 0.0
+        if change > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+def _format(value, unit):
+    if unit == 's/call':
+        return f"{value * 1e6:12.2f} µs/call"
+    return f"{value:12.0f} items/s"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the kinematics and the serial command path")
+    parser.add_argument('--output', default=RESULTS_FILE, help="where to write this run's results")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="results file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed relative slowdown before failing (default 0.25)")
+    parser.add_argument('--instrument', action='store_true',
+                        help="record per-stage spans and counters into the results")
+    args = parser.parse_args()
+    if args.instrument:
+        instrumentation.enable()
+
+    try:
+        current = run_benchmarks()
+    except AssertionError as e:
+        print(f"Correctness check failed: {e}")
+        sys.exit(2)
+
+    for name, entry in current['results'].items():
+        print(f"{name:28s}{_format(entry['value'], entry['unit'])}")
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    for name, old, new, change in regressions:
+        unit = current['results'][name]['unit']
+        print(f"REGRESSION {name}: {_format(old, unit).strip()} -> {_format(new, unit).strip()} "
+              f"({change:+.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
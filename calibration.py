@@ -0,0 +1,159 @@
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+from motor_config import MAX_POS, MIN_POS, TABLE_STEP, TABLES_FILE, table_angles
+
+CALIBRATION_FILE = 'calibration.json'
+POLYNOMIAL_DEGREE = 3
+KINDS = ('linear', 'polynomial', 'piecewise')
+
+# A calibration model is a JSON-ready dict:
+#   {'kind': 'linear' | 'polynomial', 'coefficients': [...]}  highest power first, as np.polyval
+#   {'kind': 'piecewise', 'knots': [...], 'positions': [...]}  linear between knots, extrapolated past the ends
+
+def load_measurements(path):
+    """{motor_id: (angles, positions)} from a CSV of motor_id, angle, position rows (header optional)"""
+    rows = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip():
+                continue
+            try:
+                motor_id, angle, position = int(row[0]), float(row[1]), float(row[2])
+            except ValueError:
+                continue  # Header or comment line
+            rows.setdefault(motor_id, []).append((angle, position))
+    return {motor_id: tuple(np.array(column) for column in zip(*pairs)) for motor_id, pairs in rows.items()}
+
+def fit_linear(angles, positions):
+    return fit_polynomial(angles, positions, 1)
+
+def fit_polynomial(angles, positions, degree=POLYNOMIAL_DEGREE):
+    """Least-squares polynomial of the given degree"""
+    if len(np.unique(angles)) <= degree:
+        raise ValueError(f"a degree-{degree} fit needs at least {degree + 1} distinct angles")
+    kind = 'linear' if degree == 1 else 'polynomial'
+    return {'kind': kind, 'coefficients': np.polyfit(angles, positions, degree).tolist()}
+
+def fit_piecewise(angles, positions, knots=None):
+    """Piecewise-linear map
+
+    Without knots, the map passes through the mean position measured at each
+    angle. With knots (angles in degrees), the knot positions are a least-
+    squares fit to all measurements, which smooths out noisy readings.
+    """
+    angles = np.asarray(angles, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    if knots is None:
+        knots, inverse = np.unique(angles, return_inverse=True)
+        values = np.bincount(inverse, positions) / np.bincount(inverse)
+    else:
+        knots = np.unique(np.asarray(knots, dtype=float))
+        # Column k is the hat function that is 1 at knot k and 0 at its neighbours
+        basis = _interp(angles, knots, np.eye(len(knots)))
+        values = np.linalg.lstsq(basis, positions, rcond=None)[0]
+    if len(knots) < 2:
+        raise ValueError("a piecewise fit needs at least 2 distinct angles")
+    return {'kind': 'piecewise', 'knots': knots.tolist(), 'positions': np.asarray(values).tolist()}
+
+def _interp(x, knots, values):
+    """Linear interpolation between knots, extended linearly past both ends; values may be (K,) or (K, M)"""
+    i = np.clip(np.searchsorted(knots, x) - 1, 0, len(knots) - 2)
+    t = (x - knots[i]) / (knots[i + 1] - knots[i])
+    if values.ndim > 1:
+        t = t[..., None]
+    return (1 - t) * values[i] + t * values[i + 1]
+
+def fit(angles, positions, kind='piecewise', degree=POLYNOMIAL_DEGREE, knots=None):
+    if kind == 'linear':
+        return fit_linear(angles, positions)
+    if kind == 'polynomial':
+        return fit_polynomial(angles, positions, degree)
+    if kind == 'piecewise':
+        return fit_piecewise(angles, positions, knots)
+    raise ValueError(f"unknown calibration kind {kind!r}")
+
+def evaluate(model, angles):
+    """Unrounded positions for angles in degrees"""
+    angles = np.asarray(angles, dtype=float)
+    if model['kind'] == 'piecewise':
+        return _interp(angles, np.array(model['knots']), np.array(model['positions']))
+    return np.polyval(model['coefficients'], angles)
+
+def compile_table(model, step=TABLE_STEP):
+    """Integer lookup table (int16) for motor_config: rounded, clamped positions every step degrees
+
+    Raises ValueError if the map is not monotonic over the joint range, since
+    two angles would then share a position.
+    """
+    positions = evaluate(model, table_angles(step))
+    slopes = np.diff(positions)
+    if not (np.all(slopes > 0) or np.all(slopes < 0)):
+        raise ValueError(f"{model['kind']} calibration is not monotonic between the joint limits")
+    return np.clip(np.rint(positions), MIN_POS, MAX_POS).astype(np.int16)
+
+def residuals(model, angles, positions, step=TABLE_STEP):
+    """Fit error against measurements, in positions
+
+    'rms' and 'max' are for the model itself; 'table_max' also includes the
+    rounding and angle quantization of the compiled lookup table.
+    """
+    angles = np.asarray(angles, dtype=float)
+    error = evaluate(model, angles) - positions
+    table = compile_table(model, step)
+    index = np.clip(np.rint((angles - table_angles(step)[0]) / step), 0, len(table) - 1).astype(np.intp)
+    return {
+        'count': len(angles),
+        'rms': float(np.sqrt(np.mean(error ** 2))),
+        'max': float(np.max(np.abs(error))),
+        'table_max': float(np.max(np.abs(table[index] - positions))),
+    }
+
+def save_calibration(path, models):
+    with open(path, 'w') as f:
+        json.dump({str(motor_id): model for motor_id, model in sorted(models.items())}, f, indent=2)
+
+def load_calibration(path=CALIBRATION_FILE):
+    """{motor_id: model} from a file written by save_calibration"""
+    with open(path) as f:
+        return {int(motor_id): model for motor_id, model in json.load(f).items()}
+
+def save_tables(path, models, step=TABLE_STEP):
+    """Compile every model and write the tables for motor_config.load_position_tables"""
+    tables = {f"motor_{motor_id}": compile_table(model, step) for motor_id, model in models.items()}
+    np.savez(path, step=step, **tables)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit per-motor angle-to-position calibrations from measurements")
+    parser.add_argument('measurements', help="CSV of motor_id, angle (degrees), position rows")
+    parser.add_argument('--kind', choices=KINDS, default='piecewise', help="model to fit (default piecewise)")
+    parser.add_argument('--degree', type=int, default=POLYNOMIAL_DEGREE, help="polynomial degree (default 3)")
+    parser.add_argument('--knots', type=int,
+                        help="piecewise: evenly spaced knots over the measured range instead of one per angle")
+    parser.add_argument('--output', default=CALIBRATION_FILE, help="models file (default calibration.json)")
+    parser.add_argument('--tables', default=TABLES_FILE,
+                        help="compiled lookup tables loaded by motor_config (default calibration_tables.npz next to motor_config.py)")
+    args = parser.parse_args()
+
+    try:
+        measurements = load_measurements(args.measurements)
+        models = {}
+        for motor_id, (angles, positions) in sorted(measurements.items()):
+            knots = np.linspace(angles.min(), angles.max(), args.knots) if args.knots else None
+            models[motor_id] = fit(angles, positions, args.kind, args.degree, knots)
+            report = residuals(models[motor_id], angles, positions)
+            print(f"Motor ID {motor_id}: {report['count']} points, rms {report['rms']:.2f}, "
+                  f"max {report['max']:.2f}, table max {report['table_max']:.2f} positions")
+        save_calibration(args.output, models)
+        save_tables(args.tables, models)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Models written to {args.output}, lookup tables to {args.tables}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import time
+
+import sympy as sym
+
+GENERATED_FILE = 'kinematics_generated.py'
+
+# Geometry from data (In[2]), exact so the derivation stays rational
+DEFAULT_GEOMETRY = {
+    'sp': sym.Rational(19, 250),
+    'L': sym.Rational(131, 250),
+    'l': sym.Rational(311, 250),
+    'wb': sym.Rational(41, 250),
+    'wp': sym.Rational(11, 500),
+    'up': sym.Rational(11, 250),
+    'sb': sym.Rational(567, 1000),
+    'ub': sym.Rational(327, 1000),
+}
+GEOMETRY_NAMES = list(DEFAULT_GEOMETRY)
+
+x, y, z = sym.symbols('x y z')
+cos_t = sym.symbols('c1:4')
+sin_t = sym.symbols('s1:4')
+
+def arm_constraints(g):
+    """F_i = |q_i|^2 + L^2 - l^2 - 2L (q_i·u_i) cos(θi) + 2L z sin(θi) for the three arms (In[72]-In[74])"""
+    rz = sym.Matrix([
+        [-sym.Rational(1, 2), -sym.sqrt(3)/2, 0],
+        [sym.sqrt(3)/2, -sym.Rational(1, 2), 0],
+        [0, 0, 1],
+    ])
+    b1 = sym.Matrix([0, -g['wb'], 0])
+    bases = [b1, rz * b1, rz * rz * b1]
+    platform = [sym.Matrix([0, -g['up'], 0]),
+                sym.Matrix([g['sp']/2, g['wp'], 0]),
+                sym.Matrix([-g['sp']/2, g['wp'], 0])]
+    position = sym.Matrix([x, y, z])
+    constraints = []
+    for base, joint, c, s in zip(bases, platform, cos_t, sin_t):
+        q = position + joint - base
+        w = q.dot(base / g['wb'])
+        constraints.append(sym.expand(q.dot(q) + g['L']**2 - g['l']**2 - 2*g['L']*w*c + 2*g['L']*z*s))
+    return constraints
+
+def derive_ik(g):
+    """A_i t^2 + C_i t + B_i = 0 in t = tan(θi/2) for each arm, as {name: expression} in x, y, z"""
+    exprs = {}
+    for i, f in enumerate(arm_constraints(g), 1):
+        c, s = cos_t[i - 1], sin_t[i - 1]
+        # cos = (1 - t^2) / (1 + t^2), sin = 2t / (1 + t^2), times (1 + t^2)
+        k, w2l, zl = f.coeff(c, 0).coeff(s, 0), -f.coeff(c), f.coeff(s)
+        exprs[f'A{i}'] = sym.expand(k + w2l)
+        exprs[f'B{i}'] = sym.expand(k - w2l)
+        exprs[f'C{i}'] = sym.expand(2*zl)
+    return exprs
+
+def _linear(expr):
+    """[gx, gy, gz, g0] of an expression that is linear in x, y, z"""
+    poly = sym.Poly(sym.expand(expr), x, y, z)
+    if poly.total_degree() > 1:
+        raise ValueError(f"{expr} is not linear in x, y, z")
+    return [poly.coeff_monomial(x), poly.coeff_monomial(y), poly.coeff_monomial(z), poly.coeff_monomial(1)]
+
+def derive_coefficients(g):
+    """Coefficient tables for the NumPy batch solvers, exact
+
+    FK: F_i - |P|^2 split into [constant, cos(θi), sin(θi)] parts, each
+    [gx, gy, gz, g0] (the layout of fk_delta.fk_coefficients). IK: A_i and
+    B_i of derive_ik as |P|^2 + k·P + k0, the layout of ik_delta.ik_coefficients.
+    """
+    norm = x**2 + y**2 + z**2
+    ik = derive_ik(g)
+    fk, tables = [], {'kA': [], 'kA0': [], 'kB': [], 'kB0': []}
+    for i, f in enumerate(arm_constraints(g)):
+        c, s = cos_t[i], sin_t[i]
+        fk.append([_linear(f.coeff(c, 0).coeff(s, 0) - norm), _linear(f.coeff(c)), _linear(f.coeff(s))])
+        for name in 'AB':
+            *k, k0 = _linear(ik[f'{name}{i + 1}'] - norm)
+            tables[f'k{name}'].append(k)
+            tables[f'k{name}0'].append(k0)
+    return fk, tables
+
+def _array(values, indent=''):
+    """numpy.array(...) source for a nested list of SymPy numbers, one line per top-level row"""
+    def text(value):
+        if isinstance(value, list):
+            return '[' + ', '.join(text(v) for v in value) + ']'
+        return repr(float(sym.N(value, 17)))
+    if not isinstance(values[0], list):
+        return f"numpy.array({text(values)})"
+    rows = [f"{indent}    {text(row)}," for row in values]
+    return "\n".join(["numpy.array(["] + rows + [f"{indent}])"])
+
+def _emit(exprs, printer, indent='    ', prefix='_t'):
+    """Assignment lines for a {name: expression} dict after common-subexpression elimination"""
+    names = list(exprs)
+    numeric = [sym.N(exprs[name], 17) for name in names]
+    replacements, reduced = sym.cse(numeric, symbols=sym.numbered_symbols(prefix), optimizations='basic')
+    lines = [f"{indent}{symbol} = {printer.doprint(value)}" for symbol, value in replacements]
+    lines += [f"{indent}{name} = {printer.doprint(value)}" for name, value in zip(names, reduced)]
+    return lines
+
+def generate(g=None):
+    """Source of the kinematics module for geometry g (default: In[2]); needs only NumPy at runtime"""
+    from sympy.printing.pycode import PythonCodePrinter
+
+    g = dict(DEFAULT_GEOMETRY, **(g or {}))
+    g = {name: sym.nsimplify(value, rational=True) for name, value in g.items()}
+    scalar = PythonCodePrinter({'fully_qualified_modules': True})
+    ik = derive_ik(g)
+    fk, tables = derive_coefficients(g)
+
+    out = [
+        "# Generated by codegen_delta.py; do not edit.",
+        "# Regenerate after a geometry change: python codegen_delta.py --L 0.524 ...",
+        "import math",
+        "",
+        "import numpy",
+        "",
+        "GEOMETRY = {",
+    ]
+    out += [f"    {name!r}: {float(g[name])!r},  # {g[name]}" for name in GEOMETRY_NAMES]
+    out += ["}", ""]
+
+    out += ["# eq1-eq3 as |P|^2 + [gx, gy, gz, g0]·[x, y, z, 1], per joint split into",
+            "# [constant, cos(theta_i), sin(theta_i)] parts; used by fk_delta.get_xyz_batch",
+            f"FK_COEFFS = {_array(fk)}",
+            "",
+            "# A_i, B_i = |P|^2 + k·P + k0 of the tan(theta_i/2) quadratics, C_i = 4 L z;",
+            "# (kA, kA0, kB, kB0, L) as used by ik_delta.get_thetas_batch",
+            "IK_COEFFS = ("]
+    out += [f"    {_array(tables[name], indent='    ')}," for name in ('kA', 'kA0', 'kB', 'kB0')]
+    out += [f"    {float(g['L'])!r},", ")", ""]
+
+    for i in (1, 2, 3):
+        arm = {name[0]: expr for name, expr in ik.items() if name[1:] == str(i)}
+        out += [f"def ik_theta{i}(x, y, z):",
+                f'    """Both candidate θ{i} (radians) for a scalar x, y, z, or None if unreachable"""']
+        out += _emit(arm, scalar)
+        out += ["    discriminant = C**2 - 4*A*B",
+                "    if discriminant < 0:",
+                "        return None",
+                "    root = math.sqrt(discriminant)",
+                "    return [2*math.atan((-C - root) / (2*A)), 2*math.atan((-C + root) / (2*A))]",
+                ""]
+
+    return "\n".join(out)
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive the FK/IK coefficients and IK solvers for a geometry and emit the module the solvers import")
+    for name in GEOMETRY_NAMES:
+        parser.add_argument(f'--{name}', type=float, help=f"{name} in meters (default {float(DEFAULT_GEOMETRY[name])})")
+    parser.add_argument('-o', '--output', default=GENERATED_FILE, help=f"default {GENERATED_FILE}")
+    args = parser.parse_args()
+
+    geometry = {name: getattr(args, name) for name in GEOMETRY_NAMES if getattr(args, name) is not None}
+    start_time = time.time()
+    source = generate(geometry)
+    with open(args.output, 'w', newline='\r\n') as f:
+        f.write(source)
+    print(f"Wrote {args.output} in {time.time() - start_time:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,22 @@
-import serial
-import time
-import threading
+from concurrent.futures import wait
+
+import instrumentation
+import motion_log
+from serial_engine import SerialEngine, ACK_TIMEOUT
+from serial_manager import ConnectionManager
+from motor_config import BAUD_RATE, MIN_POS, MAX_POS, make_ports
 
 # Define COM ports and their corresponding motor IDs
-PORTS = {
-    'COM11': {'id': 4, 'ser': None},
-    'COM12': {'id': 3, 'ser': None},
-    'COM15': {'id': 6, 'ser': None}
-}
-BAUD_RATE = 9600
-MIN_POS = 0
-MAX_POS = 1023
+PORTS = make_ports()
+
+# Shared connection manager and persistent per-port sender threads, started in main()
+MANAGER = ConnectionManager(PORTS, BAUD_RATE)
+ENGINE = SerialEngine(PORTS, on_error=MANAGER.mark_failed)
 
 def initialize_serial_ports():
-    """Initialize serial connections for all COM ports."""
-    for port in PORTS:
-        try:
-            PORTS[port]['ser'] = serial.Serial(port, BAUD_RATE, timeout=1)
-            time.sleep(3)  # Increased delay for Arduino reset
-            PORTS[port]['ser'].flushInput()  # Clear input buffer
-            print(f"Connected to {port} for motor ID {PORTS[port]['id']}")
-            # Attempt to read initial messages safely
-            start_time = time.time()
-            while PORTS[port]['ser'].in_waiting and time.time() - start_time < 1:
-                raw_data = PORTS[port]['ser'].readline()
-                try:
-                    line = raw_data.decode('ascii').strip()  # Use ASCII to avoid UTF-8 issues
-                    if line:
-                        print(line)
-                except UnicodeDecodeError:
-                    continue  # Skip non-decodable bytes
-        except serial.SerialException as e:
-            print(f"Error connecting to {port}: {e}")
-            PORTS[port]['ser'] = None
+    """Open all COM ports concurrently and reconnect dropped ones in the background."""
+    MANAGER.open_all()
+    MANAGER.start_watcher()
 
 def validate_positions(positions):
     """Validate that all positions are within the acceptable range."""
@@ -47,65 +31,62 @@ def validate_positions(positions):
     except ValueError:
         return False, "Invalid input. Please enter three integers."
 
-def send_to_port(port, position):
-    """Send position to a single Arduino port."""
-    if PORTS[port]['ser'] is not None:
-        try:
-            # Send position as string followed by newline
-            pos_str = f"{position}\n"
-            PORTS[port]['ser'].write(pos_str.encode('ascii'))  # Use ASCII encoding
-            print(f"Sent {position} to {port} (Motor ID {PORTS[port]['id']})")
-            # Read response
-            time.sleep(0.1)  # Small delay to allow response
-            while PORTS[port]['ser'].in_waiting:
-                raw_data = PORTS[port]['ser'].readline()
-                try:
-                    line = raw_data.decode('ascii').strip()
-                    if line:
-                        print(line)
-                except UnicodeDecodeError:
-                    continue  # Skip non-decodable bytes
-        except serial.SerialException as e:
-            print(f"Error sending to {port}: {e}")
-    else:
-        print(f"No connection to {port}. Skipping.")
-
 def send_positions(positions):
-    """Send position values to each Arduino in parallel."""
-    threads = []
+    """Queue position values for each Arduino; returns {port: future} without blocking."""
     port_list = ['COM11', 'COM12', 'COM15']
-    for i, port in enumerate(port_list):
-        thread = threading.Thread(target=send_to_port, args=(port, positions[i]))
-        threads.append(thread)
-        thread.start()
-    
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
+    return ENGINE.submit_all(dict(zip(port_list, positions)))
+
+def report_results(futures):
+    """Print why any port's command failed, as the scripts did before the serial engine."""
+    for port, future in futures.items():
+        if not future.done():
+            print(f"No acknowledgement from {port} yet.")
+        elif not future.cancelled() and future.exception() is not None:
+            print(f"Error: {future.exception()}")
+
+def print_latency_stats():
+    """Print command round-trip latency per motor."""
+    for motor_id, stats in ENGINE.latency_summary().items():
+        if stats['count']:
+            print(f"Motor ID {motor_id}: {stats['count']} commands, "
+                  f"p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms")
+        else:
+            print(f"Motor ID {motor_id}: no acknowledged commands yet")
+    if instrumentation.is_enabled():
+        for name, stats in instrumentation.snapshot()['spans'].items():
+            if stats['count']:
+                print(f"{name}: {stats['count']} calls, mean {stats['mean_us']:.1f} µs, "
+                      f"p99 {stats['p99_us']:.1f} µs")
 
 def close_serial_ports():
     """Close all serial connections."""
-    for port in PORTS:
-        if PORTS[port]['ser'] is not None:
-            PORTS[port]['ser'].close()
-            print(f"Closed connection to {port}")
+    MANAGER.close_all()
 
 def main():
     """Main function to get input and control Arduinos."""
+    instrumentation.setup_logging()
+    # DELTA_RECORD=run.dlog records every command and reply for motion_log.py replay
+    ENGINE.telemetry.recorder = motion_log.recorder_from_env(PORTS)
     initialize_serial_ports()
+    ENGINE.start()
     try:
         while True:
             # Get input from user
-            user_input = input("Enter three positions (0-1023) for motors (ID3, ID4, ID6) separated by spaces (or 'q' to quit): ")
+            user_input = input("Enter three positions (0-1023) for motors (ID3, ID4, ID6) separated by spaces (or 'stats' for link latency, 'q' to quit): ")
             if user_input.lower() == 'q':
                 break
+            if user_input.strip().lower() == 'stats':
+                print_latency_stats()
+                continue
             
             # Split and validate input
             positions = user_input.strip().split()
             is_valid, result = validate_positions(positions)
             
             if is_valid:
-                send_positions(result)
+                futures = send_positions(result)
+                wait(futures.values(), timeout=ACK_TIMEOUT)
+                report_results(futures)
             else:
                 print(result)
                 continue
@@ -113,7 +94,10 @@ def main():
     except KeyboardInterrupt:
         print("\nProgram interrupted by user.")
     finally:
+        ENGINE.stop()
         close_serial_ports()
+        if ENGINE.telemetry.recorder is not None:
+            ENGINE.telemetry.recorder.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import numpy as np
+
+import instrumentation
+from ik_delta import L
+from jacobian_delta import AXES, OFFSETS, inverse_jacobian_batch, jacobian_batch, pose_thetas
+from motion_profile import joint_limits
+from motor_config import MAX_TORQUE
+
+GRAVITY = 9.81
+REFERENCE_ACCEL = 100.0  # m/s², used by main() to report acceleration limits
+
+# Link masses (kg), starting from the values in four_bar_dynamics.nb: the
+# driven link m1 is an upper arm, the coupler m2 a forearm parallelogram and
+# m0 the moving platform. Replace them with weighed values for a real build.
+ARM_MASS = 0.148
+FOREARM_MASS = 0.254
+PLATFORM_MASS = 0.085
+
+# Upper arms are slender rods about the base joint (m L^2 / 3, as ke1 in the
+# notebook). Each forearm is lumped half at its elbow and half at the
+# platform, the usual simplification for light parallelogram forearms, so the
+# platform moves as a point mass and the arms as rigid bodies about fixed axes.
+ARM_INERTIA = (ARM_MASS / 3 + FOREARM_MASS / 2) * L**2
+ARM_GRAVITY = (ARM_MASS / 2 + FOREARM_MASS / 2) * L * GRAVITY
+
+def _elbows(thetas_rad):
+    """Elbow offsets from the base joints and their derivative d/dθ, each (N, 3, 3)"""
+    cos, sin = np.cos(thetas_rad)[:, :, None], np.sin(thetas_rad)[:, :, None]
+    e_z = np.array([0.0, 0.0, 1.0])
+    return L * (cos * AXES - sin * e_z), L * (-sin * AXES - cos * e_z)
+
+def joint_motion(xyz, velocity, acceleration, thetas_rad=None):
+    """Joint angles (rad), rates (rad/s) and accelerations (rad/s²) for (N, 3) Cartesian samples
+
+    Differentiating the arm constraint |q_i - e_i(θi)|^2 = l^2 twice gives
+      θ̈i = -(a_i·p̈ + |ṗ - e_i' θ̇i|^2 + (a_i·e_i) θ̇i^2) / d_i
+    with a_i, d_i as in jacobian_delta. Rows are NaN where the pose is
+    unreachable or singular.
+    """
+    xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+    velocity = np.atleast_2d(np.asarray(velocity, dtype=float))
+    acceleration = np.atleast_2d(np.asarray(acceleration, dtype=float))
+    if thetas_rad is None:
+        thetas_rad = pose_thetas(xyz)
+    inverse = inverse_jacobian_batch(xyz, thetas_rad)
+    rates = np.einsum('nij,nj->ni', inverse, velocity)
+
+    elbow, elbow_rate = _elbows(thetas_rad)
+    a = xyz[:, None, :] + OFFSETS - elbow
+    d = np.einsum('nij,nij->ni', a, -elbow_rate)
+    relative = velocity[:, None, :] - elbow_rate * rates[:, :, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accels = -(np.einsum('nij,nj->ni', a, acceleration)
+                   + np.sum(relative ** 2, axis=2)
+                   + np.einsum('nij,nij->ni', a, elbow) * rates ** 2) / d
+    return thetas_rad, rates, accels
+
+@instrumentation.span('dynamics.batch')
+def inverse_dynamics(xyz, velocity, acceleration, payload=0.0, thetas_rad=None):
+    """Joint torques (N·m), shape (N, 3), to follow (N, 3) positions, velocities and accelerations
+
+    torque = arm inertia * θ̈ + arm gravity + J^T F, where F is the force on the
+    platform mass (platform, payload and half of each forearm) and J = dp/dθ.
+    Positive torque drives θ up, i.e. lowers the arm. NaN rows mark
+    unreachable or singular samples.
+    """
+    xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+    acceleration = np.atleast_2d(np.asarray(acceleration, dtype=float))
+    thetas_rad, _, accels = joint_motion(xyz, velocity, acceleration, thetas_rad)
+    mass = PLATFORM_MASS + payload + 3 * FOREARM_MASS / 2
+    force = mass * (acceleration + np.array([0.0, 0.0, GRAVITY]))
+    torques = ARM_INERTIA * accels - ARM_GRAVITY * np.cos(thetas_rad)
+    return torques + np.einsum('nji,nj->ni', jacobian_batch(xyz, thetas_rad), force)
+
+def torque_utilization(torques, max_torque=None):
+    """|torque| / limit per joint, shape (N, 3); above 1 exceeds the servo, NaN stays NaN"""
+    return np.abs(torques) / joint_limits(max_torque or MAX_TORQUE)
+
+def slowdown_factors(xyz, velocity, acceleration, payload=0.0, max_torque=None):
+    """Smallest time-scale factor k >= 1 per sample that keeps every joint within its torque limit
+
+    Playing a trajectory k times slower divides velocities by k and
+    accelerations by k^2, and every dynamic term here scales with 1/k^2, so
+    torque = static + dynamic / k^2 exactly. inf where even holding still
+    exceeds the limit (or the sample is unreachable).
+    """
+    static = inverse_dynamics(xyz, np.zeros_like(np.atleast_2d(velocity), dtype=float),
+                              np.zeros_like(np.atleast_2d(acceleration), dtype=float), payload)
+    dynamic = inverse_dynamics(xyz, velocity, acceleration, payload) - static
+    limit = joint_limits(max_torque or MAX_TORQUE)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        headroom = np.where(dynamic > 0, limit - static, limit + static)
+        k_squared = np.where(dynamic == 0, 1.0, np.abs(dynamic) / headroom)
+        overloaded = (np.abs(static) > limit) | np.isnan(k_squared)
+        k_squared = np.where(overloaded, np.inf, k_squared)
+    return np.sqrt(np.maximum(np.max(k_squared, axis=1), 1.0))
+
+def path_derivatives(xyz, dt):
+    """Velocities and accelerations of (N, 3) positions sampled every dt seconds"""
+    xyz = np.asarray(xyz, dtype=float)
+    velocity = np.gradient(xyz, dt, axis=0)
+    return velocity, np.gradient(velocity, dt, axis=0)
+
+def check_path(xyz, dt, payload=0.0, max_torque=None):
+    """Torque check for a sampled path: (ok, time scale to apply, peak utilization per joint)"""
+    velocity, acceleration = path_derivatives(xyz, dt)
+    torques = inverse_dynamics(xyz, velocity, acceleration, payload)
+    peak = np.max(torque_utilization(torques, max_torque), axis=0)
+    scale = float(np.max(slowdown_factors(xyz, velocity, acceleration, payload, max_torque)))
+    return bool(np.all(peak <= 1)), scale, peak
+
+def main():
+    try:
+        x = float(input("Enter x coordinate: "))
+        y = float(input("Enter y coordinate: "))
+        z = float(input("Enter z coordinate: "))
+        payload = float(input("Enter payload mass in kg: ") or 0)
+    except ValueError:
+        print("Please enter valid numerical values.")
+        return
+
+    xyz = np.array([[x, y, z]])
+    still = np.zeros((1, 3))
+    torques = inverse_dynamics(xyz, still, still, payload)[0]
+    if np.isnan(torques).any():
+        print("Position is not reachable within the joint limits.")
+        return
+    utilization = torque_utilization(torques[None])[0]
+    print("Holding torque: " + ", ".join(f"τ{i + 1} = {t:+.3f} N·m ({u:.0%})"
+                                         for i, (t, u) in enumerate(zip(torques, utilization))))
+    for direction, label in ((1, "up"), (-1, "down")):
+        # Largest vertical acceleration from rest: scale a reference acceleration by 1/k^2
+        reference = np.array([[0.0, 0.0, direction * REFERENCE_ACCEL]])
+        k = slowdown_factors(xyz, still, reference, payload)[0]
+        if np.isinf(k):
+            print(f"Max acceleration {label}: none, holding torque already exceeds the limit")
+        elif k == 1:
+            print(f"Max acceleration {label}: above {REFERENCE_ACCEL:.0f} m/s²")
+        else:
+            print(f"Max acceleration {label}: {REFERENCE_ACCEL / k**2:.2f} m/s²")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,18 @@
 import numpy as np
-import sympy as sym
-from math import sqrt, sin, cos, pi
-
-# Constants from data (In[2])
-sp = 76 * 10**(-3)  # 19/250
-L = 524 * 10**(-3)   # 131/250
-l = 1244 * 10**(-3)  # 311/250
-wb = 164 * 10**(-3)  # 41/250
-wp = 22 * 10**(-3)   # 11/500
-up = 44 * 10**(-3)   # 11/250
-sb = 567 * 10**(-3)  # 567/1000
-ub = 327 * 10**(-3)  # 327/1000
+from math import sqrt, sin, cos
+
+import instrumentation
+from kinematics_generated import FK_COEFFS, GEOMETRY
+
+# Constants from data (In[2]), baked into kinematics_generated.py by codegen_delta.py
+sp, L, l, wb, wp, up, sb, ub = (GEOMETRY[name] for name in ('sp', 'L', 'l', 'wb', 'wp', 'up', 'sb', 'ub'))
+
+# The SymPy reference solver below imports SymPy on first use only
 
 def setup_equations(theta1, theta2, theta3):
     """Set up eq1, eq2, eq3 symbolically and compute sol and fineq"""
+    import sympy as sym
+
     # Define symbolic variables
     x, y, z = sym.symbols('x y z')
     t1, t2, t3 = sym.Symbol('theta1'), sym.Symbol('theta2'), sym.Symbol('theta3')
@@ -65,6 +64,7 @@ def solve_z(fineq):
     """Solve fineq == 0 for z numerically"""
     if fineq is None:
         return None
+    import sympy as sym
     
     # Convert fineq to a polynomial in z
     z = sym.Symbol('z')
@@ -84,8 +84,10 @@ def solve_z(fineq):
         z_solutions = sym.nsolve(fineq, z, [-1, 1], verify=False)
         return [float(z_solutions)] if not isinstance(z_solutions, list) else [float(z) for z in z_solutions]
 
-def get_xyz(theta1, theta2, theta3):
-    """Calculate x, y, z for given theta1, theta2, theta3"""
+def get_xyz_symbolic(theta1, theta2, theta3):
+    """Calculate x, y, z for given theta1, theta2, theta3 by solving eq1-eq3 in SymPy"""
+    import sympy as sym
+
     # Get sol, fineq, and symbols
     sol, fineq, x_sym, y_sym = setup_equations(theta1, theta2, theta3)
     if sol is None:
@@ -105,6 +107,183 @@ def get_xyz(theta1, theta2, theta3):
     
     return results
 
+def fk_coefficients(sp=sp, L=L, l=l, wb=wb, wp=wp, up=up):
+    """Coefficient table for eq1, eq2, eq3 written as x^2+y^2+z^2 + gx*x + gy*y + gz*z + g0
+
+    Row i holds joint i, split into [constant, cos(theta_i), sin(theta_i)] parts,
+    each a vector [gx, gy, gz, g0] (In[72]-In[74]). FK_COEFFS, generated by
+    codegen_delta.py, holds the same table for the default geometry; this
+    builds it for other geometries.
+    """
+    s3 = sqrt(3)
+    c12 = -l**2 + L**2 + sp**2/4 - s3/2*sp*wb + wb**2 - wb*wp + wp**2
+    return np.array([
+        [[0, 2*wb - 2*up, 0, -l**2 + L**2 + up**2 - 2*up*wb + wb**2],
+         [0, 2*L, 0, -2*L*(up - wb)],
+         [0, 0, 2*L, 0]],
+        [[sp - s3*wb, -wb + 2*wp, 0, c12],
+         [-s3*L, -L, 0, -L/2*(s3*sp - 4*wb + 2*wp)],
+         [0, 0, 2*L, 0]],
+        [[-sp + s3*wb, -wb + 2*wp, 0, c12],
+         [s3*L, -L, 0, -L/2*(s3*sp - 4*wb + 2*wp)],
+         [0, 0, 2*L, 0]],
+    ])
+
+def _basis_matrix(coeffs):
+    """Map [1, cos(theta1..3), sin(theta1..3)] to the rows of eq1, eq1 - eq3, eq2 - eq3"""
+    per_joint = np.zeros((3, 4, 7))
+    for i in range(3):
+        per_joint[i, :, 0] = coeffs[i, 0]
+        per_joint[i, :, 1 + i] = coeffs[i, 1]
+        per_joint[i, :, 4 + i] = coeffs[i, 2]
+    return np.vstack([per_joint[0], per_joint[0] - per_joint[2], per_joint[1] - per_joint[2]])
+
+_FK_BASIS = _basis_matrix(FK_COEFFS)
+
+@instrumentation.span('fk.batch')
+def get_xyz_batch(thetas, coeffs=FK_COEFFS):
+    """Calculate both x, y, z branches for an (N, 3) array of theta1, theta2, theta3
+
+    Returns (xyz, valid): xyz has shape (N, 2, 3) with the upper z branch first,
+    matching the order of get_xyz; valid is an (N,) mask, invalid rows are NaN.
+    """
+    thetas = np.atleast_2d(np.asarray(thetas, dtype=float))
+    n = len(thetas)
+    basis = np.empty((7, n))
+    basis[0] = 1.0
+    np.cos(thetas.T, out=basis[1:4])
+    np.sin(thetas.T, out=basis[4:7])
+    # g holds [gx, gy, gz, g0] of eq1, eqc = eq1 - eq3 and eqb = eq2 - eq3;
+    # eqb and eqc are linear in x, y, z (In[76], In[77])
+    basis_matrix = _FK_BASIS if coeffs is FK_COEFFS else _basis_matrix(coeffs)
+    g = basis_matrix @ basis
+    g1, dc, db = g[0:4], g[4:8], g[8:12]
+    det = dc[0]*db[1] - dc[1]*db[0]
+    valid = np.abs(det) > 1e-12
+    det = np.where(valid, det, 1.0)
+
+    # Solve for x and y as linear functions of z (In[78])
+    x1 = (db[2]*dc[1] - dc[2]*db[1]) / det
+    x0 = (db[3]*dc[1] - dc[3]*db[1]) / det
+    y1 = (dc[2]*db[0] - db[2]*dc[0]) / det
+    y0 = (dc[3]*db[0] - db[3]*dc[0]) / det
+
+    # Substitute into eq1 to get the quadratic fineq in z (In[80]-In[84])
+    a = x1**2 + y1**2 + 1
+    b = 2*(x0*x1 + y0*y1) + g1[0]*x1 + g1[1]*y1 + g1[2]
+    c = x0**2 + y0**2 + g1[0]*x0 + g1[1]*y0 + g1[3]
+    discriminant = b**2 - 4*a*c
+    valid &= discriminant >= 0
+    root = np.sqrt(np.where(valid, discriminant, np.nan))
+
+    z = np.stack([(-b + root) / (2*a), (-b - root) / (2*a)], axis=1)
+    xyz = np.empty((n, 2, 3))
+    xyz[:, :, 0] = x0[:, None] + x1[:, None]*z
+    xyz[:, :, 1] = y0[:, None] + y1[:, None]*z
+    xyz[:, :, 2] = z
+    return xyz, valid
+
+def get_xyz(theta1, theta2, theta3):
+    """Calculate x, y, z for given theta1, theta2, theta3"""
+    xyz, valid = get_xyz_batch([[theta1, theta2, theta3]])
+    if not valid[0]:
+        return None
+    return [{'x': float(x), 'y': float(y), 'z': float(z)} for x, y, z in xyz[0]]
+
+class FKTracker:
+    """Incremental FK for a stream of joint readings from one robot
+
+    Each update runs Newton iterations on eq1, eq2, eq3 starting from the
+    previous pose, which keeps the solution on the same branch. The first
+    sample, and any sample where Newton does not converge or jumps more than
+    max_jump meters, goes through get_xyz_batch instead; the branch closest to
+    the previous pose is kept, or the given branch index on the first sample
+    (1 = the lower branch, platform below the base).
+    """
+
+    def __init__(self, branch=1, tol=1e-9, max_iter=8, max_jump=0.05, coeffs=FK_COEFFS):
+        self.branch = branch
+        self.tol = tol
+        self.max_iter = max_iter
+        self.max_jump = max_jump
+        self.coeffs = coeffs
+        self._rows = coeffs.tolist()
+        self.pose = None
+        self.samples = 0
+        self.iterations = 0
+        self.fallbacks = 0
+
+    def reset(self):
+        """Forget the previous pose; the next update does a full solve"""
+        self.pose = None
+
+    def stats(self):
+        """{'samples', 'mean_iterations', 'fallbacks', 'fallback_rate'}"""
+        newton = self.samples - self.fallbacks
+        return {
+            'samples': self.samples,
+            'mean_iterations': self.iterations / newton if newton else 0.0,
+            'fallbacks': self.fallbacks,
+            'fallback_rate': self.fallbacks / self.samples if self.samples else 0.0,
+        }
+
+    def _newton(self, thetas):
+        """Refine self.pose for thetas; returns (x, y, z) or None if it does not converge"""
+        # [gx, gy, gz, g0] of each equation at these angles
+        g = []
+        for (const, cos_part, sin_part), theta in zip(self._rows, thetas):
+            c, s = cos(theta), sin(theta)
+            g.append([const[k] + c*cos_part[k] + s*sin_part[k] for k in range(4)])
+        x0, y0, z0 = self.pose
+        x, y, z = x0, y0, z0
+        for iteration in range(1, self.max_iter + 1):
+            r = x*x + y*y + z*z
+            f = [r + gx*x + gy*y + gz*z + g0 for gx, gy, gz, g0 in g]
+            (a11, a12, a13), (a21, a22, a23), (a31, a32, a33) = [
+                (2*x + gx, 2*y + gy, 2*z + gz) for gx, gy, gz, _ in g]
+            # Cramer's rule for J d = -f
+            m1 = a22*a33 - a23*a32
+            m2 = a21*a33 - a23*a31
+            m3 = a21*a32 - a22*a31
+            det = a11*m1 - a12*m2 + a13*m3
+            if abs(det) < 1e-12:
+                break
+            f1, f2, f3 = f
+            dx = -(f1*m1 - a12*(f2*a33 - a23*f3) + a13*(f2*a32 - a22*f3)) / det
+            dy = -(a11*(f2*a33 - a23*f3) - f1*m2 + a13*(a21*f3 - f2*a31)) / det
+            dz = -(a11*(a22*f3 - f2*a32) - a12*(a21*f3 - f2*a31) + f1*m3) / det
+            x += dx
+            y += dy
+            z += dz
+            if dx*dx + dy*dy + dz*dz < self.tol**2:
+                if (x - x0)**2 + (y - y0)**2 + (z - z0)**2 > self.max_jump**2:
+                    return None
+                # Only accepted updates count, to match the non-fallback samples in stats()
+                self.iterations += iteration
+                return x, y, z
+        return None
+
+    def update(self, theta1, theta2, theta3):
+        """Return (x, y, z) for the new joint reading (radians), or None if no pose exists"""
+        self.samples += 1
+        if self.pose is not None:
+            pose = self._newton((theta1, theta2, theta3))
+            if pose is not None:
+                self.pose = pose
+                return pose
+
+        self.fallbacks += 1
+        xyz, valid = get_xyz_batch([[theta1, theta2, theta3]], self.coeffs)
+        if not valid[0]:
+            self.pose = None
+            return None
+        if self.pose is None:
+            branch = self.branch
+        else:
+            branch = int(np.argmin(np.sum((xyz[0] - self.pose)**2, axis=1)))
+        self.pose = tuple(float(v) for v in xyz[0, branch])
+        return self.pose
+
 def main():
     # Get user input
     try:
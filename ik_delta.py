@@ -1,15 +1,16 @@
 import numpy as np
-from math import sqrt, atan2, pi
-
-# Constants from data
-sp = 76 * 10**(-3)  # 19/250
-L = 524 * 10**(-3)   # 131/250
-l = 1244 * 10**(-3)  # 311/250
-wb = 164 * 10**(-3)  # 41/250
-wp = 22 * 10**(-3)   # 11/500
-up = 44 * 10**(-3)   # 11/250
-sb = 567 * 10**(-3)  # 567/1000
-ub = 327 * 10**(-3)  # 327/1000
+from math import sqrt, degrees
+
+import instrumentation
+from kinematics_generated import GEOMETRY, IK_COEFFS, ik_theta1, ik_theta2, ik_theta3
+from motor_config import MIN_ANGLE, MAX_ANGLE
+
+# Constants from data (In[2]), baked into kinematics_generated.py by codegen_delta.py
+sp, L, l, wb, wp, up, sb, ub = (GEOMETRY[name] for name in ('sp', 'L', 'l', 'wb', 'wp', 'up', 'sb', 'ub'))
+
+# Branch selection along a trajectory (degrees)
+BRANCH_PENALTY = 1e6  # Cost of a branch outside the joint limits
+MAX_BRANCH_STEP = 45.0  # Larger joint steps between samples are flagged as discontinuous
 
 # Rotation matrix for 2π/3 around z-axis
 theta_z = 2 * np.pi / 3
@@ -46,78 +47,18 @@ def rotation_matrix_x(theta):
 
 def solve_theta1(x, y, z):
     """Solve for theta1 given x, y, z"""
-    L1 = Rx2 @ np.array([0, 0, L])
-    v1a = b1 + L1
-    v1b = p1 + np.array([x, y, z])
-    eq1 = np.dot(v1b - v1a, v1b - v1a) - l**2
-    
-    # Substitute cos(θ1) and sin(θ1) with t1 = tan(θ1/2)
-    A = -l**2 + L**2 + 2*L*up + up**2 - 2*L*wb - 2*up*wb + wb**2 + x**2 - 2*L*y - 2*up*y + 2*wb*y + y**2 + z**2
-    B = -l**2 + L**2 - 2*L*up + up**2 + 2*L*wb - 2*up*wb + wb**2 + x**2 + 2*L*y - 2*up*y + 2*wb*y + y**2 + z**2
-    C = 4*L*z
-    
-    # Solve quadratic equation for t1
-    discriminant = 16*L**2*z**2 - 4*A*B
-    if discriminant < 0:
-        return None  # No real solutions
-    t1_1 = (-C - sqrt(discriminant)) / (2*A)
-    t1_2 = (-C + sqrt(discriminant)) / (2*A)
-    
-    # Convert t1 to theta1
-    theta1_1 = 2 * atan2(t1_1, 1)
-    theta1_2 = 2 * atan2(t1_2, 1)
-    return [theta1_1, theta1_2]
+    # t1 = tan(θ1/2) quadratic, generated from eq1 by codegen_delta.py
+    return ik_theta1(x, y, z)
 
 def solve_theta2(x, y, z):
     """Solve for theta2 given x, y, z"""
-    Rx3 = rotation_matrix_x(0)  # Placeholder, will use substitution
-    L2 = Rz @ Rx2 @ np.array([0, 0, L])
-    v2a = b2 + L2
-    v2b = p2 + np.array([x, y, z])
-    eq2 = np.dot(v2b - v2a, v2b - v2a) - l**2
-    
-    # Substitute cos(θ2) and sin(θ2) with t2 = tan(θ2/2)
-    A = -4*l**2 + 4*L**2 + 2*sqrt(3)*L*sp + sp**2 - 8*L*wb - 2*sqrt(3)*sp*wb + 4*wb**2 + 4*L*wp - 4*wb*wp + 4*wp**2 + 4*sqrt(3)*L*x + 4*sp*x - 4*sqrt(3)*wb*x + 4*x**2 + 4*L*y - 4*wb*y + 8*wp*y + 4*y**2 + 4*z**2
-    B = -4*l**2 + 4*L**2 - 2*sqrt(3)*L*sp + sp**2 + 8*L*wb - 2*sqrt(3)*sp*wb + 4*wb**2 - 4*L*wp - 4*wb*wp + 4*wp**2 - 4*sqrt(3)*L*x + 4*sp*x - 4*sqrt(3)*wb*x + 4*x**2 - 4*L*y - 4*wb*y + 8*wp*y + 4*y**2 + 4*z**2
-    C = 16*L*z
-    
-    # Solve quadratic equation for t2
-    discriminant = 256*L**2*z**2 - 4*A*B
-    if discriminant < 0:
-        return None  # No real solutions
-    t2_1 = (-C - sqrt(discriminant)) / (2*A)
-    t2_2 = (-C + sqrt(discriminant)) / (2*A)
-    
-    # Convert t2 to theta2
-    theta2_1 = 2 * atan2(t2_1, 1)
-    theta2_2 = 2 * atan2(t2_2, 1)
-    return [theta2_1, theta2_2]
+    return ik_theta2(x, y, z)
 
 def solve_theta3(x, y, z):
     """Solve for theta3 given x, y, z"""
-    Rx4 = rotation_matrix_x(0)  # Placeholder, will use substitution
-    L3 = Rz @ Rz @ Rx2 @ np.array([0, 0, L])
-    v3a = b3 + L3
-    v3b = p3 + np.array([x, y, z])
-    eq3 = np.dot(v3b - v3a, v3b - v3a) - l**2
-    
-    # Substitute cos(θ3) and sin(θ3) with t3 = tan(θ3/2)
-    A = -4*l**2 + 4*L**2 + 2*sqrt(3)*L*sp + sp**2 - 8*L*wb - 2*sqrt(3)*sp*wb + 4*wb**2 + 4*L*wp - 4*wb*wp + 4*wp**2 - 4*sqrt(3)*L*x - 4*sp*x + 4*sqrt(3)*wb*x + 4*x**2 + 4*L*y - 4*wb*y + 8*wp*y + 4*y**2 + 4*z**2
-    B = -4*l**2 + 4*L**2 - 2*sqrt(3)*L*sp + sp**2 + 8*L*wb - 2*sqrt(3)*sp*wb + 4*wb**2 - 4*L*wp - 4*wb*wp + 4*wp**2 + 4*sqrt(3)*L*x - 4*sp*x + 4*sqrt(3)*wb*x + 4*x**2 - 4*L*y - 4*wb*y + 8*wp*y + 4*y**2 + 4*z**2
-    C = 16*L*z
-    
-    # Solve quadratic equation for t3
-    discriminant = 256*L**2*z**2 - 4*A*B
-    if discriminant < 0:
-        return None  # No real solutions
-    t3_1 = (-C - sqrt(discriminant)) / (2*A)
-    t3_2 = (-C + sqrt(discriminant)) / (2*A)
-    
-    # Convert t3 to theta3
-    theta3_1 = 2 * atan2(t3_1, 1)
-    theta3_2 = 2 * atan2(t3_2, 1)
-    return [theta3_1, theta3_2]
+    return ik_theta3(x, y, z)
 
+@instrumentation.span('ik.single')
 def get_thetas(x, y, z):
     """Calculate valθ1, valθ2, valθ3 for given x, y, z"""
     val_theta1 = solve_theta1(x, y, z)
@@ -128,9 +69,9 @@ def get_thetas(x, y, z):
         return None
     
     # Convert to degrees
-    val_theta1_deg = [theta * 180 / pi for theta in val_theta1]
-    val_theta2_deg = [theta * 180 / pi for theta in val_theta2]
-    val_theta3_deg = [theta * 180 / pi for theta in val_theta3]
+    val_theta1_deg = [degrees(theta) for theta in val_theta1]
+    val_theta2_deg = [degrees(theta) for theta in val_theta2]
+    val_theta3_deg = [degrees(theta) for theta in val_theta3]
     
     return {
         'valθ1_rad': val_theta1,
@@ -141,6 +82,132 @@ def get_thetas(x, y, z):
         'valθ3_deg': val_theta3_deg
     }
 
+def ik_coefficients(sp=sp, L=L, l=l, wb=wb, wp=wp, up=up):
+    """Precompute the coefficients of the t = tan(θ/2) quadratics for all three arms
+
+    For arm i, A_i t^2 + C t + B_i = 0 with A_i, B_i = |P|^2 + k·P + k0 and C = 4*L*z.
+    Returns (kA, kA0, kB, kB0, L) with kA, kB of shape (3, 3) and kA0, kB0 of shape (3,).
+    IK_COEFFS, generated by codegen_delta.py, holds the same table for the
+    default geometry; this builds it for other geometries.
+    """
+    bases = np.array([[0, -wb, 0], Rz @ [0, -wb, 0], Rz @ Rz @ [0, -wb, 0]])
+    platform = np.array([[0, -up, 0], [sp/2, wp, 0], [-sp/2, wp, 0]])
+    # Unit vector along each upper arm at θ = 0, and platform-to-base offset
+    u = bases / wb
+    d = platform - bases
+    k0 = np.sum(d**2, axis=1) + L**2 - l**2
+    ud = np.sum(u * d, axis=1)
+    kA = 2*d + 2*L*u
+    kB = 2*d - 2*L*u
+    return kA, k0 + 2*L*ud, kB, k0 - 2*L*ud, L
+
+@instrumentation.span('ik.batch')
+def get_thetas_batch(xyz, coeffs=IK_COEFFS):
+    """Calculate valθ1, valθ2, valθ3 for an (N, 3) array of x, y, z
+
+    Returns (thetas_rad, thetas_deg, reachable): both angle arrays have shape
+    (N, 3, 2) in the same branch order as get_thetas; reachable is an (N,) mask
+    and unreachable rows are NaN.
+    """
+    kA, kA0, kB, kB0, L_arm = coeffs
+    xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+    s = np.einsum('ij,ij->i', xyz, xyz)[:, None]
+    A = s + xyz @ kA.T + kA0
+    B = s + xyz @ kB.T + kB0
+    C = (4*L_arm) * xyz[:, 2:3]
+    discriminant = C**2 - 4*A*B
+    reachable = np.all(discriminant >= 0, axis=1)
+    root = np.sqrt(np.where(discriminant >= 0, discriminant, np.nan))
+
+    thetas_rad = np.empty((len(xyz), 3, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thetas_rad[:, :, 0] = (-C - root) / (2*A)
+        thetas_rad[:, :, 1] = (-C + root) / (2*A)
+    np.arctan(thetas_rad, out=thetas_rad)
+    thetas_rad *= 2
+    thetas_rad[~reachable] = np.nan
+    return thetas_rad, np.degrees(thetas_rad), reachable
+
+def _min_plus(a, b):
+    """Min-plus product of stacks of 2x2 cost matrices: out[..., i, j] = min_k a[..., i, k] + b[..., k, j]"""
+    out = np.empty(np.broadcast_shapes(a.shape, b.shape))
+    for i in range(2):
+        for j in range(2):
+            np.minimum(a[..., i, 0] + b[..., 0, j], a[..., i, 1] + b[..., 1, j], out=out[..., i, j])
+    return out
+
+@instrumentation.span('ik.select_branches')
+def select_branches(thetas_deg, min_angle=MIN_ANGLE, max_angle=MAX_ANGLE, previous=None,
+                    max_step=MAX_BRANCH_STEP):
+    """Pick the IK branch of every joint along a trajectory to minimize total joint travel
+
+    thetas_deg has shape (N, 3, 2) as returned by get_thetas_batch. Each joint
+    is a two-state shortest path over the samples; it is solved for all
+    samples at once with a prefix scan of min-plus transition matrices.
+    previous, if given, is the (3,) pose the trajectory starts from; joints
+    whose previous angle is not finite are treated as having no prior.
+    Returns (angles, ok): angles has shape (N, 3), NaN where no branch is within
+    the limits; ok is False on those samples and wherever a joint still has
+    to step more than max_step degrees.
+    """
+    thetas_deg = np.asarray(thetas_deg, dtype=float)
+    n = len(thetas_deg)
+    if n == 0:
+        return np.empty((0, 3)), np.zeros(0, dtype=bool)
+    in_range = (thetas_deg >= min_angle) & (thetas_deg <= max_angle)
+    values = np.where(np.isnan(thetas_deg), 0.0, thetas_deg)
+    node = np.where(in_range, 0.0, BRANCH_PENALTY)
+    start = node[0].copy()
+    if previous is not None:
+        previous = np.asarray(previous, dtype=float)
+        known = np.isfinite(previous)
+        start += np.where(known[:, None], np.abs(values[0] - np.where(known, previous, 0.0)[:, None]), 0.0)
+
+    # step[t, joint, i, j]: cost of going from branch i at sample t to branch j at t + 1
+    step = np.abs(values[1:, :, None, :] - values[:-1, :, :, None]) + node[1:, :, None, :]
+    prefix = step.copy()
+    k = 1
+    while k < n - 1:
+        prefix[k:] = _min_plus(prefix[:-k], prefix[k:])
+        k *= 2
+
+    # Cheapest cost of reaching each (sample, joint, branch), and the branch it came from
+    cost = np.empty((n, 3, 2))
+    cost[:1] = start
+    cost[1:] = np.min(start[None, :, :, None] + prefix, axis=2)
+    back = np.argmin(cost[:-1, :, :, None] + step, axis=2)
+
+    # Follow the back pointers from the cheapest final branch by composing them
+    # in log2(N) doubling steps: back[t] ends up mapping the final branch to t's
+    k = 1
+    while k < n - 1:
+        back[:-k] = np.take_along_axis(back[:-k], back[k:], axis=2)
+        k *= 2
+    final = np.argmin(cost[-1], axis=1)
+    choice = np.empty((n, 3), dtype=np.int64)
+    choice[-1] = final
+    choice[:-1] = np.take_along_axis(back, np.broadcast_to(final[None, :, None], (n - 1, 3, 1)), axis=2)[:, :, 0]
+
+    angles = np.take_along_axis(thetas_deg, choice[:, :, None], axis=2)[:, :, 0]
+    feasible = np.take_along_axis(in_range, choice[:, :, None], axis=2)[:, :, 0]
+    angles[~feasible] = np.nan
+    ok = np.all(feasible, axis=1)
+    if previous is not None:
+        ok[0] &= not np.any(known & (np.abs(angles[0] - np.where(known, previous, 0.0)) > max_step))
+    # Steps into or out of an infeasible sample are not counted twice
+    with np.errstate(invalid='ignore'):
+        ok[1:] &= ~np.any(np.abs(np.diff(angles, axis=0)) > max_step, axis=1)
+    return angles, ok
+
+def get_thetas_path(xyz, min_angle=MIN_ANGLE, max_angle=MAX_ANGLE, previous=None,
+                    max_step=MAX_BRANCH_STEP):
+    """IK for an (N, 3) trajectory with continuity-aware branch selection
+
+    Returns (angles_deg, ok) as described in select_branches.
+    """
+    _, thetas_deg, _ = get_thetas_batch(xyz)
+    return select_branches(thetas_deg, min_angle, max_angle, previous, max_step)
+
 def main():
     # Get user input
     try:
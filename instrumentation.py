@@ -0,0 +1,201 @@
+import csv
+import json
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+import numpy as np
+
+from serial_telemetry import HIST_BINS, HIST_BINS_PER_DECADE, HIST_EDGES, HIST_MIN_EXP
+
+STATS_PORT = 8765
+LOG_LEVEL_ENV = 'DELTA_LOG'  # e.g. DELTA_LOG=DEBUG to see every command and reply
+ENABLE_ENV = 'DELTA_INSTRUMENT'  # DELTA_INSTRUMENT=1 turns instrumentation on at startup
+
+# Spans and counters cost one global lookup while disabled
+_enabled = os.environ.get(ENABLE_ENV) == '1'
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+class Span:
+    """Timing statistics for one named stage.
+
+    Usage: t = SPAN.start(); ...; SPAN.stop(t). start() returns 0.0 while
+    instrumentation is disabled and stop() ignores it, so a span that was
+    started while disabled is never half-recorded.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.hist = np.zeros(HIST_BINS + 2, dtype=np.int64)
+
+    def start(self):
+        return perf_counter() if _enabled else 0.0
+
+    def stop(self, started):
+        if not started or not _enabled:
+            return
+        self.record(perf_counter() - started)
+
+    def record(self, seconds):
+        # Same log bins as the serial latency histograms
+        if seconds <= 0:
+            index = 0
+        else:
+            index = int((math.log10(seconds) - HIST_MIN_EXP) * HIST_BINS_PER_DECADE) + 1
+            index = min(max(index, 0), HIST_BINS + 1)
+        with _lock:
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.hist[index] += 1
+
+    def __call__(self, fn):
+        """Use the span as a decorator around fn"""
+        def wrapper(*args, **kwargs):
+            started = self.start()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stop(started)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+
+    def percentile(self, q):
+        if self.count == 0:
+            return None
+        index = int(np.searchsorted(np.cumsum(self.hist), q / 100 * self.count))
+        return float(HIST_EDGES[min(index, HIST_BINS)])
+
+    def summary(self):
+        count = self.count
+        return {
+            'count': count,
+            'total_ms': 1000 * self.total,
+            'mean_us': 1e6 * self.total / count if count else None,
+            'min_us': 1e6 * self.min if count else None,
+            'max_us': 1e6 * self.max if count else None,
+            'p50_us': 1e6 * self.percentile(50) if count else None,
+            'p99_us': 1e6 * self.percentile(99) if count else None,
+        }
+
+class Counter:
+    """Named event counter"""
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def add(self, n=1):
+        if _enabled:
+            with _lock:
+                self.value += n
+
+    def reset(self):
+        self.value = 0
+
+def span(name):
+    """Return the Span registered under name, creating it on first use"""
+    with _lock:
+        if name not in _spans:
+            _spans[name] = Span(name)
+        return _spans[name]
+
+def counter(name):
+    """Return the Counter registered under name, creating it on first use"""
+    with _lock:
+        if name not in _counters:
+            _counters[name] = Counter(name)
+        return _counters[name]
+
+def reset():
+    """Clear all recorded spans and counters"""
+    with _lock:
+        for item in list(_spans.values()) + list(_counters.values()):
+            item.reset()
+
+def snapshot():
+    """{'enabled', 'spans': {name: summary}, 'counters': {name: value}}"""
+    with _lock:
+        spans = sorted(_spans.items())
+        counters = sorted(_counters.items())
+    return {
+        'enabled': _enabled,
+        'spans': {name: s.summary() for name, s in spans},
+        'counters': {name: c.value for name, c in counters},
+    }
+
+def export_json(path):
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+
+def _csv_rows(stats):
+    columns = ['count', 'total_ms', 'mean_us', 'min_us', 'max_us', 'p50_us', 'p99_us']
+    yield ['name', 'kind'] + columns
+    for name, summary in stats['spans'].items():
+        yield [name, 'span'] + [summary[c] for c in columns]
+    for name, value in stats['counters'].items():
+        yield [name, 'counter', value] + [None] * (len(columns) - 1)
+
+def export_csv(path):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(_csv_rows(snapshot()))
+
+class _StatsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path in ('/', '/stats', '/stats.json'):
+            body = json.dumps(snapshot(), indent=2).encode()
+            content_type = 'application/json'
+        elif self.path == '/stats.csv':
+            lines = (','.join('' if v is None else str(v) for v in row) for row in _csv_rows(snapshot()))
+            body = ('\n'.join(lines) + '\n').encode()
+            content_type = 'text/csv'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format, *args)
+
+def serve_stats(port=STATS_PORT, host='127.0.0.1'):
+    """Serve /stats (JSON) and /stats.csv from a background thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _StatsHandler)
+    threading.Thread(target=server.serve_forever, name="stats-server", daemon=True).start()
+    return server
+
+def setup_logging(level=None):
+    """Send log records to the console at level, or at $DELTA_LOG (default INFO)"""
+    level = level or os.environ.get(LOG_LEVEL_ENV, 'INFO')
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level, format='%(message)s')
@@ -0,0 +1,176 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from ik_delta import L, b1, b2, b3, p1, p2, p3, get_thetas_batch, wb
+from motion_profile import joint_limits
+from motor_config import MAX_VELOCITY
+from workspace_atlas import WorkspaceAtlas, choose_branch
+
+# Arm i satisfies F_i = |q_i|^2 + L^2 - l^2 - 2L (q_i·u_i) cos(θi) + 2L z sin(θi) = 0
+# with q_i = p + p_i - b_i and u_i = b_i / wb (In[72]-In[74]). Differentiating,
+#   a_i · dp = -d_i dθi,  a_i = q_i - L (cos(θi) u_i - sin(θi) e_z),
+#                         d_i = L (q_i·u_i) sin(θi) + L z cos(θi),
+# so row i of the inverse Jacobian dθ/dp is -a_i / d_i. a_i runs along the
+# lower arm; d_i = 0 is a serial singularity, coplanar a_i a parallel one.
+BASES = np.array([b1, b2, b3])
+OFFSETS = np.array([p1, p2, p3]) - BASES
+AXES = BASES / wb
+
+# Singularity map: inverse condition number (0 = singular, 1 = isotropic) and
+# the isotropic speed limit (m/s) for every reachable atlas voxel, NaN elsewhere
+SINGULARITY_DTYPE = np.dtype([
+    ('inverse_condition', '<f4'),
+    ('max_speed', '<f4'),
+])
+
+def inverse_jacobian_batch(xyz, thetas_rad):
+    """dθ/dp for (N, 3) positions (meters) and joint angles (radians): shape (N, 3, 3), rad/m
+
+    Rows are inf or NaN where an arm is at a serial singularity.
+    """
+    xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+    thetas_rad = np.atleast_2d(np.asarray(thetas_rad, dtype=float))
+    cos, sin = np.cos(thetas_rad), np.sin(thetas_rad)
+    q = xyz[:, None, :] + OFFSETS
+    w = np.sum(q * AXES, axis=2)
+    a = q - L * cos[:, :, None] * AXES
+    a[:, :, 2] += L * sin
+    d = L * (w * sin + xyz[:, 2:3] * cos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return -a / d[:, :, None]
+
+def jacobian_batch(xyz, thetas_rad):
+    """dp/dθ, shape (N, 3, 3) in m/rad; NaN at singular poses"""
+    inverse = inverse_jacobian_batch(xyz, thetas_rad)
+    finite = np.all(np.isfinite(inverse), axis=(1, 2))
+    finite[finite] = np.abs(np.linalg.det(inverse[finite])) > 1e-12
+    jac = np.full_like(inverse, np.nan)
+    jac[finite] = np.linalg.inv(inverse[finite])
+    return jac
+
+def inverse_condition_batch(xyz, thetas_rad):
+    """1 / condition number of the Jacobian, shape (N,): 0 at singularities, 1 when isotropic"""
+    inverse = inverse_jacobian_batch(xyz, thetas_rad)
+    finite = np.all(np.isfinite(inverse), axis=(1, 2))
+    result = np.zeros(len(inverse))
+    sv = np.linalg.svd(inverse[finite], compute_uv=False)
+    with np.errstate(invalid='ignore'):
+        result[finite] = sv[:, -1] / sv[:, 0]
+    return np.nan_to_num(result)
+
+def condition_numbers(xyz, thetas_rad):
+    """Condition number of the Jacobian, shape (N,); inf at singularities"""
+    with np.errstate(divide='ignore'):
+        return 1.0 / inverse_condition_batch(xyz, thetas_rad)
+
+def max_speed_batch(xyz, thetas_rad, direction=None, max_velocity=None):
+    """Largest Cartesian speed (m/s) that keeps every joint within its velocity limit
+
+    Without direction the limit holds for motion in any direction; otherwise
+    direction is a (3,) or (N, 3) vector and only that direction is checked.
+    Returns 0 at singular poses.
+    """
+    omega = np.radians(joint_limits(max_velocity or MAX_VELOCITY))
+    inverse = inverse_jacobian_batch(xyz, thetas_rad)
+    if direction is None:
+        rate = np.linalg.norm(inverse, axis=2)
+    else:
+        direction = np.asarray(direction, dtype=float)
+        direction = direction / np.linalg.norm(direction, axis=-1, keepdims=True)
+        rate = np.abs(np.einsum('nij,nj->ni', inverse, np.broadcast_to(direction, (len(inverse), 3))))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.min(omega / rate, axis=1)
+    return np.where(np.isnan(speed), 0.0, speed)
+
+def pose_thetas(xyz):
+    """Joint angles (radians) the control scripts would use for (N, 3) positions, NaN if unreachable"""
+    _, thetas_deg, reachable = get_thetas_batch(xyz)
+    chosen, ok = choose_branch(thetas_deg)
+    ok &= reachable
+    return np.where(ok[:, None], np.radians(chosen), np.nan)
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def build_singularity_map(path, atlas, max_velocity=None, chunk=1 << 16):
+    """Evaluate the Jacobian at every reachable voxel of atlas and write it to path (.npy) plus a .json header"""
+    start_time = time.time()
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=SINGULARITY_DTYPE, shape=atlas.shape)
+    flat = out.reshape(-1)
+    flat['inverse_condition'] = np.nan
+    flat['max_speed'] = np.nan
+    for index, xyz, theta_deg in atlas.reachable_points(chunk):
+        thetas = np.radians(theta_deg.astype(float))
+        flat['inverse_condition'][index] = inverse_condition_batch(xyz, thetas)
+        flat['max_speed'][index] = max_speed_batch(xyz, thetas, max_velocity=max_velocity)
+    out.flush()
+    del out
+
+    meta = dict(atlas.meta, build_seconds=time.time() - start_time)
+    with open(_metadata_path(path), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return SingularityMap(path)
+
+class SingularityMap:
+    """Read-only, memory-mapped view of a map written by build_singularity_map"""
+
+    def __init__(self, path):
+        with open(_metadata_path(path)) as f:
+            self.meta = json.load(f)
+        self.data = np.load(path, mmap_mode='r')
+        self.origin = np.array(self.meta['origin'])
+        self.step = self.meta['step']
+        self.shape = tuple(self.meta['shape'])
+        self._flat = self.data.reshape(-1)
+
+    def query_batch(self, xyz):
+        """Vectorized lookup for an (N, 3) array: returns (inverse_condition, max_speed), NaN if unreachable"""
+        xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+        ijk = np.rint((xyz - self.origin) / self.step).astype(np.int64)
+        inside = np.all((ijk >= 0) & (ijk < self.shape), axis=1)
+        records = self._flat[np.ravel_multi_index(tuple(np.where(inside, ijk.T, 0)), self.shape)]
+        return (np.where(inside, records['inverse_condition'], np.nan),
+                np.where(inside, records['max_speed'], np.nan))
+
+    def query(self, x, y, z):
+        """Return {'inverse_condition', 'max_speed'} for the voxel containing (x, y, z)"""
+        inverse_condition, max_speed = self.query_batch([[x, y, z]])
+        if np.isnan(inverse_condition[0]):
+            return {'inverse_condition': None, 'max_speed': None}
+        return {'inverse_condition': float(inverse_condition[0]), 'max_speed': float(max_speed[0])}
+
+def main():
+    path = 'singularity_map.npy'
+    atlas_path = 'workspace_atlas.npy'
+    if not os.path.exists(path) or not os.path.exists(_metadata_path(path)):
+        if not os.path.exists(atlas_path):
+            print("Build the workspace atlas first: python workspace_atlas.py")
+            return
+        print(f"Building singularity map {path} ...")
+        singularity_map = build_singularity_map(path, WorkspaceAtlas(atlas_path))
+        print(f"Built in {singularity_map.meta['build_seconds']:.2f} s")
+
+    try:
+        x = float(input("Enter x coordinate: "))
+        y = float(input("Enter y coordinate: "))
+        z = float(input("Enter z coordinate: "))
+
+        xyz = np.array([[x, y, z]])
+        thetas = pose_thetas(xyz)
+        if np.isnan(thetas).any():
+            print("Position is not reachable within the joint limits.")
+            return
+        print(f"Condition number: {condition_numbers(xyz, thetas)[0]:.3f}")
+        print(f"Max safe speed: {max_speed_batch(xyz, thetas)[0]:.3f} m/s in any direction")
+        jac = jacobian_batch(xyz, thetas)[0]
+        print("Jacobian dp/dθ (m/rad):")
+        for row in jac:
+            print("  " + "  ".join(f"{v:9.5f}" for v in row))
+    except ValueError:
+        print("Please enter valid numerical values for x, y, z.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+import numpy as np
+
+from fk_delta import get_xyz_batch
+from ik_delta import get_thetas_batch, select_branches
+
+CHUNK_SIZE = 65536  # Rows per chunk; memory use is a few chunks per process
+
+# Output columns per mode
+FK_COLUMNS = ['x', 'y', 'z', 'valid']
+FK_BOTH_COLUMNS = ['x_upper', 'y_upper', 'z_upper', 'x_lower', 'y_lower', 'z_lower', 'valid']
+IK_COLUMNS = ['theta1', 'theta2', 'theta3', 'ok']
+IK_ALL_COLUMNS = ['theta1_a', 'theta1_b', 'theta2_a', 'theta2_b', 'theta3_a', 'theta3_b', 'reachable']
+BRANCHES = {'upper': 0, 'lower': 1}
+
+def _parse_lines(lines):
+    """(N, 3) float array from CSV or whitespace-separated text lines"""
+    delimiter = ',' if ',' in lines[0] else None
+    return np.loadtxt(lines, delimiter=delimiter, ndmin=2, usecols=(0, 1, 2))
+
+def _is_header(line):
+    field = line.replace(',', ' ').split()[0] if line.strip() else ''
+    try:
+        float(field)
+        return False
+    except ValueError:
+        return True
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield (start_row, (n, 3) array) chunks from a .npy file, a CSV file or '-' (stdin)"""
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+        for start in range(0, len(data), chunk_size):
+            yield start, np.asarray(data[start:start + chunk_size, :3], dtype=float)
+        return
+
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        lines = (line for line in f if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return
+        pending = [] if _is_header(first) else [first]
+        start = 0
+        while True:
+            pending.extend(islice(lines, chunk_size - len(pending)))
+            if not pending:
+                return
+            block = _parse_lines(pending)
+            yield start, block
+            start += len(block)
+            pending = []
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def _npy_shards(path, chunk_size):
+    """Row ranges of a .npy file, so workers can memory-map it instead of receiving pickled rows"""
+    rows = len(np.load(path, mmap_mode='r'))
+    for start in range(0, rows, chunk_size):
+        yield start, (path, start, min(start + chunk_size, rows))
+
+def fk_chunk(thetas, degrees=False, branch='lower'):
+    """FK rows for an (N, 3) angle array: x, y, z and a valid flag (both branches with branch='both')"""
+    if degrees:
+        thetas = np.radians(thetas)
+    xyz, valid = get_xyz_batch(thetas)
+    if branch == 'both':
+        return np.column_stack([xyz.reshape(len(xyz), 6), valid])
+    return np.column_stack([xyz[:, BRANCHES[branch]], valid])
+
+def ik_chunk(xyz, previous=None, branch='path'):
+    """IK rows for an (N, 3) position array, angles in degrees
+
+    branch='path' picks one branch per joint with select_branches (continuing
+    from previous) and appends an ok flag; branch='all' returns every
+    candidate and a reachable flag.
+    """
+    _, thetas_deg, reachable = get_thetas_batch(xyz)
+    if branch == 'all':
+        return np.column_stack([thetas_deg.reshape(len(xyz), 6), reachable])
+    angles, ok = select_branches(thetas_deg, previous=previous)
+    return np.column_stack([angles, ok])
+
+def _work(args):
+    """Pool worker: args is (mode, options, rows) with rows an array or a (path, start, stop) .npy shard"""
+    mode, options, rows = args
+    if isinstance(rows, tuple):
+        path, start, stop = rows
+        rows = np.asarray(np.load(path, mmap_mode='r')[start:stop, :3], dtype=float)
+    if mode == 'fk':
+        return fk_chunk(rows, options['degrees'], options['branch'])
+    return ik_chunk(rows, branch=options['branch'])
+
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self.f = sys.stdout if path == '-' else open(path, 'w')
+        self.f.write(','.join(columns) + '\n')
+        self.fmt = ['%.9g'] * (len(columns) - 1) + ['%d']
+
+    def write(self, start, block):
+        np.savetxt(self.f, block, fmt=self.fmt, delimiter=',')
+
+    def close(self):
+        if self.f is sys.stdout:
+            self.f.flush()
+        else:
+            self.f.close()
+
+class _NpyWriter:
+    def __init__(self, path, columns, rows):
+        self.out = np.lib.format.open_memmap(path, mode='w+', dtype=float, shape=(rows, len(columns)))
+
+    def write(self, start, block):
+        self.out[start:start + len(block)] = block
+
+    def close(self):
+        self.out.flush()
+        del self.out
+
+def _columns(mode, branch):
+    if mode == 'fk':
+        return FK_BOTH_COLUMNS if branch == 'both' else FK_COLUMNS
+    return IK_ALL_COLUMNS if branch == 'all' else IK_COLUMNS
+
+def run(mode, input_path, output_path='-', chunk_size=CHUNK_SIZE, processes=1, degrees=False, branch=None):
+    """Stream input_path through FK ('fk') or IK ('ik') and write results to output_path
+
+    Returns the number of rows processed. With processes > 1, chunks are
+    solved in a worker pool and written back in order; at most two chunks
+    per worker are in flight. In IK 'path' mode each chunk then starts its
+    branch selection afresh instead of continuing from the previous chunk.
+    """
+    branch = branch or ('lower' if mode == 'fk' else 'path')
+    columns = _columns(mode, branch)
+    if output_path.endswith('.npy'):
+        if not input_path.endswith('.npy'):
+            raise ValueError(".npy output needs a .npy input (the row count must be known up front)")
+        writer = _NpyWriter(output_path, columns, len(np.load(input_path, mmap_mode='r')))
+    else:
+        writer = _CsvWriter(output_path, columns)
+
+    rows = 0
+    options = {'degrees': degrees, 'branch': branch}
+    try:
+        if processes == 1:
+            previous = None
+            for start, block in read_chunks(input_path, chunk_size):
+                if mode == 'fk':
+                    result = fk_chunk(block, degrees, branch)
+                else:
+                    result = ik_chunk(block, previous, branch)
+                    if branch == 'path' and len(result):
+                        # After an unreachable row the next chunk starts without a prior, as a
+                        # step out of an infeasible sample is not checked within a chunk either
+                        last = result[-1, :3]
+                        previous = last if np.all(np.isfinite(last)) else None
+                writer.write(start, result)
+                rows += len(result)
+            return rows
+
+        if input_path.endswith('.npy'):
+            chunks = _npy_shards(input_path, chunk_size)
+        else:
+            chunks = read_chunks(input_path, chunk_size)
+        # Pool.imap reads its input eagerly; the semaphore keeps the reader
+        # at most 2 * processes chunks ahead of the writer
+        in_flight = threading.BoundedSemaphore(2 * processes)
+        starts = []
+
+        def tasks():
+            for start, block in chunks:
+                in_flight.acquire()
+                starts.append(start)
+                yield mode, options, block
+
+        with Pool(processes) as pool:
+            for i, result in enumerate(pool.imap(_work, tasks())):
+                writer.write(starts[i], result)
+                rows += len(result)
+                in_flight.release()
+        return rows
+    finally:
+        writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run FK or IK over a file of angle triplets or poses")
+    parser.add_argument('mode', choices=['fk', 'ik'],
+                        help="fk: θ1 θ2 θ3 -> x y z; ik: x y z -> θ1 θ2 θ3 (degrees)")
+    parser.add_argument('input', help="CSV file, .npy file, or - for stdin (first three columns are used)")
+    parser.add_argument('-o', '--output', default='-', help="CSV file, .npy file, or - for stdout (default)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('-j', '--processes', type=int, default=1, help="worker processes (default 1)")
+    parser.add_argument('--degrees', action='store_true', help="fk input angles are in degrees")
+    parser.add_argument('--branch', choices=['upper', 'lower', 'both', 'path', 'all'],
+                        help="fk: upper, lower (default) or both z branches; "
+                             "ik: path (continuity-aware, default) or all candidates")
+    args = parser.parse_args()
+    if args.branch and args.branch not in (('upper', 'lower', 'both') if args.mode == 'fk' else ('path', 'all')):
+        parser.error(f"--branch {args.branch} does not apply to {args.mode}")
+
+    start_time = time.time()
+    try:
+        rows = run(args.mode, args.input, args.output, args.chunk_size, args.processes,
+                   args.degrees, args.branch)
+    except BrokenPipeError:
+        # Output piped into e.g. head; stop quietly like other command-line tools
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.time() - start_time
+    print(f"{rows} rows in {elapsed:.2f} s ({rows / max(elapsed, 1e-9):.0f} rows/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Generated by codegen_delta.py; do not edit.
+# Regenerate after a geometry change: python codegen_delta.py --L 0.524 ...
+import math
+
+import numpy
+
+GEOMETRY = {
+    'sp': 0.076,  # 19/250
+    'L': 0.524,  # 131/250
+    'l': 1.244,  # 311/250
+    'wb': 0.164,  # 41/250
+    'wp': 0.022,  # 11/500
+    'up': 0.044,  # 11/250
+    'sb': 0.567,  # 567/1000
+    'ub': 0.327,  # 327/1000
+}
+
+# eq1-eq3 as |P|^2 + [gx, gy, gz, g0]·[x, y, z, 1], per joint split into
+# [constant, cos(theta_i), sin(theta_i)] parts; used by fk_delta.get_xyz_batch
+FK_COEFFS = numpy.array([
+    [[0.0, 0.24, 0.0, -1.25856], [0.0, 1.048, 0.0, 0.12576], [0.0, 0.0, 1.048, 0.0]],
+    [[-0.20805633244129587, -0.12, 0.0, -1.2585381406327691], [-0.9075946231660917, -0.524, 0.0, 0.1258554043196885], [0.0, 0.0, 1.048, 0.0]],
+    [[0.20805633244129587, -0.12, 0.0, -1.2585381406327691], [0.9075946231660917, -0.524, 0.0, 0.1258554043196885], [0.0, 0.0, 1.048, 0.0]],
+])
+
+# A_i, B_i = |P|^2 + k·P + k0 of the tan(theta_i/2) quadratics, C_i = 4 L z;
+# (kA, kA0, kB, kB0, L) as used by ik_delta.get_thetas_batch
+IK_COEFFS = (
+    numpy.array([
+        [0.0, -0.808, 0.0],
+        [0.6995382907247958, 0.404, 0.0],
+        [-0.6995382907247958, 0.404, 0.0],
+    ]),
+    numpy.array([-1.38432, -1.3843935449524578, -1.3843935449524578]),
+    numpy.array([
+        [0.0, 1.288, 0.0],
+        [-1.1156509556073875, -0.644, 0.0],
+        [1.1156509556073875, -0.644, 0.0],
+    ]),
+    numpy.array([-1.1328, -1.1326827363130807, -1.1326827363130807]),
+    0.524,
+)
+
+def ik_theta1(x, y, z):
+    """Both candidate θ1 (radians) for a scalar x, y, z, or None if unreachable"""
+    _t0 = x**2 + y**2 + z**2
+    A = _t0 - 0.808*y - 1.38432
+    B = _t0 + 1.288*y - 1.1328
+    C = 2.096*z
+    discriminant = C**2 - 4*A*B
+    if discriminant < 0:
+        return None
+    root = math.sqrt(discriminant)
+    return [2*math.atan((-C - root) / (2*A)), 2*math.atan((-C + root) / (2*A))]
+
+def ik_theta2(x, y, z):
+    """Both candidate θ2 (radians) for a scalar x, y, z, or None if unreachable"""
+    _t0 = x**2 + y**2 + z**2
+    A = _t0 + 0.69953829072479583*x + 0.404*y - 1.3843935449524578
+    B = _t0 - 1.1156509556073876*x - 0.644*y - 1.1326827363130807
+    C = 2.096*z
+    discriminant = C**2 - 4*A*B
+    if discriminant < 0:
+        return None
+    root = math.sqrt(discriminant)
+    return [2*math.atan((-C - root) / (2*A)), 2*math.atan((-C + root) / (2*A))]
+
+def ik_theta3(x, y, z):
+    """Both candidate θ3 (radians) for a scalar x, y, z, or None if unreachable"""
+    _t0 = x**2 + y**2 + z**2
+    A = _t0 - 0.69953829072479583*x + 0.404*y - 1.3843935449524578
+    B = _t0 + 1.1156509556073876*x - 0.644*y - 1.1326827363130807
+    C = 2.096*z
+    discriminant = C**2 - 4*A*B
+    if discriminant < 0:
+        return None
+    root = math.sqrt(discriminant)
+    return [2*math.atan((-C - root) / (2*A)), 2*math.atan((-C + root) / (2*A))]
@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import instrumentation
+from fk_delta import get_xyz_batch
+from ik_delta import get_thetas_batch
+from jacobian_delta import inverse_condition_batch, max_speed_batch
+from workspace_atlas import choose_branch
+
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), 'delta_kinematics.sock')
+BATCH_WINDOW = 0.002  # Seconds to wait for more requests after the first one of a batch
+MAX_BATCH = 4096
+
+# Requests and replies are fixed 29-byte little-endian records:
+#   request: op (u8) | request id (u32) | three float64 arguments
+#   reply:   request id (u32) | status (u8) | three float64 results
+# OP_STATS replies with the id, STATUS_OK and a u32 length followed by that
+# many bytes of JSON instead.
+REQUEST = struct.Struct('<BI3d')
+REPLY = struct.Struct('<IB3d')
+STATS_HEADER = struct.Struct('<IBI')
+
+OP_FK = 1     # θ1, θ2, θ3 (radians) -> x, y, z (lower branch)
+OP_IK = 2     # x, y, z -> θ1, θ2, θ3 (degrees, within the joint limits)
+OP_REACH = 3  # x, y, z -> reachable (1.0 / 0.0), inverse condition number, max speed (m/s)
+OP_STATS = 4
+
+STATUS_OK = 0
+STATUS_UNREACHABLE = 1  # No valid solution; results are NaN
+STATUS_BAD_REQUEST = 2
+
+BATCH_SIZE_BINS = 16  # Powers of two: bin k counts batches of 2^k .. 2^(k+1) - 1 requests
+
+QUEUE_SPAN = instrumentation.span('kinematics_server.queue')
+BATCH_SPAN = instrumentation.span('kinematics_server.batch')
+REQUESTS = instrumentation.counter('kinematics_server.requests')
+
+def _solve_fk(args):
+    xyz, valid = get_xyz_batch(args)
+    return xyz[:, 1], valid
+
+def _solve_ik(args):
+    _, thetas_deg, reachable = get_thetas_batch(args)
+    angles, ok = choose_branch(thetas_deg)
+    ok &= reachable
+    return np.where(ok[:, None], angles, np.nan), ok
+
+def _solve_reach(args):
+    _, thetas_deg, reachable = get_thetas_batch(args)
+    angles, ok = choose_branch(thetas_deg)
+    ok &= reachable
+    thetas = np.radians(np.where(ok[:, None], angles, np.nan))
+    results = np.zeros((len(args), 3))
+    results[:, 0] = ok
+    if ok.any():
+        results[ok, 1] = inverse_condition_batch(args[ok], thetas[ok])
+        results[ok, 2] = max_speed_batch(args[ok], thetas[ok])
+    return results, np.ones(len(args), dtype=bool)
+
+SOLVERS = {OP_FK: _solve_fk, OP_IK: _solve_ik, OP_REACH: _solve_reach}
+
+class _Connection(socketserver.BaseRequestHandler):
+    """Reads pipelined requests from one client and queues them for the batcher"""
+
+    def handle(self):
+        self.lock = threading.Lock()
+        reader = self.request.makefile('rb')
+        while True:
+            data = reader.read(REQUEST.size)
+            if len(data) < REQUEST.size:
+                return
+            op, request_id, *args = REQUEST.unpack(data)
+            if op == OP_STATS:
+                body = json.dumps(self.server.batcher.stats()).encode()
+                self.send(STATS_HEADER.pack(request_id, STATUS_OK, len(body)) + body)
+            elif op in SOLVERS:
+                self.server.batcher.submit(op, request_id, args, self)
+            else:
+                self.send(REPLY.pack(request_id, STATUS_BAD_REQUEST, np.nan, np.nan, np.nan))
+
+    def send(self, data):
+        with self.lock:
+            try:
+                self.request.sendall(data)
+            except OSError:
+                pass  # Client went away; its remaining replies are dropped
+
+class Batcher(threading.Thread):
+    """Coalesces queued single-pose requests into one vectorized call per operation.
+
+    A batch closes window seconds after its first request arrives, or once
+    max_batch requests are waiting, whichever comes first.
+    """
+
+    def __init__(self, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        super().__init__(name="kinematics-batcher", daemon=True)
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = True
+        self.started_at = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = np.zeros(BATCH_SIZE_BINS, dtype=np.int64)
+
+    def submit(self, op, request_id, args, connection):
+        with self._cond:
+            self._queue.append((op, request_id, args, connection, time.perf_counter()))
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _take_batch(self):
+        with self._cond:
+            while self._running and not self._queue:
+                self._cond.wait()
+            if not self._running:
+                return None
+            deadline = self._queue[0][4] + self.window
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self._running:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._process(batch)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        for item in batch:
+            QUEUE_SPAN.record(started - item[4])
+        replies = {}
+        for op, solver in SOLVERS.items():
+            items = [item for item in batch if item[0] == op]
+            if not items:
+                continue
+            args = np.array([item[2] for item in items], dtype=float)
+            results, ok = solver(args)
+            for item, row, good in zip(items, results, ok):
+                status = STATUS_OK if good else STATUS_UNREACHABLE
+                replies.setdefault(item[3], []).append(REPLY.pack(item[1], status, *row))
+        for connection, packed in replies.items():
+            connection.send(b''.join(packed))
+
+        BATCH_SPAN.record(time.perf_counter() - started)
+        REQUESTS.add(len(batch))
+        self.requests += len(batch)
+        self.batches += 1
+        self.batch_sizes[min(len(batch).bit_length() - 1, BATCH_SIZE_BINS - 1)] += 1
+
+    def stats(self):
+        """Throughput, batch sizes and queueing delay since the server started"""
+        elapsed = time.perf_counter() - self.started_at
+        queue = QUEUE_SPAN.summary()
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'requests_per_second': self.requests / elapsed if elapsed > 0 else 0.0,
+            'mean_batch_size': self.requests / self.batches if self.batches else None,
+            'batch_size_histogram': {f"{1 << k}-{(2 << k) - 1}": int(n)
+                                     for k, n in enumerate(self.batch_sizes) if n},
+            'queue_delay_p50_us': queue['p50_us'],
+            'queue_delay_p99_us': queue['p99_us'],
+            'batch_time_mean_us': BATCH_SPAN.summary()['mean_us'],
+        }
+
+class KinematicsServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket kinematics service; one reader thread per client, one shared batcher"""
+    daemon_threads = True
+    block_on_close = False  # Client reader threads may be blocked on idle connections
+
+    def __init__(self, path=SOCKET_PATH, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        if os.path.exists(path):
+            os.unlink(path)  # Stale socket from a previous run
+        super().__init__(path, _Connection)
+        self.path = path
+        self.batcher = Batcher(window, max_batch)
+        self.batcher.start()
+
+    def start(self):
+        """Serve from a background thread; returns self"""
+        threading.Thread(target=self.serve_forever, name="kinematics-server", daemon=True).start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        self.batcher.stop()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+class KinematicsClient:
+    """Blocking client; safe to share between threads (calls are serialized)"""
+
+    def __init__(self, path=SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._reader = self.sock.makefile('rb')
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _call_many(self, op, rows):
+        """Send every row as its own request (pipelined) and return (results, status) arrays in order"""
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        with self._lock:
+            first = self._next_id
+            self._next_id = (self._next_id + len(rows)) & 0xFFFFFFFF
+            self.sock.sendall(b''.join(REQUEST.pack(op, (first + i) & 0xFFFFFFFF, *row)
+                                       for i, row in enumerate(rows)))
+            results = np.empty((len(rows), 3))
+            status = np.empty(len(rows), dtype=np.uint8)
+            for _ in range(len(rows)):
+                data = self._reader.read(REPLY.size)
+                if len(data) < REPLY.size:
+                    raise ConnectionError("kinematics server closed the connection")
+                request_id, code, *values = REPLY.unpack(data)
+                index = (request_id - first) & 0xFFFFFFFF
+                results[index] = values
+                status[index] = code
+        return results, status
+
+    def _call(self, op, a, b, c):
+        results, status = self._call_many(op, [[a, b, c]])
+        return None if status[0] != STATUS_OK else tuple(float(v) for v in results[0])
+
+    def fk(self, theta1, theta2, theta3):
+        """(x, y, z) of the lower branch, or None"""
+        return self._call(OP_FK, theta1, theta2, theta3)
+
+    def ik(self, x, y, z):
+        """(θ1, θ2, θ3) in degrees within the joint limits, or None"""
+        return self._call(OP_IK, x, y, z)
+
+    def reachable(self, x, y, z):
+        """{'reachable', 'inverse_condition', 'max_speed'} for one position"""
+        reachable, inverse_condition, max_speed = self._call(OP_REACH, x, y, z)
+        return {'reachable': bool(reachable), 'inverse_condition': inverse_condition, 'max_speed': max_speed}
+
+    def fk_many(self, thetas):
+        return self._call_many(OP_FK, thetas)
+
+    def ik_many(self, xyz):
+        return self._call_many(OP_IK, xyz)
+
+    def stats(self):
+        with self._lock:
+            self.sock.sendall(REQUEST.pack(OP_STATS, 0, 0.0, 0.0, 0.0))
+            _, _, length = STATS_HEADER.unpack(self._reader.read(STATS_HEADER.size))
+            return json.loads(self._reader.read(length))
+
+    def close(self):
+        self._reader.close()
+        self.sock.close()
+
+def load_test(path=SOCKET_PATH, clients=8, requests=2000, pipeline=1):
+    """Hammer a running server with single-pose IK requests from several client threads
+
+    Each client sends pipeline requests at a time and waits for their
+    replies. Returns requests per second over all clients.
+    """
+    rng = np.random.default_rng(0)
+    xyz = np.column_stack([rng.uniform(-0.2, 0.2, (requests, 2)), rng.uniform(-1.1, -0.7, requests)])
+    connections = [KinematicsClient(path) for _ in range(clients)]
+
+    def drive(client):
+        for start in range(0, requests, pipeline):
+            client.ik_many(xyz[start:start + pipeline])
+
+    threads = [threading.Thread(target=drive, args=(client,)) for client in connections]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    for client in connections:
+        client.close()
+    return clients * requests / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve FK, IK and reachability queries on a Unix socket")
+    parser.add_argument('--socket', default=SOCKET_PATH, help=f"socket path (default {SOCKET_PATH})")
+    parser.add_argument('--window-ms', type=float, default=BATCH_WINDOW * 1000,
+                        help="how long a batch waits for more requests (default 2 ms)")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--stats-port', type=int, help="also serve instrumentation stats over HTTP")
+    parser.add_argument('--load-test', type=int, metavar='CLIENTS',
+                        help="start a server, run single-pose IK requests from this many clients, then exit")
+    parser.add_argument('--pipeline', type=int, default=1, help="requests in flight per load-test client")
+    args = parser.parse_args()
+    instrumentation.setup_logging()
+    instrumentation.enable()
+
+    server = KinematicsServer(args.socket, args.window_ms / 1000, args.max_batch)
+    if args.stats_port:
+        instrumentation.serve_stats(args.stats_port)
+    with server:
+        if args.load_test:
+            rate = load_test(args.socket, args.load_test, pipeline=args.pipeline)
+            stats = server.batcher.stats()
+            print(f"{args.load_test} clients: {rate:.0f} requests/s, mean batch {stats['mean_batch_size']:.1f}, "
+                  f"queue delay p50 {stats['queue_delay_p50_us']:.0f} µs, p99 {stats['queue_delay_p99_us']:.0f} µs")
+            return
+        print(f"Serving kinematics on {args.socket}; press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\nStopping server.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+from serial_engine import ACK_TIMEOUT
+from serial_telemetry import EVENT_COMMAND, EVENT_NAMES
+
+RECORD_ENV = 'DELTA_RECORD'  # DELTA_RECORD=run.dlog makes the control scripts record to run.dlog
+MAGIC = b'DLOG'
+VERSION = 1
+GROW_RECORDS = 65536  # Records preallocated at a time (4 MiB)
+INDEX_INTERVAL = 1.0  # Seconds of log time per index entry
+CHUNK = 4096  # Records read at a time during replay
+LATE_TOLERANCE = 0.005  # Seconds behind schedule before a replayed command counts as late
+
+# File layout: one header, then fixed-size records in time order. 'count'
+# is updated after every record, so a log cut short by a crash still opens.
+# Records are timestamped by the threads that send and read, and may reach
+# the recorder a little out of order; a record's t is raised to the t of the
+# record before it when needed, so t never decreases and seeking can bisect.
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u2'),
+    ('record_size', '<u2'),
+    ('count', '<u8'),
+    ('started', '<f8'),         # Wall-clock time of t = 0 (time.time())
+    ('index_interval', '<f8'),
+    ('ports', 'S480'),          # JSON [[port, motor_id], ...]
+])
+HEADER_SIZE = HEADER_DTYPE.itemsize
+
+# One serial event, as kept by serial_telemetry but with t relative to the start of the log
+RECORD_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('value', '<i4'),
+    ('port', 'u1'),
+    ('kind', 'u1'),
+    ('text', 'S50'),
+])
+
+def _index_path(path):
+    """Sidecar with the first record number at or after every INDEX_INTERVAL seconds"""
+    return path + '.idx'
+
+class MotionRecorder:
+    """Appends serial events to a memory-mapped log file
+
+    Set it as Telemetry.recorder (or SerialEngine.telemetry.recorder) and
+    every setpoint written and every reply read is stored with its
+    timestamp. Appending is a copy into mapped memory; the file grows
+    GROW_RECORDS records at a time and is trimmed on close().
+    """
+
+    def __init__(self, path, ports):
+        self.path = path
+        self.port_names = list(ports)
+        self.count = 0
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self._last_t = 0.0
+
+        header = np.zeros((), dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['record_size'] = RECORD_DTYPE.itemsize
+        header['started'] = time.time()
+        header['index_interval'] = INDEX_INTERVAL
+        header['ports'] = json.dumps([[port, info['id']] for port, info in ports.items()]).encode()
+        with open(path, 'wb') as f:
+            f.write(header.tobytes())
+        self._index = open(_index_path(path), 'wb')
+        self._capacity = 0
+        self._grow()
+
+    def _grow(self):
+        self._capacity += GROW_RECORDS
+        # Windows cannot resize a file while any view of it is mapped, so release both first
+        self._records = self._header = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_SIZE + self._capacity * RECORD_DTYPE.itemsize)
+        self._header = np.memmap(self.path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        self._records = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r+',
+                                  offset=HEADER_SIZE, shape=(self._capacity,))
+
+    def append(self, t, port, kind, value=0, text=b''):
+        """Store one event; t is time.perf_counter(), port an index into port_names"""
+        with self._lock:
+            if self._records is None:
+                return  # Closed
+            t = self._last_t = max(t - self._origin, self._last_t)
+            if self.count == self._capacity:
+                self._grow()
+            while t >= self._next_index * INDEX_INTERVAL:
+                self._index.write(np.int64(self.count).tobytes())
+                self._next_index += 1
+            self._records[self.count] = (t, value, port, kind, text)
+            self.count += 1
+            self._header['count'] = self.count
+
+    def record(self, port, kind, value=0, text=b'', t=None):
+        """Same signature as Telemetry.record, for recording without a Telemetry"""
+        self.append(time.perf_counter() if t is None else t, self.port_names.index(port), kind, value, text)
+
+    def close(self):
+        with self._lock:
+            if self._records is None:
+                return
+            self._records.flush()
+            self._header.flush()
+            self._records = None
+            self._header = None
+            self._index.close()
+            with open(self.path, 'r+b') as f:
+                f.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def recorder_from_env(ports):
+    """MotionRecorder writing to $DELTA_RECORD, or None if it is not set"""
+    path = os.environ.get(RECORD_ENV)
+    return MotionRecorder(path, ports) if path else None
+
+class MotionLog:
+    """Read-only view of a log written by MotionRecorder
+
+    Opening only reads the header and the index; records are memory-mapped
+    and paged in as they are touched, so opening costs the same for any
+    log length.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} is not a motion log")
+        header = header[0]
+        if header['version'] != VERSION or header['record_size'] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path}: unsupported log version {header['version']}")
+        self.started = float(header['started'])
+        self.index_interval = float(header['index_interval'])
+        self.port_motors = {port: motor_id for port, motor_id in json.loads(header['ports'].decode())}
+        self.port_names = list(self.port_motors)
+        count = int(header['count'])
+        self.records = (np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+                        if count else np.zeros(0, dtype=RECORD_DTYPE))
+        index_path = _index_path(path)
+        self.index = np.fromfile(index_path, dtype='<i8') if os.path.exists(index_path) else np.zeros(0, np.int64)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self):
+        return float(self.records[-1]['t']) if len(self.records) else 0.0
+
+    def seek(self, t):
+        """Number of the first record at or after t seconds"""
+        k = int(t // self.index_interval) if t > 0 else 0
+        lo = int(self.index[min(k, len(self.index) - 1)]) if len(self.index) else 0
+        hi = int(self.index[k + 1]) if k + 1 < len(self.index) else len(self.records)
+        lo = min(lo, hi)
+        if k + 1 >= len(self.index) and hi - lo > CHUNK:
+            # Past the end of the index (log not closed cleanly): bisect the mapped times
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.records[mid]['t'] < t:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return lo
+        return lo + int(np.searchsorted(self.records['t'][lo:hi], t))
+
+    def chunks(self, start=0.0, end=None, size=CHUNK):
+        """Yield record arrays between start and end seconds, size records at a time"""
+        first = self.seek(start)
+        last = len(self.records) if end is None else self.seek(end)
+        for i in range(first, last, size):
+            yield self.records[i:min(i + size, last)]
+
+    def commands(self, start=0.0, end=None):
+        """Yield (t, port, position) for every setpoint written between start and end"""
+        for chunk in self.chunks(start, end):
+            chunk = chunk[chunk['kind'] == EVENT_COMMAND]
+            for t, port, value in zip(chunk['t'].tolist(), chunk['port'].tolist(), chunk['value'].tolist()):
+                yield t, self.port_names[port], value
+
+    def summary(self):
+        """Event counts per port and kind, and the time span"""
+        counts = {}
+        for chunk in self.chunks():
+            keys, n = np.unique(chunk['port'].astype(np.int32) * 256 + chunk['kind'], return_counts=True)
+            for key, c in zip(keys.tolist(), n.tolist()):
+                key = (self.port_names[key // 256], EVENT_NAMES[key % 256])
+                counts[key] = counts.get(key, 0) + c
+        return {'records': len(self), 'duration': self.duration, 'started': self.started, 'counts': counts}
+
+def replay(log, engine, rate=1.0, start=0.0, end=None):
+    """Send the logged setpoints through a started SerialEngine on the original schedule
+
+    rate scales playback speed (2.0 plays twice as fast, inf sends
+    everything without waiting). Each command is due at an absolute time
+    computed from the log, and submitting never waits for replies, so
+    delays do not accumulate. The engine still keeps one command in flight
+    per port: a setpoint whose predecessor is unacknowledged when the next
+    one is due is superseded, as it would be live, and counted. Ports are
+    those of the log; build the engine with a port dict that has the same
+    names. Returns counts and timing statistics.
+    """
+    lateness = []
+    outcomes = {'superseded': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def count(future):
+        with lock:
+            if future.cancelled():
+                outcomes['superseded'] += 1
+            elif future.exception() is not None:
+                outcomes['failed'] += 1
+
+    last = {}
+    started = time.perf_counter()
+    first = None
+    for t, port, position in log.commands(start, end):
+        if first is None:
+            first = t
+        due = started + (t - first) / rate
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        last[port] = engine.submit(port, position)
+        last[port].add_done_callback(count)
+        lateness.append(time.perf_counter() - due)
+    elapsed = time.perf_counter() - started
+    wait(last.values(), timeout=ACK_TIMEOUT)  # Let the last setpoints be acknowledged
+    lateness = np.array(lateness) if lateness else np.zeros(1)
+    submitted = len(lateness) if first is not None else 0
+    with lock:
+        return {
+            'submitted': submitted,
+            'sent': submitted - outcomes['superseded'],
+            'superseded': outcomes['superseded'],
+            'failed': outcomes['failed'],
+            'seconds': elapsed,
+            'late': int(np.sum(lateness > LATE_TOLERANCE)) if first is not None else 0,
+            'p99_late_ms': 1000 * float(np.percentile(lateness, 99)),
+            'max_late_ms': 1000 * float(lateness.max()),
+        }
+
+def _replay_main(args):
+    from serial_engine import SerialEngine
+    from serial_manager import ConnectionManager
+    from motor_config import BAUD_RATE
+
+    log = MotionLog(args.log)
+    simulator = None
+    port_map = dict(pair.split('=', 1) for pair in args.port or [])
+    if args.virtual:
+        import tempfile
+        from virtual_delta import Simulator, Timing
+
+        temp = tempfile.TemporaryDirectory()
+        simulator = Simulator(Timing.fast() if args.fast else Timing()).start()
+        robot = simulator.add_robot(temp.name, log.port_motors)
+        port_map = {port: robot.links[port] for port in log.port_names}
+    ports = {port: {'id': motor_id, 'ser': None} for port, motor_id in log.port_motors.items()}
+    # ConnectionManager opens by device name, so key a second dict by device and share the entries
+    devices = {port_map.get(port, port): ports[port] for port in ports}
+    manager = ConnectionManager(devices, BAUD_RATE)
+    engine = SerialEngine(ports, protocol=args.protocol)
+    recorder = MotionRecorder(args.record, ports) if args.record else None
+    engine.telemetry.recorder = recorder
+    try:
+        manager.open_all()
+        with engine:
+            print(f"Replaying {args.log} ({log.duration:.1f} s) at {args.rate}x")
+            results = replay(log, engine, args.rate, args.start, args.end)
+        print(f"{results['submitted']} setpoints in {results['seconds']:.2f} s: {results['sent']} sent, "
+              f"{results['superseded']} superseded while the port was busy, {results['failed']} failed")
+        print(f"Submission timing: "
+              f"{results['late']} late by more than {1000 * LATE_TOLERANCE:.0f} ms "
+              f"(p99 {results['p99_late_ms']:.2f} ms, max {results['max_late_ms']:.2f} ms)")
+    finally:
+        manager.close_all()
+        if recorder is not None:
+            recorder.close()
+        if simulator is not None:
+            simulator.stop()
+            temp.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay motion logs recorded from the serial engine")
+    sub = parser.add_subparsers(dest='command', required=True)
+    info = sub.add_parser('info', help="print what a log contains")
+    info.add_argument('log')
+    play = sub.add_parser('replay', help="send a log's setpoints to the ports on its original schedule")
+    play.add_argument('log')
+    play.add_argument('--rate', type=float, default=1.0, help="playback speed factor (default 1, inf = no waiting)")
+    play.add_argument('--start', type=float, default=0.0, help="seconds into the log to start from")
+    play.add_argument('--end', type=float, help="seconds into the log to stop at")
+    play.add_argument('--port', action='append', metavar='LOGGED=DEVICE',
+                      help="send a logged port's commands to another device, e.g. COM11=/dev/ttyUSB0")
+    play.add_argument('--virtual', action='store_true', help="replay into an in-process virtual_delta robot")
+    play.add_argument('--fast', action='store_true', help="with --virtual, skip the simulated delays")
+    play.add_argument('--protocol', choices=['ascii', 'binary'], default='ascii')
+    play.add_argument('--record', metavar='LOG', help="record the replay itself, for comparison")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'info':
+            log = MotionLog(args.log)
+            summary = log.summary()
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(summary['started']))
+            print(f"{args.log}: {summary['records']} events over {summary['duration']:.2f} s, started {started}")
+            for (port, kind), count in sorted(summary['counts'].items()):
+                print(f"  {port} (motor ID {log.port_motors[port]}) {kind}: {count}")
+        else:
+            _replay_main(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from collections import namedtuple
+
+import numpy as np
+
+from motor_config import (JOINT_MOTORS, MAX_ACCEL, MAX_ANGLE, MAX_JERK, MAX_VELOCITY,
+                          MIN_ANGLE, angles_to_positions)
+
+# All three joints follow the same normalized profile s(t) from 0 to 1, scaled
+# by their own travel, so they start and arrive together. The profile limits
+# are the tightest per-joint limit divided by that joint's travel.
+MovePlan = namedtuple('MovePlan', [
+    'start',        # (M, 3) start angles, degrees
+    'delta',        # (M, 3) joint travel, degrees
+    'duration',     # (M,) predicted move time, seconds
+    'accel_time',   # (M,) time spent accelerating (and decelerating), seconds
+    'jerk_time',    # (M,) S-curve only: time of each jerk phase, seconds
+    'peak_rate',    # (M,) peak of ds/dt
+    'peak_accel',   # (M,) peak of d2s/dt2
+    'jerk',         # (M,) S-curve only: d3s/dt3 during jerk phases
+    'profile',      # 'trapezoid' or 'scurve'
+])
+
+def joint_limits(limits):
+    """Per-joint limit array (3,) from a {motor_id: limit} dict"""
+    return np.array([limits[motor_id] for motor_id in JOINT_MOTORS], dtype=float)
+
+def _normalized_limit(delta, limit):
+    """min over joints of limit / |travel|, inf for moves with no travel"""
+    travel = np.abs(delta)
+    with np.errstate(divide='ignore'):
+        return np.min(np.where(travel > 0, limit / travel, np.inf), axis=1)
+
+def plan_moves(start, end, profile='trapezoid', max_velocity=None, max_accel=None, max_jerk=None):
+    """Plan time-optimal synchronized moves between (M, 3) arrays of joint angles (degrees)"""
+    start = np.atleast_2d(np.asarray(start, dtype=float))
+    end = np.atleast_2d(np.asarray(end, dtype=float))
+    for name, angles in (('start', start), ('end', end)):
+        outside = np.any((angles < MIN_ANGLE) | (angles > MAX_ANGLE), axis=1)
+        if outside.any():
+            raise ValueError(f"Move {int(np.argmax(outside))} {name} angles must be between "
+                             f"{MIN_ANGLE} and {MAX_ANGLE} degrees")
+
+    delta = end - start
+    v = _normalized_limit(delta, joint_limits(max_velocity or MAX_VELOCITY))
+    a = _normalized_limit(delta, joint_limits(max_accel or MAX_ACCEL))
+    still = ~np.isfinite(v)
+    v = np.where(still, 1.0, v)
+    a = np.where(still, 1.0, a)
+
+    if profile == 'trapezoid':
+        # Triangular when the velocity limit is never reached
+        triangular = v**2 / a > 1
+        accel_time = np.where(triangular, np.sqrt(1 / a), v / a)
+        peak_rate = np.where(triangular, a * accel_time, v)
+        duration = np.where(triangular, 2 * accel_time, 1 / v + v / a)
+        jerk_time = np.zeros_like(duration)
+        jerk = np.zeros_like(duration)
+        peak_accel = a
+    elif profile == 'scurve':
+        j = _normalized_limit(delta, joint_limits(max_jerk or MAX_JERK))
+        j = np.where(still, 1.0, j)
+        # Jerk phases, then the acceleration phase assuming the velocity limit is reached
+        reach_a = v * j >= a**2
+        jerk_time = np.where(reach_a, a / j, np.sqrt(v / j))
+        accel_time = np.where(reach_a, jerk_time + v / a, 2 * jerk_time)
+        cruise_time = 1 / v - accel_time
+        # Velocity limit not reached: shorten the acceleration phase
+        short = cruise_time < 0
+        long_enough = 1 >= 2 * a**3 / j**2
+        tj_short = np.where(long_enough, a / j, np.cbrt(1 / (2 * j)))
+        ta_short = np.where(long_enough, tj_short / 2 + np.sqrt(tj_short**2 / 4 + 1 / a), 2 * tj_short)
+        jerk_time = np.where(short, tj_short, jerk_time)
+        accel_time = np.where(short, ta_short, accel_time)
+        cruise_time = np.where(short, 0.0, cruise_time)
+        peak_accel = j * jerk_time
+        peak_rate = peak_accel * (accel_time - jerk_time)
+        duration = 2 * accel_time + cruise_time
+        jerk = j
+    else:
+        raise ValueError(f"Unknown profile {profile!r}")
+
+    return MovePlan(
+        start=start,
+        delta=delta,
+        duration=np.where(still, 0.0, duration),
+        accel_time=np.where(still, 0.0, accel_time),
+        jerk_time=np.where(still, 0.0, jerk_time),
+        peak_rate=np.where(still, 0.0, peak_rate),
+        peak_accel=np.where(still, 0.0, peak_accel),
+        jerk=np.where(still, 0.0, jerk),
+        profile=profile,
+    )
+
+def plan_path(angles, profile='trapezoid', **limits):
+    """Plan the moves through an (N, 3) sequence of joint angles"""
+    angles = np.asarray(angles, dtype=float)
+    return plan_moves(angles[:-1], angles[1:], profile, **limits)
+
+def _trapezoid_duration(t_v, t_a):
+    """Trapezoid move time from the slowest joint's velocity and acceleration times (see duration_matrix)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        duration = np.where(t_a > t_v**2, 2 * np.sqrt(t_a), t_v + t_a / t_v)
+    return np.where(t_v > 0, duration, 0.0)
+
+def duration_matrix(start, end, max_velocity=None, max_accel=None):
+    """Trapezoid move time (s) from each of (M, 3) start angles to each of (K, 3) end angles, shape (M, K)
+
+    Same durations as plan_moves(..., 'trapezoid') without building the
+    plans: with T_v = max |travel| / velocity limit and T_a = max |travel| /
+    acceleration limit over the joints, a move takes T_v + T_a / T_v, or
+    2 sqrt(T_a) when it is too short to reach the velocity limit.
+    """
+    start = np.atleast_2d(np.asarray(start, dtype=float))
+    end = np.atleast_2d(np.asarray(end, dtype=float))
+    velocity = joint_limits(max_velocity or MAX_VELOCITY)
+    accel = joint_limits(max_accel or MAX_ACCEL)
+    t_v = np.zeros((len(start), len(end)))
+    t_a = np.zeros((len(start), len(end)))
+    for joint in range(3):
+        travel = np.abs(start[:, joint, None] - end[None, :, joint])
+        np.maximum(t_v, travel / velocity[joint], out=t_v)
+        np.maximum(t_a, travel / accel[joint], out=t_a)
+    return _trapezoid_duration(t_v, t_a)
+
+def move_durations(start, end, max_velocity=None, max_accel=None):
+    """Trapezoid move time (s) from each of (M, 3) start angles to the matching row of end, shape (M,)"""
+    travel = np.abs(np.atleast_2d(np.asarray(end, dtype=float)) - np.atleast_2d(np.asarray(start, dtype=float)))
+    t_v = np.max(travel / joint_limits(max_velocity or MAX_VELOCITY), axis=1)
+    t_a = np.max(travel / joint_limits(max_accel or MAX_ACCEL), axis=1)
+    return _trapezoid_duration(t_v, t_a)
+
+def _accel_position(t, plan, i):
+    """Normalized position during the acceleration phase (0 <= t <= accel_time)"""
+    ta = plan.accel_time[i]
+    peak_rate = plan.peak_rate[i]
+    if plan.profile == 'trapezoid':
+        return 0.5 * plan.peak_accel[i] * t**2
+    tj = plan.jerk_time[i]
+    j = plan.jerk[i]
+    a = plan.peak_accel[i]
+    rising = j * t**3 / 6
+    constant = j * tj**3 / 6 + 0.5 * j * tj**2 * (t - tj) + 0.5 * a * (t - tj)**2
+    # Last jerk phase mirrors the first about the end of acceleration
+    remaining = ta - t
+    falling = 0.5 * peak_rate * ta - (peak_rate * remaining - j * remaining**3 / 6)
+    return np.where(t < tj, rising, np.where(t < ta - tj, constant, falling))
+
+def normalized_position(plan, i, t):
+    """s(t) in [0, 1] for move i at times t (seconds from the start of the move)"""
+    t = np.clip(np.asarray(t, dtype=float), 0.0, plan.duration[i])
+    ta = plan.accel_time[i]
+    total = plan.duration[i]
+    if total == 0:
+        return np.ones_like(t)
+    s_accel = 0.5 * plan.peak_rate[i] * ta
+    accel = _accel_position(np.minimum(t, ta), plan, i)
+    cruise = s_accel + plan.peak_rate[i] * (t - ta)
+    decel = 1 - _accel_position(np.minimum(total - t, ta), plan, i)
+    return np.where(t <= ta, accel, np.where(t < total - ta, cruise, decel))
+
+def sample_move(plan, i, rate):
+    """(K, 3) joint angles for move i, one row per tick at rate, ending on the target"""
+    ticks = max(int(np.ceil(plan.duration[i] * rate)), 1)
+    t = np.arange(1, ticks + 1) / rate
+    s = normalized_position(plan, i, t)
+    return plan.start[i] + s[:, None] * plan.delta[i]
+
+def move_setpoints(plan, ports, rate):
+    """Yield {port: position} per tick for every move in the plan"""
+    joint_of_port = {port: JOINT_MOTORS.index(info['id']) for port, info in ports.items()}
+    for i in range(len(plan.duration)):
+        angles = sample_move(plan, i, rate)
+        positions = {port: angles_to_positions(angles[:, joint], ports[port]['id'])
+                     for port, joint in joint_of_port.items()}
+        for k in range(len(angles)):
+            yield {port: int(column[k]) for port, column in positions.items()}
+
+def cycle_report(plan):
+    """Predicted timing for a plan: per-move durations, total time and moves per second"""
+    total = float(plan.duration.sum())
+    return {
+        'durations': plan.duration.tolist(),
+        'total_time': total,
+        'moves_per_second': len(plan.duration) / total if total else float('inf'),
+    }
+
+def execute_path(angles, engine, ports, rate=50.0, profile='scurve'):
+    """Plan and stream a joint-space path through the existing position-sending path"""
+    from trajectory_stream import FixedRateScheduler
+
+    plan = plan_path(angles, profile)
+    metrics = FixedRateScheduler(rate).run(move_setpoints(plan, ports, rate), engine.submit_all)
+    metrics.update(cycle_report(plan))
+    return metrics
+
+def main():
+    try:
+        start = [float(v) for v in input("Enter start angles θ1 θ2 θ3 (degrees): ").split()]
+        end = [float(v) for v in input("Enter target angles θ1 θ2 θ3 (degrees): ").split()]
+        if len(start) != 3 or len(end) != 3:
+            print("Please enter exactly three angles.")
+            return
+        for profile in ('trapezoid', 'scurve'):
+            plan = plan_moves([start], [end], profile)
+            print(f"{profile}: {plan.duration[0]:.3f} s, peak joint speed "
+                  f"{np.max(np.abs(plan.delta[0])) * plan.peak_rate[0]:.1f}°/s")
+    except ValueError as e:
+        print(e if str(e) else "Please enter valid numerical values.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import math
+import os
+
+import numpy as np
+
+import instrumentation
+
+# Define COM ports and their corresponding motor IDs
+PORT_MOTORS = {
+    'COM11': 4,
+    'COM12': 3,
+    'COM15': 6
+}
+BAUD_RATE = 9600
+MIN_POS = 0
+MAX_POS = 1023
+MIN_ANGLE = -90
+MAX_ANGLE = 90
+
+# Motor driving each joint angle: θ1 -> ID3, θ2 -> ID4, θ3 -> ID6
+JOINT_MOTORS = (3, 4, 6)
+
+# Calibration data: {motor_id: (slope, intercept)} for position = slope * angle + intercept
+CALIBRATION = {
+    4: (-3.2778, 500),  # Motor ID 4: 0° = 500, 90° = 205
+    3: (-3.0556, 500),  # Motor ID 3: 0° = 500, 90° = 225
+    6: (3.3333, 500)    # Motor ID 6: 0° = 500, 90° = 800
+}
+
+# Lookup tables: position for every TABLE_STEP degrees from MIN_ANGLE to MAX_ANGLE.
+# calibration.py compiles fitted maps into TABLES_FILE, which replaces the
+# linear CALIBRATION formula for the motors it covers; the others keep the
+# exact formula. The file lives next to this module, wherever the process starts.
+TABLE_STEP = 0.01
+TABLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibration_tables.npz')
+
+# AX-12A motion limits per motor, derated from the 59 rpm (354°/s) no-load speed at 12 V
+MAX_VELOCITY = {4: 300.0, 3: 300.0, 6: 300.0}   # °/s
+MAX_ACCEL = {4: 1500.0, 3: 1500.0, 6: 1500.0}   # °/s²
+MAX_JERK = {4: 15000.0, 3: 15000.0, 6: 15000.0}  # °/s³, used by S-curve profiles
+MAX_TORQUE = {4: 1.5, 3: 1.5, 6: 1.5}  # N·m, AX-12A stall torque at 12 V (direct drive assumed)
+
+def make_ports(port_motors=PORT_MOTORS):
+    """Build a fresh PORTS dict: {port: {'id': motor_id, 'ser': None}}"""
+    return {port: {'id': motor_id, 'ser': None} for port, motor_id in port_motors.items()}
+
+def table_angles(step=TABLE_STEP):
+    """Angles (degrees) of the lookup-table entries"""
+    return MIN_ANGLE + step * np.arange(int(round((MAX_ANGLE - MIN_ANGLE) / step)) + 1)
+
+def load_position_tables(path=TABLES_FILE):
+    """{motor_id: table} from a file written by calibration.save_tables"""
+    with np.load(path) as data:
+        if not np.isclose(float(data['step']), TABLE_STEP):
+            raise ValueError(f"{path} has a {float(data['step'])}° step, expected {TABLE_STEP}°")
+        return {int(key[len('motor_'):]): data[key] for key in data.files if key.startswith('motor_')}
+
+def position_tables(calibration=CALIBRATION, path=None):
+    """{motor_id: conversion}: the (slope, intercept) pair from calibration, or the table in path where it has one"""
+    tables = dict(calibration)
+    if path is not None:
+        tables.update(load_position_tables(path))
+    return tables
+
+POSITION_TABLES = position_tables(path=TABLES_FILE if os.path.exists(TABLES_FILE) else None)
+
+def _is_linear(conversion):
+    """True for a (slope, intercept) pair in any sequence type, False for a lookup table"""
+    return np.shape(conversion) == (2,)
+
+def angle_to_position(angle, motor_id, tables=None):
+    """Convert angle in degrees to motor position using calibration.
+
+    Motors with a measured lookup table clamp angles outside MIN_ANGLE..MAX_ANGLE
+    to the joint limits; linear ones use position = slope * angle + intercept.
+    tables defaults to POSITION_TABLES; pass a robot's own tables otherwise.
+    Raises ValueError for a NaN or infinite angle.
+    """
+    if not math.isfinite(angle):
+        raise ValueError(f"Motor {motor_id}: angle {angle} is not finite")
+    conversion = (tables or POSITION_TABLES)[motor_id]
+    if _is_linear(conversion):
+        slope, intercept = conversion
+        # Round to integer and clamp to valid range
+        return max(MIN_POS, min(MAX_POS, int(round(slope * angle + intercept))))
+    index = int(round((angle - MIN_ANGLE) / TABLE_STEP))
+    return int(conversion[max(0, min(len(conversion) - 1, index))])
+
+@instrumentation.span('calibration.batch')
+def angles_to_positions(angles, motor_id, tables=None):
+    """Vectorized angle_to_position for an array of angles in degrees."""
+    conversion = (tables or POSITION_TABLES)[motor_id]
+    angles = np.asarray(angles, dtype=float)
+    # One reduction instead of an isfinite mask: the sum is finite only if every angle is
+    if not np.isfinite(angles.sum()):
+        raise ValueError(f"Motor {motor_id}: angle {angles.flat[np.argmin(np.isfinite(angles))]} is not finite")
+    if _is_linear(conversion):
+        slope, intercept = conversion
+        return np.clip(np.rint(slope * angles + intercept), MIN_POS, MAX_POS).astype(np.int32)
+    index = np.rint((angles - MIN_ANGLE) / TABLE_STEP)
+    return conversion[np.clip(index, 0, len(conversion) - 1).astype(np.intp)].astype(np.int32)
+
+def positions_to_angles(positions, motor_id, tables=None):
+    """Approximate inverse of angles_to_positions (degrees)"""
+    conversion = (tables or POSITION_TABLES)[motor_id]
+    if _is_linear(conversion):
+        slope, intercept = conversion
+        return (np.asarray(positions, dtype=float) - intercept) / slope
+    # Each position covers a run of table entries; map it to the middle of its run
+    values, first, counts = np.unique(conversion, return_index=True, return_counts=True)
+    return np.interp(positions, values, MIN_ANGLE + TABLE_STEP * (first + (counts - 1) / 2))
@@ -0,0 +1,400 @@
+import argparse
+import json
+import logging
+import os
+import selectors
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import serial
+
+from ik_delta import IK_COEFFS, get_thetas_batch, ik_coefficients
+from motor_config import BAUD_RATE, CALIBRATION, JOINT_MOTORS, PORT_MOTORS, angle_to_position, make_ports, position_tables
+from serial_engine import ACK_TIMEOUT, ReplyMatcher, encode_command
+from serial_manager import ConnectionManager
+from serial_protocol import FrameDecoder, FrameEncoder
+from serial_telemetry import EVENT_COMMAND, Telemetry
+from workspace_atlas import choose_branch
+
+CELL_FILE = 'cell.json'
+GEOMETRY_KEYS = ('sp', 'L', 'l', 'wb', 'wp', 'up')  # Lengths that enter the IK (In[2])
+CONNECTION_CHECK = 0.1  # Seconds between checks for ports opened or reopened by a ConnectionManager
+READ_SIZE = 128  # Bytes per read, well inside the FrameDecoder buffer
+SCALING_COUNTS = (1, 2, 4, 8)
+
+log = logging.getLogger(__name__)
+
+class Robot:
+    """One delta robot: its ports and motor IDs, geometry and calibration
+
+    port_motors maps port names to motor IDs like motor_config.PORT_MOTORS.
+    geometry overrides any of the In[2] lengths used for IK. calibration is
+    {motor_id: (slope, intercept)} like CALIBRATION, and tables_path a
+    calibration.py tables file that replaces it for the motors it covers.
+    """
+
+    def __init__(self, name, port_motors=PORT_MOTORS, geometry=None, calibration=CALIBRATION,
+                 tables_path=None, joint_motors=JOINT_MOTORS):
+        self.name = name
+        self.ports = make_ports(port_motors)
+        self.geometry = dict(geometry or {})
+        unknown = set(self.geometry) - set(GEOMETRY_KEYS)
+        if unknown:
+            raise ValueError(f"{name}: unknown geometry {sorted(unknown)}, expected some of {GEOMETRY_KEYS}")
+        self.ik_coeffs = ik_coefficients(**self.geometry) if self.geometry else IK_COEFFS
+        self.tables = position_tables(calibration, tables_path)
+        port_of = {motor_id: port for port, motor_id in port_motors.items()}
+        missing = [motor_id for motor_id in joint_motors if motor_id not in port_of or motor_id not in self.tables]
+        if missing:
+            raise ValueError(f"{name}: no port or calibration for motor ID(s) {missing}")
+        self.joint_ports = [port_of[motor_id] for motor_id in joint_motors]
+        self.telemetry = Telemetry(self.ports)
+
+    def positions(self, angles):
+        """{port: position} for (θ1, θ2, θ3) in degrees, through this robot's calibration"""
+        return {port: angle_to_position(angle, self.ports[port]['id'], self.tables)
+                for port, angle in zip(self.joint_ports, angles)}
+
+    def solve(self, x, y, z):
+        """Joint angles (degrees) within the limits for this robot's geometry, or None"""
+        _, thetas_deg, reachable = get_thetas_batch([[x, y, z]], self.ik_coeffs)
+        angles, ok = choose_branch(thetas_deg)
+        return tuple(angles[0].tolist()) if reachable[0] and ok[0] else None
+
+def load_cell(path=CELL_FILE):
+    """Robots described by a JSON file:
+
+    {"robots": [{"name": "left", "ports": {"COM11": 4, "COM12": 3, "COM15": 6},
+                 "geometry": {"L": 0.524}, "calibration": {"4": [-3.2778, 500], ...},
+                 "tables": "left_tables.npz"}, ...]}
+
+    Only name and ports are required; the rest defaults to motor_config.
+    """
+    with open(path) as f:
+        cell = json.load(f)
+    robots = []
+    for spec in cell['robots']:
+        calibration = CALIBRATION
+        if 'calibration' in spec:
+            calibration = {int(motor_id): tuple(pair) for motor_id, pair in spec['calibration'].items()}
+        robots.append(Robot(spec['name'], {port: int(motor_id) for port, motor_id in spec['ports'].items()},
+                            spec.get('geometry'), calibration, spec.get('tables')))
+    return robots
+
+class _Port:
+    """Queue and in-flight state of one serial port, owned by the controller's I/O thread"""
+
+    def __init__(self, robot, port, info):
+        self.robot = robot
+        self.port = port
+        self.info = info
+        self.ser = None  # Connection registered with the selector
+        self.fd = None
+        self.encoder = FrameEncoder()
+        self.decoder = FrameDecoder()
+        self.pending = None  # (position, future)
+        self.replies = ReplyMatcher(port, info['id'], robot.telemetry)
+
+class FleetController:
+    """Drives several robots from one process and one I/O thread
+
+    Each port behaves as in SerialEngine: one command in flight until it is
+    acknowledged, and a newer setpoint replaces one that has not been sent.
+    Instead of two threads per port, a single selector loop writes and reads
+    every port of every robot. Each turn the loop visits the robots in
+    round-robin order, starting one robot further along each time, and sends
+    at most one setpoint per idle port, so a busy robot cannot starve the
+    others. Needs ports with file descriptors (Linux, macOS).
+    """
+
+    def __init__(self, robots, protocol='ascii', ack_timeout=ACK_TIMEOUT, baud_rate=BAUD_RATE):
+        self.robots = {robot.name: robot for robot in robots}
+        self.protocol = protocol
+        self.ack_timeout = ack_timeout
+        self.managers = {name: ConnectionManager(robot.ports, baud_rate) for name, robot in self.robots.items()}
+        self._ports = {name: {port: _Port(robot, port, info) for port, info in robot.ports.items()}
+                       for name, robot in self.robots.items()}
+        self._order = list(self.robots)
+        self._turn = 0
+        self._counts = {name: dict.fromkeys(('commands', 'acked', 'rejected', 'timeouts', 'superseded', 'failed'), 0)
+                        for name in self.robots}
+        self._started_at = None
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._running = False
+        self._thread = None
+
+    def open(self):
+        """Open every port of every robot concurrently and watch for dropped ports"""
+        with ThreadPoolExecutor(max_workers=len(self.managers)) as pool:
+            times = dict(zip(self.managers, pool.map(lambda manager: manager.open_all(), self.managers.values())))
+        for manager in self.managers.values():
+            manager.start_watcher()
+        return times
+
+    def start(self):
+        self.open()
+        self._running = True
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="robot-fleet", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        os.write(self._wake_w, b'x')
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            for state in self._states():
+                if state.pending is not None:
+                    state.pending[1].cancel()
+                state.pending = None
+                state.replies.fail(ConnectionError(f"Controller stopped before {state.port} replied"))
+        for manager in self.managers.values():
+            manager.close_all()
+        self._selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def submit(self, robot, port_positions):
+        """Queue setpoints for some of a robot's ports; returns {port: future} like SerialEngine.submit_all"""
+        futures = {}
+        with self._lock:
+            ports = self._ports[robot]
+            for port, position in port_positions.items():
+                state = ports[port]
+                if state.pending is not None:
+                    state.pending[1].cancel()  # Superseded before it was sent
+                    self._counts[robot]['superseded'] += 1
+                futures[port] = Future()
+                state.pending = (position, futures[port])
+        os.write(self._wake_w, b'x')
+        return futures
+
+    def move(self, robot, angles):
+        """Queue joint angles (degrees) for a robot; returns {port: future}"""
+        return self.submit(robot, self.robots[robot].positions(angles))
+
+    def move_to(self, robot, x, y, z):
+        """Queue a Cartesian position for a robot; raises ValueError if it cannot reach it"""
+        angles = self.robots[robot].solve(x, y, z)
+        if angles is None:
+            raise ValueError(f"{robot}: ({x}, {y}, {z}) is not reachable within the joint limits")
+        return self.move(robot, angles)
+
+    def metrics(self):
+        """Per robot: command counts, acknowledged setpoints per second and worst per-motor latency"""
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            counts = {name: dict(c) for name, c in self._counts.items()}
+        result = {}
+        for name, robot in self.robots.items():
+            latency = [stats for stats in robot.telemetry.latency_summary().values() if stats['count']]
+            result[name] = dict(counts[name],
+                                setpoints_per_second=counts[name]['acked'] / elapsed if elapsed else 0.0,
+                                p50_ms=max((s['p50_ms'] for s in latency), default=None),
+                                p99_ms=max((s['p99_ms'] for s in latency), default=None))
+        return result
+
+    def _states(self):
+        for ports in self._ports.values():
+            yield from ports.values()
+
+    def _run(self):
+        next_check = 0.0
+        while self._running:
+            now = time.perf_counter()
+            with self._lock:
+                if now >= next_check:
+                    self._sync_connections()
+                    next_check = now + CONNECTION_CHECK
+                self._dispatch()
+                deadline = min((state.replies.sent_at() + self.ack_timeout for state in self._states()
+                                if state.replies.busy), default=next_check)
+            timeout = max(min(deadline, next_check) - time.perf_counter(), 0)
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    os.read(self._wake_r, 4096)
+                    continue
+                with self._lock:
+                    self._read(key.data)
+            with self._lock:
+                self._expire(time.perf_counter())
+
+    def _sync_connections(self):
+        """Register ports the ConnectionManagers have opened since the last check"""
+        for state in self._states():
+            ser = state.info['ser']
+            if ser is state.ser:
+                continue
+            if state.fd is not None:
+                self._selector.unregister(state.fd)
+            state.ser, state.fd = ser, None
+            if ser is not None:
+                state.fd = ser.fileno()
+                self._selector.register(state.fd, selectors.EVENT_READ, state)
+
+    def _dispatch(self):
+        """Send pending setpoints to idle ports, robots in rotating round-robin order"""
+        n = len(self._order)
+        for i in range(n):
+            name = self._order[(self._turn + i) % n]
+            for state in self._ports[name].values():
+                if state.pending is not None and not state.replies.busy:
+                    position, future = state.pending
+                    state.pending = None
+                    if future.set_running_or_notify_cancel():
+                        self._send(state, position, future)
+        self._turn = (self._turn + 1) % n
+
+    def _send(self, state, position, future):
+        if state.ser is None:
+            self._counts[state.robot.name]['failed'] += 1
+            future.set_exception(ConnectionError(f"No connection to {state.port}"))
+            return
+        seq, data = encode_command(self.protocol, state.encoder, state.info['id'], position)
+        sent_at = time.perf_counter()
+        state.replies.begin(seq, position, future, sent_at)
+        try:
+            state.ser.write(data)
+        except (serial.SerialException, OSError) as e:
+            log.error("Error sending to %s: %s", state.port, e)
+            self._counts[state.robot.name]['failed'] += 1
+            state.replies.fail(e, future)
+            self._drop(state)
+            return
+        state.robot.telemetry.record(state.port, EVENT_COMMAND, position, t=sent_at)
+        self._counts[state.robot.name]['commands'] += 1
+
+    def _drop(self, state):
+        """Forget a failed connection and let its ConnectionManager reopen it"""
+        if state.fd is not None:
+            self._selector.unregister(state.fd)
+        state.ser, state.fd = None, None
+        self.managers[state.robot.name].mark_failed(state.port)
+
+    def _read(self, state):
+        try:
+            data = os.read(state.fd, READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        received_at = time.perf_counter()
+        if not data:
+            log.error("Lost connection to %s", state.port)
+            self._drop(state)
+            return
+        for item in state.decoder.feed(data):
+            outcome = state.replies.handle(item, received_at)
+            if outcome is not None:
+                self._counts[state.robot.name][outcome] += 1
+
+    def _expire(self, now):
+        for state in self._states():
+            if state.replies.expire(now=now, timeout=self.ack_timeout):
+                self._counts[state.robot.name]['timeouts'] += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def scaling_test(robot_counts=SCALING_COUNTS, commands=50, protocol='ascii', timing=None):
+    """Acknowledged setpoints per second for 1, 2, 4, ... simulated robots on one FleetController
+
+    Every robot gets a new setpoint triple each tick, and the next tick starts
+    once all of them are acknowledged, like a cell moving its robots together.
+    Uses virtual_delta with its default (real) sketch and baud-rate delays
+    unless timing is given.
+    """
+    import tempfile
+
+    from virtual_delta import Simulator, Timing
+
+    results = []
+    for count in robot_counts:
+        with tempfile.TemporaryDirectory() as base_dir, Simulator(timing or Timing()) as simulator:
+            fleet = simulator.add_fleet(count, base_dir)
+            robots = [Robot(f"robot_{i}", {link: virtual.sketches[port].motor_id for port, link in virtual.links.items()})
+                      for i, virtual in enumerate(fleet)]
+            failed = 0
+            with FleetController(robots, protocol) as controller:
+                start_time = time.perf_counter()
+                for i in range(commands):
+                    futures = [f for robot in robots
+                               for f in controller.submit(robot.name, {port: (i * 37 + 100 * k) % 1024
+                                                                       for k, port in enumerate(robot.ports)}).values()]
+                    wait(futures, timeout=2 * ACK_TIMEOUT)
+                    failed += sum(1 for f in futures if not f.done() or f.cancelled() or f.exception() is not None)
+                elapsed = time.perf_counter() - start_time
+                metrics = controller.metrics()
+            rate = count * commands * 3 / elapsed
+            results.append({
+                'robots': count,
+                'setpoints_per_second': rate,
+                'efficiency': rate / (count * results[0]['setpoints_per_second'] / results[0]['robots'])
+                if results else 1.0,
+                'p99_ms': max((m['p99_ms'] for m in metrics.values() if m['p99_ms'] is not None), default=None),
+                'failed': failed,
+            })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive several delta robots from one process")
+    parser.add_argument('cell', nargs='?', default=CELL_FILE, help=f"robot description JSON (default {CELL_FILE})")
+    parser.add_argument('--protocol', choices=['ascii', 'binary'], default='ascii')
+    parser.add_argument('--scaling', type=int, nargs='*', metavar='ROBOTS',
+                        help=f"measure throughput with this many simulated robots (default {SCALING_COUNTS}), then exit")
+    parser.add_argument('--commands', type=int, default=50, help="setpoint ticks per --scaling run (default 50)")
+    parser.add_argument('--fast', action='store_true', help="--scaling without the simulated sketch delays")
+    args = parser.parse_args()
+
+    if args.scaling is not None:
+        from virtual_delta import Timing
+
+        timing = Timing.fast() if args.fast else None
+        for result in scaling_test(args.scaling or SCALING_COUNTS, args.commands, args.protocol, timing):
+            print(f"{result['robots']:3d} robots: {result['setpoints_per_second']:8.1f} setpoints/s "
+                  f"({result['efficiency']:.0%} of linear), p99 {result['p99_ms']:.1f} ms, {result['failed']} failed")
+        return
+
+    try:
+        robots = load_cell(args.cell)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading {args.cell}: {e}", file=sys.stderr)
+        sys.exit(1)
+    with FleetController(robots, args.protocol) as controller:
+        try:
+            while True:
+                user_input = input(f"Enter a robot ({', '.join(controller.robots)}) and x y z in meters "
+                                   f"(or 'stats' for per-robot metrics, 'q' to quit): ").strip()
+                if user_input.lower() == 'q':
+                    break
+                if user_input.lower() == 'stats':
+                    for name, m in controller.metrics().items():
+                        latency = f"p50 {m['p50_ms']:.1f} ms, p99 {m['p99_ms']:.1f} ms" if m['p99_ms'] else "no replies yet"
+                        print(f"{name}: {m['acked']}/{m['commands']} acknowledged, {m['rejected']} rejected, "
+                              f"{m['timeouts']} timed out, {m['superseded']} superseded, {latency}")
+                    continue
+                parts = user_input.split()
+                if len(parts) != 4 or parts[0] not in controller.robots:
+                    print("Please enter a robot name followed by three coordinates.")
+                    continue
+                try:
+                    futures = controller.move_to(parts[0], *(float(v) for v in parts[1:]))
+                except ValueError as e:
+                    print(e)
+                    continue
+                wait(futures.values(), timeout=ACK_TIMEOUT)
+        except KeyboardInterrupt:
+            print("\nProgram interrupted by user.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, wait
+
+import serial
+
+import instrumentation
+from serial_protocol import FRAME_ACK, FRAME_NAK, FrameDecoder, FrameEncoder, parse_reply
+from serial_telemetry import EVENT_COMMAND, EVENT_FRAME, EVENT_LINE, Telemetry
+
+# Replies printed by the Absolute movement sketches after each command
+ACK_PREFIX = "Moving to position:"
+NAK_PREFIX = "Invalid position!"
+ACK_TIMEOUT = 2.0  # Seconds to wait for the Arduino to acknowledge a setpoint
+
+log = logging.getLogger(__name__)
+
+ENCODE_SPAN = instrumentation.span('serial.encode')
+WRITE_SPAN = instrumentation.span('serial.write')
+ACK_SPAN = instrumentation.span('serial.ack_wait')
+DECODE_SPAN = instrumentation.span('serial.decode')
+COMMANDS = instrumentation.counter('serial.commands')
+SUPERSEDED = instrumentation.counter('serial.superseded')
+TIMEOUTS = instrumentation.counter('serial.timeouts')
+REJECTED = instrumentation.counter('serial.rejected')
+BYTES_OUT = instrumentation.counter('serial.bytes_out')
+BYTES_IN = instrumentation.counter('serial.bytes_in')
+
+def encode_command(protocol, encoder, motor_id, position):
+    """(seq or None, bytes) for one setpoint in the 'ascii' or 'binary' protocol"""
+    if protocol == 'binary':
+        return encoder.encode_setpoint(motor_id, position)
+    return None, f"{position}\n".encode('ascii')
+
+class ReplyMatcher:
+    """The in-flight command of one port, and the matching of replies to it
+
+    Holds at most one command. Binary replies are matched by sequence
+    number and ASCII acknowledgements by the position the sketch echoes, so
+    a late reply to a command that already timed out resolves nothing.
+    Every line and frame is recorded in telemetry, and resolved commands
+    add their round trip to its latency histogram. Thread-safe, so the
+    sender and the reader of a port may be different threads.
+    """
+
+    def __init__(self, port, motor_id, telemetry):
+        self.port = port
+        self.motor_id = motor_id
+        self.telemetry = telemetry
+        self._lock = threading.Lock()
+        self._inflight = None  # (seq or None, position, future, time sent)
+
+    @property
+    def busy(self):
+        return self._inflight is not None
+
+    def sent_at(self):
+        """When the in-flight command was written, or None"""
+        inflight = self._inflight
+        return inflight[3] if inflight is not None else None
+
+    def begin(self, seq, position, future, sent_at):
+        with self._lock:
+            self._inflight = (seq, position, future, sent_at)
+
+    def take(self, seq=None, future=None, position=None):
+        """Remove and return the in-flight command if it matches seq/future/position"""
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                return None
+            if seq is not None and inflight[0] != seq:
+                return None
+            if position is not None and inflight[1] != position:
+                return None
+            if future is not None and inflight[2] is not future:
+                return None
+            self._inflight = None
+            return inflight
+
+    def fail(self, error, future=None):
+        """Fail the in-flight command (only if it is future, when given); returns True if one was failed"""
+        inflight = self.take(future=future)
+        if inflight is None:
+            return False
+        inflight[2].set_exception(error)
+        return True
+
+    def expire(self, future=None, now=None, timeout=ACK_TIMEOUT):
+        """Time out the in-flight command if it is future, or if at now it is older than timeout
+
+        Returns True if a command timed out.
+        """
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None or (future is not None and inflight[2] is not future):
+                return False
+            if now is not None and now - inflight[3] <= timeout:
+                return False
+            self._inflight = None
+        TIMEOUTS.add()
+        inflight[2].set_exception(TimeoutError(f"No acknowledgement from {self.port}"))
+        return True
+
+    def handle(self, item, received_at):
+        """Record a decoded line or frame and resolve the command it answers
+
+        Returns 'acked', 'rejected' or None if it answered nothing.
+        """
+        if isinstance(item, str):
+            return self._on_line(item, received_at)
+        return self._on_frame(item, received_at)
+
+    def _on_line(self, line, received_at):
+        self.telemetry.record(self.port, EVENT_LINE, text=line.encode('ascii', 'replace'), t=received_at)
+        log.info("%s: %s", self.port, line)
+        if line.startswith(ACK_PREFIX):
+            try:
+                position = int(line[len(ACK_PREFIX):])
+            except ValueError:
+                log.warning("%s: unreadable acknowledgement %r", self.port, line)
+                inflight = self.take()
+                if inflight is None:
+                    return None
+                return self._resolve(inflight, received_at, error=ValueError(f"{self.port}: unreadable reply {line!r}"))
+            # The sketch echoes the position, so a late ACK for a timed-out command is not taken for this one
+            inflight = self.take(position=position)
+            if inflight is not None:
+                return self._resolve(inflight, received_at, result=position)
+        elif line.startswith(NAK_PREFIX):
+            inflight = self.take()
+            if inflight is not None:
+                return self._resolve(inflight, received_at, error=ValueError(f"{self.port}: {line}"))
+        return None
+
+    def _on_frame(self, frame, received_at):
+        if frame.type not in (FRAME_ACK, FRAME_NAK):
+            self.telemetry.record(self.port, EVENT_FRAME, t=received_at)
+            log.warning("%s: dropped frame of unexpected type 0x%02x", self.port, frame.type)
+            return None
+        try:
+            motor_id, value = parse_reply(frame.payload)
+        except ValueError as e:
+            self.telemetry.record(self.port, EVENT_FRAME, t=received_at)
+            log.warning("%s: dropped reply frame %d: %s", self.port, frame.seq, e)
+            return None
+        self.telemetry.record(self.port, EVENT_FRAME, value, t=received_at)
+        inflight = self.take(seq=frame.seq)
+        if inflight is None:
+            return None  # Late reply to a command that already timed out
+        if frame.type == FRAME_ACK:
+            log.info("%s: motor %d acknowledged %d", self.port, motor_id, value)
+            return self._resolve(inflight, received_at, result=value)
+        log.warning("%s: motor %d rejected %d (error %d)", self.port, motor_id, inflight[1], value)
+        return self._resolve(inflight, received_at, error=ValueError(
+            f"{self.port}: motor {motor_id} rejected {inflight[1]} (error {value})"))
+
+    def _resolve(self, inflight, received_at, result=None, error=None):
+        _, _, future, sent_at = inflight
+        self.telemetry.latency.record(self.motor_id, received_at - sent_at)
+        if instrumentation.is_enabled():
+            ACK_SPAN.record(received_at - sent_at)
+        if error is not None:
+            REJECTED.add()
+            future.set_exception(error)
+            return 'rejected'
+        future.set_result(result)
+        return 'acked'
+
+class _PortWorker(threading.Thread):
+    """Long-lived sender for one serial port, paired with a background reader.
+
+    Holds at most one queued setpoint: a newer setpoint replaces an older one
+    that has not been written yet, and the older future is cancelled. The
+    reader thread timestamps everything the Arduino sends and resolves the
+    in-flight command when its acknowledgement arrives.
+    """
+
+    def __init__(self, port, info, telemetry, on_error=None, protocol='ascii'):
+        super().__init__(name=f"serial-{port}", daemon=True)
+        self.port = port
+        self.info = info
+        self.telemetry = telemetry
+        self.on_error = on_error
+        self.protocol = protocol
+        self._encoder = FrameEncoder()
+        self._decoder = FrameDecoder()
+        self._cond = threading.Condition()
+        self._pending = None  # (position, future)
+        self._running = True
+        self._replies = ReplyMatcher(port, info['id'], telemetry)
+        self._reader = threading.Thread(target=self._read_loop, name=f"serial-{port}-reader", daemon=True)
+
+    def start(self):
+        super().start()
+        self._reader.start()
+
+    def submit(self, position):
+        future = Future()
+        with self._cond:
+            if self._pending is not None:
+                self._pending[1].cancel()  # Superseded before it was sent
+                SUPERSEDED.add()
+            self._pending = (position, future)
+            self._cond.notify()
+        return future
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            if self._pending is not None:
+                self._pending[1].cancel()
+                self._pending = None
+            self._cond.notify()
+        ser = self.info['ser']
+        if ser is not None and hasattr(ser, 'cancel_read'):
+            ser.cancel_read()
+
+    def join(self, timeout=None):
+        super().join(timeout)
+        self._reader.join(timeout)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                position, future = self._pending
+                self._pending = None
+            if future.set_running_or_notify_cancel():
+                self._send(position, future)
+
+    def _send(self, position, future):
+        ser = self.info['ser']
+        if ser is None:
+            log.warning("No connection to %s. Skipping.", self.port)
+            future.set_exception(ConnectionError(f"No connection to {self.port}"))
+            return
+        started = ENCODE_SPAN.start()
+        seq, data = encode_command(self.protocol, self._encoder, self.info['id'], position)
+        ENCODE_SPAN.stop(started)
+
+        sent_at = time.perf_counter()
+        self._replies.begin(seq, position, future, sent_at)
+        try:
+            started = WRITE_SPAN.start()
+            ser.write(data)
+            WRITE_SPAN.stop(started)
+            log.info("Sent %s to %s (Motor ID %s)", position, self.port, self.info['id'])
+        except serial.SerialException as e:
+            log.error("Error sending to %s: %s", self.port, e)
+            self._replies.fail(e, future)
+            if self.on_error is not None:
+                self.on_error(self.port)
+            return
+        self.telemetry.record(self.port, EVENT_COMMAND, position, t=sent_at)
+        COMMANDS.add()
+        BYTES_OUT.add(len(data))
+
+        # Wait for the reader to match the acknowledgement before sending more
+        wait([future], timeout=ACK_TIMEOUT)
+        self._replies.expire(future)
+
+    def _read_loop(self):
+        while self._running:
+            ser = self.info['ser']
+            if ser is None or not ser.is_open:
+                time.sleep(0.05)
+                continue
+            try:
+                data = ser.read(ser.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                if not self._running:
+                    return
+                log.error("Error reading from %s: %s", self.port, e)
+                if self.on_error is not None:
+                    self.on_error(self.port)
+                continue
+            if not data:
+                continue
+            received_at = time.perf_counter()
+            BYTES_IN.add(len(data))
+            started = DECODE_SPAN.start()
+            items = self._decoder.feed(data)
+            DECODE_SPAN.stop(started)
+            for item in items:
+                self._replies.handle(item, received_at)
+
+class SerialEngine:
+    """One persistent worker per port, fed through single-slot coalescing queues.
+
+    submit() returns immediately with a concurrent.futures.Future that resolves
+    to the position the Arduino acknowledged. Use asyncio.wrap_future to await
+    it from a coroutine. on_error(port) is called after a serial error, e.g.
+    ConnectionManager.mark_failed. protocol is 'ascii' (text lines) or
+    'binary' (frames from serial_protocol). Round-trip latencies and all
+    inbound traffic are kept in self.telemetry (see serial_telemetry).
+    """
+
+    def __init__(self, ports, on_error=None, protocol='ascii', telemetry=None):
+        self.ports = ports
+        self.protocol = protocol
+        self.telemetry = telemetry if telemetry is not None else Telemetry(ports)
+        self._workers = {port: _PortWorker(port, info, self.telemetry, on_error, protocol)
+                         for port, info in ports.items()}
+
+    def start(self):
+        for worker in self._workers.values():
+            worker.start()
+        return self
+
+    def stop(self):
+        for worker in self._workers.values():
+            worker.stop()
+        for worker in self._workers.values():
+            # The sender can finish before its reader, so join every started worker
+            if worker.ident is not None:
+                worker.join()
+
+    def submit(self, port, position):
+        """Queue a setpoint for one port, replacing any setpoint not yet sent"""
+        return self._workers[port].submit(position)
+
+    def submit_all(self, port_positions):
+        """Queue setpoints for several ports at once; returns {port: future}"""
+        return {port: self.submit(port, position) for port, position in port_positions.items()}
+
+    def latency_summary(self):
+        """Round-trip latency per motor ID: {'count', 'mean_ms', 'p50_ms', 'p99_ms'}"""
+        return self.telemetry.latency_summary()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+
+# First line printed by the Absolute movement sketches once setup() is done
+READY_BANNER = "Enter a position"
+READY_TIMEOUT = 4.0  # Upper bound on Arduino reset + setup(); replaces the fixed 3 s sleep
+RECONNECT_INTERVAL = 2.0
+
+log = logging.getLogger(__name__)
+
+class ConnectionManager:
+    """Opens, watches and reopens the serial ports described by a PORTS dict.
+
+    The 'ser' entry of each port is updated in place, so SerialEngine workers
+    pick up a reconnected port on their next send.
+    """
+
+    def __init__(self, ports, baud_rate=9600, ready_timeout=READY_TIMEOUT,
+                 reconnect_interval=RECONNECT_INTERVAL):
+        self.ports = ports
+        self.baud_rate = baud_rate
+        self.ready_timeout = ready_timeout
+        self.reconnect_interval = reconnect_interval
+        self.startup_times = {}  # port -> seconds until ready, None if it failed
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def _open(self, port, report_errors=True):
+        """Open one port and wait for the ready banner; returns seconds taken or None"""
+        start_time = time.time()
+        try:
+            ser = serial.Serial(port, self.baud_rate, timeout=0.1)
+        except serial.SerialException as e:
+            if report_errors:
+                log.error("Error connecting to %s: %s", port, e)
+            return None
+
+        ready = False
+        try:
+            while time.time() - start_time < self.ready_timeout:
+                raw_data = ser.readline()
+                try:
+                    line = raw_data.decode('ascii').strip()
+                except UnicodeDecodeError:
+                    continue  # Skip non-decodable bytes
+                if line:
+                    log.info("%s: %s", port, line)
+                if line.startswith(READY_BANNER):
+                    ready = True
+                    break
+            ser.timeout = 1
+        except serial.SerialException as e:
+            log.error("Error connecting to %s: %s", port, e)
+            ser.close()
+            return None
+
+        elapsed = time.time() - start_time
+        with self._lock:
+            self.ports[port]['ser'] = ser
+        if ready:
+            log.info("Connected to %s for motor ID %s (ready in %.2f s)", port, self.ports[port]['id'], elapsed)
+        else:
+            log.info("Connected to %s for motor ID %s (no ready banner after %.2f s)",
+                     port, self.ports[port]['id'], elapsed)
+        return elapsed
+
+    def open_all(self):
+        """Open every port concurrently; returns {port: startup seconds or None}"""
+        with ThreadPoolExecutor(max_workers=len(self.ports)) as pool:
+            times = dict(zip(self.ports, pool.map(self._open, self.ports)))
+        self.startup_times.update(times)
+        return times
+
+    def mark_failed(self, port):
+        """Drop a port after an I/O error so the watcher reconnects it"""
+        with self._lock:
+            ser = self.ports[port]['ser']
+            self.ports[port]['ser'] = None
+        if ser is not None:
+            try:
+                ser.close()
+            except serial.SerialException:
+                pass
+            log.warning("Lost connection to %s", port)
+
+    def _watch(self):
+        while not self._stop.wait(self.reconnect_interval):
+            for port, info in self.ports.items():
+                ser = info['ser']
+                if ser is not None and not ser.is_open:
+                    self.mark_failed(port)
+                if info['ser'] is None:
+                    elapsed = self._open(port, report_errors=False)
+                    if elapsed is not None:
+                        self.startup_times[port] = elapsed
+                        log.info("Reconnected to %s", port)
+
+    def start_watcher(self):
+        """Reconnect dropped ports in a background thread"""
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="serial-watcher", daemon=True)
+            self._watcher.start()
+
+    def close_all(self):
+        """Stop the watcher and close all serial connections."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        for port, info in self.ports.items():
+            if info['ser'] is not None:
+                info['ser'].close()
+                info['ser'] = None
+                log.info("Closed connection to %s", port)
@@ -0,0 +1,198 @@
+import os
+import pty
+import struct
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Binary frames, laid out like Dynamixel protocol 1.0 packets:
+#   0xFF 0xFF | seq | type | len | payload[len] | checksum
+# checksum = ~(seq + type + len + sum(payload)) & 0xFF. ASCII commands never
+# contain 0xFF, so the sketches can accept both formats on the same port.
+HEADER = b'\xff\xff'
+FRAME_SETPOINT = 0x01  # payload: n x (motor id, position lo, position hi)
+FRAME_ACK = 0x81       # payload: (motor id, position lo, position hi)
+FRAME_NAK = 0x82       # payload: (motor id, error code)
+MAX_PAYLOAD = 24       # Must match MAX_PAYLOAD in the Absolute movement sketches
+SETPOINT_SIZE = 3
+MAX_SETPOINTS = MAX_PAYLOAD // SETPOINT_SIZE
+
+# NAK error codes
+ERROR_RANGE = 1
+ERROR_CHECKSUM = 2
+
+Frame = namedtuple('Frame', ['seq', 'type', 'payload'])
+
+def checksum(data):
+    """Dynamixel-style checksum over seq, type, len and payload"""
+    return ~sum(data) & 0xFF
+
+class FrameEncoder:
+    """Builds setpoint frames into one preallocated buffer.
+
+    The returned memoryview is only valid until the next encode call.
+    """
+
+    def __init__(self):
+        self._buf = bytearray(len(HEADER) + 3 + MAX_PAYLOAD + 1)
+        self._view = memoryview(self._buf)
+        self._buf[0:2] = HEADER
+        self.seq = 0
+
+    def encode_setpoints(self, setpoints):
+        """Encode [(motor_id, position), ...] into one frame; returns (seq, memoryview)"""
+        if not 0 < len(setpoints) <= MAX_SETPOINTS:
+            raise ValueError(f"A frame holds 1 to {MAX_SETPOINTS} setpoints")
+        self.seq = (self.seq + 1) & 0xFF
+        length = SETPOINT_SIZE * len(setpoints)
+        struct.pack_into('BBB', self._buf, 2, self.seq, FRAME_SETPOINT, length)
+        offset = 5
+        for motor_id, position in setpoints:
+            struct.pack_into('<BH', self._buf, offset, motor_id, position)
+            offset += SETPOINT_SIZE
+        self._buf[offset] = checksum(self._view[2:offset])
+        return self.seq, self._view[:offset + 1]
+
+    def encode_setpoint(self, motor_id, position):
+        """Encode a single setpoint; returns (seq, memoryview)"""
+        return self.encode_setpoints(((motor_id, position),))
+
+def encode_reply(seq, frame_type, payload):
+    """Build an ACK/NAK frame the way the sketches do"""
+    body = bytes([seq, frame_type, len(payload)]) + bytes(payload)
+    return HEADER + body + bytes([checksum(body)])
+
+class FrameDecoder:
+    """Incremental parser for a byte stream mixing frames and ASCII lines.
+
+    Bytes are accumulated in a fixed bytearray; feed() returns Frame tuples
+    and decoded text lines in arrival order. Corrupt frames are counted in
+    self.errors and skipped.
+    """
+
+    def __init__(self, size=256):
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._len = 0
+        self.errors = 0
+
+    def feed(self, data):
+        n = len(data)
+        if self._len + n > len(self._buf):
+            # Should not happen with well-formed input; drop what we have
+            self.errors += 1
+            self._len = 0
+            n = min(n, len(self._buf))
+        self._view[self._len:self._len + n] = data[:n]
+        self._len += n
+
+        out = []
+        start = 0
+        buf = self._buf
+        while start < self._len:
+            if buf[start] == 0xFF:
+                if self._len - start < 5:
+                    break
+                if buf[start + 1] != 0xFF or buf[start + 4] > MAX_PAYLOAD:
+                    self.errors += 1
+                    start += 1
+                    continue
+                end = start + 5 + buf[start + 4] + 1
+                if end > self._len:
+                    break
+                if checksum(self._view[start + 2:end - 1]) != buf[end - 1]:
+                    self.errors += 1
+                    start += 1
+                    continue
+                out.append(Frame(buf[start + 2], buf[start + 3], bytes(self._view[start + 5:end - 1])))
+                start = end
+            else:
+                newline = buf.find(b'\n', start, self._len)
+                header = buf.find(b'\xff', start, self._len)
+                if newline < 0 or (0 <= header < newline):
+                    if header < 0:
+                        break
+                    start = header  # Text cut short by a frame
+                    continue
+                line = bytes(self._view[start:newline]).decode('ascii', 'replace').strip()
+                if line:
+                    out.append(line)
+                start = newline + 1
+
+        # Shift the unconsumed tail to the front of the buffer
+        remaining = self._len - start
+        if start and remaining:
+            self._view[:remaining] = self._view[start:self._len]
+        self._len = remaining
+        return out
+
+def parse_setpoints(payload):
+    """Split a SETPOINT payload into [(motor_id, position), ...]"""
+    return [struct.unpack_from('<BH', payload, i) for i in range(0, len(payload), SETPOINT_SIZE)]
+
+def parse_reply(payload):
+    """Return (motor_id, value) from an ACK or NAK payload; raises ValueError if it is too short"""
+    if len(payload) >= 3:
+        return struct.unpack_from('<BH', payload)
+    if len(payload) == 2:
+        return payload[0], payload[1]
+    raise ValueError(f"reply payload of {len(payload)} byte(s), expected 2 or 3")
+
+def _sketch_loopback(fd, motor_id, stop):
+    """Answer frames on fd the way the Absolute movement sketches do"""
+    decoder = FrameDecoder()
+    while not stop.is_set():
+        try:
+            data = os.read(fd, 64)
+        except OSError:
+            return
+        for item in decoder.feed(data):
+            if not isinstance(item, Frame) or item.type != FRAME_SETPOINT:
+                continue
+            for entry_id, position in parse_setpoints(item.payload):
+                if entry_id != motor_id:
+                    continue
+                if 0 <= position <= 1023:
+                    reply = encode_reply(item.seq, FRAME_ACK, struct.pack('<BH', motor_id, position))
+                else:
+                    reply = encode_reply(item.seq, FRAME_NAK, [motor_id, ERROR_RANGE])
+                os.write(fd, reply)
+
+@contextmanager
+def pty_loopback(motor_id=3):
+    """Yield a {port: {'id', 'ser'}} dict for a pty whose far end answers like a sketch"""
+    import serial
+
+    master, slave = pty.openpty()
+    stop = threading.Event()
+    responder = threading.Thread(target=_sketch_loopback, args=(master, motor_id, stop), daemon=True)
+    responder.start()
+    port = os.ttyname(slave)
+    ports = {port: {'id': motor_id, 'ser': serial.Serial(port, 9600, timeout=1)}}
+    try:
+        yield ports
+    finally:
+        stop.set()
+        ports[port]['ser'].close()
+        os.close(master)
+        os.close(slave)
+
+def loopback_rate(count=500):
+    """Acknowledged binary setpoints per second through pty_loopback"""
+    from serial_engine import SerialEngine
+
+    with pty_loopback() as ports:
+        port = next(iter(ports))
+        with SerialEngine(ports, protocol='binary') as engine:
+            start_time = time.time()
+            for i in range(count):
+                engine.submit(port, i % 1024).result(timeout=2)
+            return count / (time.time() - start_time)
+
+def main():
+    rate = loopback_rate()
+    print(f"Binary protocol loopback OK: {rate:.0f} acknowledged commands/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import json
+import math
+import threading
+import time
+
+import numpy as np
+
+# Event kinds stored in the ring buffer
+EVENT_COMMAND = 0  # Setpoint written to a port
+EVENT_LINE = 1     # Text line received
+EVENT_FRAME = 2    # Binary frame received
+EVENT_NAMES = {EVENT_COMMAND: 'command', EVENT_LINE: 'line', EVENT_FRAME: 'frame'}
+
+# Latency histogram: log-spaced bins from 0.1 ms to 10 s, 20 bins per decade
+HIST_MIN_EXP = -4
+HIST_BINS_PER_DECADE = 20
+HIST_BINS = 5 * HIST_BINS_PER_DECADE
+HIST_EDGES = 10.0 ** (HIST_MIN_EXP + np.arange(HIST_BINS + 1) / HIST_BINS_PER_DECADE)
+
+class TelemetryRing:
+    """Fixed-size ring of timestamped serial events, stored as parallel numpy arrays"""
+
+    def __init__(self, size=4096, text_size=48):
+        self.size = size
+        self.t = np.zeros(size)
+        self.port = np.zeros(size, dtype=np.uint8)
+        self.kind = np.zeros(size, dtype=np.uint8)
+        self.value = np.zeros(size, dtype=np.int32)
+        self.text = np.zeros(size, dtype=f'S{text_size}')
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, t, port, kind, value=0, text=b''):
+        with self._lock:
+            i = self.count % self.size
+            self.t[i] = t
+            self.port[i] = port
+            self.kind[i] = kind
+            self.value[i] = value
+            self.text[i] = text
+            self.count += 1
+
+    def snapshot(self):
+        """Events currently held, oldest first, as a dict of arrays"""
+        with self._lock:
+            n = min(self.count, self.size)
+            order = (np.arange(n) + self.count - n) % self.size
+            return {'t': self.t[order], 'port': self.port[order], 'kind': self.kind[order],
+                    'value': self.value[order], 'text': self.text[order]}
+
+class LatencyHistogram:
+    """Command round-trip latency counts per motor ID"""
+
+    def __init__(self, motor_ids):
+        self.counts = {motor_id: np.zeros(HIST_BINS + 2, dtype=np.int64) for motor_id in motor_ids}
+        self.totals = {motor_id: 0.0 for motor_id in motor_ids}
+
+    def record(self, motor_id, seconds):
+        # Bin 0 and the last bin collect under- and overflow
+        if seconds <= 0:
+            index = 0
+        else:
+            index = int((math.log10(seconds) - HIST_MIN_EXP) * HIST_BINS_PER_DECADE) + 1
+            index = min(max(index, 0), HIST_BINS + 1)
+        self.counts[motor_id][index] += 1
+        self.totals[motor_id] += seconds
+
+    def percentile(self, motor_id, q):
+        """Upper edge (seconds) of the bin holding the q-th percentile, None if empty"""
+        counts = self.counts[motor_id]
+        total = counts.sum()
+        if total == 0:
+            return None
+        index = int(np.searchsorted(np.cumsum(counts), q / 100 * total))
+        return float(HIST_EDGES[min(index, HIST_BINS)])
+
+    def summary(self):
+        """{motor_id: {'count', 'mean_ms', 'p50_ms', 'p99_ms'}}"""
+        result = {}
+        for motor_id, counts in self.counts.items():
+            total = int(counts.sum())
+            result[motor_id] = {
+                'count': total,
+                'mean_ms': 1000 * self.totals[motor_id] / total if total else None,
+                'p50_ms': 1000 * self.percentile(motor_id, 50) if total else None,
+                'p99_ms': 1000 * self.percentile(motor_id, 99) if total else None,
+            }
+        return result
+
+class Telemetry:
+    """Event ring and latency histograms for a set of ports
+
+    If recorder is set (a motion_log.MotionRecorder for the same ports),
+    every event is also appended to its log file.
+    """
+
+    def __init__(self, ports, ring_size=4096, recorder=None):
+        self.port_names = list(ports)
+        self.port_index = {port: i for i, port in enumerate(self.port_names)}
+        self.ring = TelemetryRing(ring_size)
+        self.latency = LatencyHistogram([info['id'] for info in ports.values()])
+        self.recorder = recorder
+
+    def record(self, port, kind, value=0, text=b'', t=None):
+        t = time.perf_counter() if t is None else t
+        self.ring.append(t, self.port_index[port], kind, value, text)
+        if self.recorder is not None:
+            self.recorder.append(t, self.port_index[port], kind, value, text)
+
+    def latency_summary(self):
+        return self.latency.summary()
+
+    def dump(self, path):
+        """Write the latency summary and buffered events to a JSON file"""
+        events = self.ring.snapshot()
+        with open(path, 'w') as f:
+            json.dump({
+                'latency': {str(k): v for k, v in self.latency_summary().items()},
+                'events': [
+                    {'t': float(t), 'port': self.port_names[p], 'kind': EVENT_NAMES[k],
+                     'value': int(v), 'text': s.decode('ascii', 'replace')}
+                    for t, p, k, v, s in zip(events['t'], events['port'], events['kind'],
+                                             events['value'], events['text'])
+                ],
+            }, f, indent=1)
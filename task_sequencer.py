@@ -0,0 +1,317 @@
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from ik_delta import get_thetas_batch
+from motion_profile import MAX_VELOCITY, duration_matrix, joint_limits, move_durations, plan_moves
+from workspace_atlas import choose_branch
+
+TIME_LIMIT = 0.25  # Seconds of 2-opt improvement after the nearest-neighbour tour
+DENSE_LIMIT = 1000  # Above this many targets, use candidate lists instead of the full cost matrix
+NEIGHBOURS = 8  # Candidate successors per node for large batches
+CELL_OCCUPANCY = 3  # Targets per grid cell when searching for candidates
+HOME = (0.0, 0.0, -0.9)  # Where the robot starts, meters
+CHUNK = 256  # Rows of the cost matrix per plan_moves call for S-curve costs
+
+def target_angles(xyz):
+    """Joint angles (degrees) the control scripts would use for (N, 3) targets; raises ValueError if any is unreachable"""
+    _, thetas_deg, reachable = get_thetas_batch(xyz)
+    angles, ok = choose_branch(thetas_deg)
+    ok &= reachable
+    if not ok.all():
+        bad = np.flatnonzero(~ok)
+        raise ValueError(f"{len(bad)} target(s) unreachable within the joint limits, first at row {bad[0]}")
+    return angles
+
+def cost_matrix(start, end, profile='trapezoid'):
+    """Move time (s) from each of (M, 3) end-of-task angles to each of (K, 3) start-of-task angles"""
+    if profile == 'trapezoid':
+        return duration_matrix(start, end)
+    start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+    cost = np.empty((len(start), len(end)))
+    for i in range(0, len(start), CHUNK):
+        rows = start[i:i + CHUNK]
+        plan = plan_moves(np.repeat(rows, len(end), axis=0), np.tile(end, (len(rows), 1)), profile)
+        cost[i:i + len(rows)] = plan.duration.reshape(len(rows), len(end))
+    return cost
+
+class CandidateCosts:
+    """Move times computed on demand, with the NEIGHBOURS cheapest successors of each node
+
+    Drop-in for the cost matrix of large batches: cost[a, b] takes index
+    arrays and returns the move times of those pairs only. Nodes are the
+    tasks plus home as node n; moves to home are free, as in the matrix.
+    Candidates come from a grid over the joint angles scaled by the velocity
+    limits, so each node is only compared with targets in the 27 cells
+    around it instead of with every target.
+    """
+
+    def __init__(self, ends, starts, home_angles, profile='trapezoid', k=NEIGHBOURS):
+        self.origins = np.vstack([ends, home_angles])
+        self.starts = np.asarray(starts, dtype=float)
+        self.profile = profile
+        self.n = len(self.starts)
+        self.neighbours, self.neighbour_cost = self._candidates(k)
+
+    def __len__(self):
+        return self.n + 1
+
+    def __getitem__(self, index):
+        a, b = np.broadcast_arrays(*index)
+        cost = np.zeros(a.shape)
+        move = b < self.n
+        if move.any():
+            origins, targets = self.origins[a[move]], self.starts[b[move]]
+            if self.profile == 'trapezoid':
+                cost[move] = move_durations(origins, targets)
+            else:
+                cost[move] = plan_moves(origins, targets, self.profile).duration
+        return cost
+
+    def _candidates(self, k):
+        """(n + 1, k) cheapest grid-neighbour successors of each node, -1 where fewer were found"""
+        scale = joint_limits(MAX_VELOCITY)
+        to_cell = self.starts / scale
+        low = to_cell.min(axis=0)
+        span = np.maximum(np.ptp(to_cell, axis=0), 1e-9)
+        cells = max(1, int(np.ceil((self.n / CELL_OCCUPANCY) ** (1 / 3))))
+
+        def cell_of(angles):
+            return np.clip(np.floor((angles / scale - low) / span * cells), 0, cells - 1).astype(np.intp)
+
+        def key(cell):
+            return (cell[:, 0] * cells + cell[:, 1]) * cells + cell[:, 2]
+
+        target_key = key(cell_of(self.starts))
+        # Targets usually fill only part of the box: resize once by the occupied cells
+        occupancy = self.n / len(np.unique(target_key))
+        cells = max(1, int(round(cells * (occupancy / CELL_OCCUPANCY) ** (1 / 3))))
+        target_key = key(cell_of(self.starts))
+        order = np.argsort(target_key, kind='stable')
+        target_key = target_key[order]
+        origin_cell = cell_of(self.origins)
+        owners, members = [], []
+        for offset in itertools.product((-1, 0, 1), repeat=3):
+            cell = origin_cell + offset
+            inside = np.all((cell >= 0) & (cell < cells), axis=1)
+            first, last = (np.searchsorted(target_key, key(cell), side) for side in ('left', 'right'))
+            count = np.where(inside, last - first, 0)
+            within = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+            owners.append(np.repeat(np.arange(len(cell)), count))
+            members.append(order[np.repeat(first, count) + within])
+        owner, member = np.concatenate(owners), np.concatenate(members)
+        other = owner != member
+        owner, member = owner[other], member[other]
+        cost = self[owner, member]
+
+        # Cheapest k per owner: sort by owner then cost (one float key sorts much
+        # faster than lexsort), keep each group's first k
+        rank = np.argsort(owner + cost / (2 * cost.max() + 1e-9))
+        owner, member, cost = owner[rank], member[rank], cost[rank]
+        slot = np.arange(len(owner)) - np.searchsorted(owner, owner)
+        keep = slot < k
+        neighbours = np.full((self.n + 1, k), -1, dtype=np.intp)
+        neighbour_cost = np.full((self.n + 1, k), np.inf)
+        neighbours[owner[keep], slot[keep]] = member[keep]
+        neighbour_cost[owner[keep], slot[keep]] = cost[keep]
+        return neighbours, neighbour_cost
+
+def tour_cost(cost, tour):
+    """Total of cost[a, b] over consecutive nodes, wrapping back to the first"""
+    return float(cost[tour, np.roll(tour, -1)].sum())
+
+def nearest_neighbour(cost, start=0):
+    """Greedy tour from start, always moving to the cheapest unvisited node"""
+    n = len(cost)
+    tour = np.empty(n, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    tour[0] = start
+    visited[start] = True
+    for k in range(1, n):
+        row = np.where(visited, np.inf, cost[tour[k - 1]])
+        tour[k] = np.argmin(row)
+        visited[tour[k]] = True
+    return tour
+
+def candidate_tour(costs, start=0):
+    """nearest_neighbour over CandidateCosts; only scans all unvisited nodes when no candidate is left"""
+    n = len(costs)
+    tour = np.empty(n, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    tour[0] = start
+    visited[start] = True
+    for k in range(1, n):
+        options = costs.neighbours[tour[k - 1]]
+        options = options[options >= 0]
+        options = options[~visited[options]]
+        if len(options):
+            tour[k] = options[0]
+        else:
+            unvisited = np.flatnonzero(~visited)
+            tour[k] = unvisited[np.argmin(costs[tour[k - 1], unvisited])]
+        visited[tour[k]] = True
+    return tour
+
+def two_opt(cost, tour, time_limit=TIME_LIMIT):
+    """Improve a closed tour by segment reversals; tour[0] stays first
+
+    Works for asymmetric costs: the gain of reversing tour[i+1..j] includes
+    the difference between the reversed and original edges inside the
+    segment, read from prefix sums. For each i the best j is found in one
+    vectorized pass. Stops at a local optimum or after time_limit seconds.
+    """
+    tour = np.array(tour, dtype=np.intp)
+    n = len(tour)
+    deadline = time.perf_counter() + time_limit
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        nxt = np.roll(tour, -1)
+        forward = np.concatenate([[0.0], np.cumsum(cost[tour, nxt])])
+        backward = np.concatenate([[0.0], np.cumsum(cost[nxt, tour])])
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            j = np.arange(i + 2, n)
+            c, d = tour[j], tour[(j + 1) % n]
+            gain = (cost[a, b] + cost[c, d] + forward[j] - forward[i + 1]
+                    - cost[a, c] - cost[b, d] - backward[j] + backward[i + 1])
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-12:
+                tour[i + 1:j[best] + 1] = tour[i + 1:j[best] + 1][::-1].copy()
+                nxt = np.roll(tour, -1)
+                forward = np.concatenate([[0.0], np.cumsum(cost[tour, nxt])])
+                backward = np.concatenate([[0.0], np.cumsum(cost[nxt, tour])])
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return tour
+
+def two_opt_candidates(costs, tour, time_limit=TIME_LIMIT):
+    """two_opt over CandidateCosts, trying only reversals that add an edge to a candidate successor
+
+    Keeps the forward and backward cost of every tour edge and updates them
+    in place on a reversal, so no move time is computed twice.
+    """
+    tour = np.array(tour, dtype=np.intp)
+    n = len(tour)
+    deadline = time.perf_counter() + time_limit
+    nxt = np.roll(tour, -1)
+    forward_edge, backward_edge = costs[tour, nxt], costs[nxt, tour]
+    position = np.empty(n, dtype=np.intp)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        position[tour] = np.arange(n)
+        forward = np.concatenate([[0.0], np.cumsum(forward_edge)])
+        backward = np.concatenate([[0.0], np.cumsum(backward_edge)])
+        for i in range(n - 2):
+            a, b = tour[i], tour[i + 1]
+            j = position[costs.neighbours[a]]
+            # Without the cost of the new edge from b, the gain is an upper bound
+            bound = (forward_edge[i] + forward_edge[j] + forward[j] - forward[i + 1]
+                     - costs.neighbour_cost[a] - backward[j] + backward[i + 1])
+            candidate = (costs.neighbours[a] >= 0) & (j > i + 1) & (bound > 1e-12)
+            if not candidate.any():
+                continue
+            j, bound = j[candidate], bound[candidate]
+            d = tour[(j + 1) % n]
+            gain = bound - costs[np.full(len(d), b), d]
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-12:
+                j, d = j[best], d[best]
+                c = tour[j]
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+                position[tour[i + 1:j + 1]] = np.arange(i + 1, j + 1)
+                forward_edge[i + 1:j], backward_edge[i + 1:j] = (backward_edge[i + 1:j][::-1].copy(),
+                                                                 forward_edge[i + 1:j][::-1].copy())
+                forward_edge[[i, j]] = costs[np.array([a, b]), np.array([c, d])]
+                backward_edge[[i, j]] = costs[np.array([c, d]), np.array([a, b])]
+                forward = np.concatenate([[0.0], np.cumsum(forward_edge)])
+                backward = np.concatenate([[0.0], np.cumsum(backward_edge)])
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return tour
+
+def sequence_tasks(picks, places=None, home=HOME, profile='trapezoid', dwell=0.0, time_limit=TIME_LIMIT):
+    """Order pick (and optional place) targets to minimize the estimated cycle time
+
+    picks and places are (N, 3) positions in meters; with places, task k is
+    a move from picks[k] to places[k] and the order only changes the moves
+    between tasks. dwell is the fixed time per task (gripper, settling).
+    Returns a dict with the visiting order, the cycle time and throughput in
+    the given order and after optimization, and the solve time. Above
+    DENSE_LIMIT targets, costs come from CandidateCosts instead of the matrix.
+    """
+    start_time = time.perf_counter()
+    picks = np.atleast_2d(np.asarray(picks, dtype=float))
+    starts = target_angles(picks)
+    ends = starts if places is None else target_angles(np.atleast_2d(np.asarray(places, dtype=float)))
+    home_angles = target_angles([home])
+    n = len(starts)
+
+    # Node n is home: leaving it costs the move to the first task, returning is free (open path)
+    if n > DENSE_LIMIT:
+        cost = CandidateCosts(ends, starts, home_angles, profile)
+        tour = two_opt_candidates(cost, candidate_tour(cost, start=n), time_limit)
+    else:
+        cost = np.zeros((n + 1, n + 1))
+        cost[:n, :n] = cost_matrix(ends, starts, profile)
+        cost[n, :n] = cost_matrix(home_angles, starts, profile)[0]
+        tour = two_opt(cost, nearest_neighbour(cost, start=n), time_limit)
+    task_time = dwell * n
+    if places is not None:
+        task_time += float(plan_moves(starts, ends, profile).duration.sum())
+
+    given = np.arange(n + 1)
+    given = np.roll(given, 1)  # home first, then the tasks in the order they arrived
+    before = tour_cost(cost, given) + task_time
+    after = tour_cost(cost, tour) + task_time
+    return {
+        'order': tour[1:],
+        'cycle_time_before': before,
+        'cycle_time_after': after,
+        'tasks_per_second_before': n / before if before else float('inf'),
+        'tasks_per_second_after': n / after if after else float('inf'),
+        'solve_seconds': time.perf_counter() - start_time,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Order pick/place targets to minimize joint-space cycle time")
+    parser.add_argument('input', nargs='?',
+                        help="CSV with x,y,z (pick only) or x,y,z,x,y,z (pick, place) rows, in meters")
+    parser.add_argument('--random', type=int, metavar='N', help="sequence N random reachable targets instead")
+    parser.add_argument('-o', '--output', help="write the reordered rows to this CSV")
+    parser.add_argument('--profile', choices=['trapezoid', 'scurve'], default='trapezoid')
+    parser.add_argument('--dwell', type=float, default=0.0, help="fixed seconds per task (gripper, settling)")
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help="2-opt time budget in seconds")
+    args = parser.parse_args()
+
+    if args.random:
+        rng = np.random.default_rng(0)
+        rows = np.column_stack([rng.uniform(-0.25, 0.25, (args.random, 2)), rng.uniform(-1.1, -0.8, args.random)])
+    elif args.input:
+        rows = np.loadtxt(args.input, delimiter=',', ndmin=2, comments='#')
+    else:
+        parser.error("give an input CSV or --random N")
+
+    try:
+        places = rows[:, 3:6] if rows.shape[1] >= 6 else None
+        result = sequence_tasks(rows[:, :3], places, profile=args.profile, dwell=args.dwell,
+                                time_limit=args.time_limit)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{len(rows)} tasks sequenced in {result['solve_seconds']:.2f} s")
+    print(f"Given order:     {result['cycle_time_before']:8.2f} s ({result['tasks_per_second_before']:.2f} tasks/s)")
+    print(f"Optimized order: {result['cycle_time_after']:8.2f} s ({result['tasks_per_second_after']:.2f} tasks/s)")
+    if args.output:
+        np.savetxt(args.output, rows[result['order']], delimiter=',', fmt='%.6f')
+        print(f"Reordered targets written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import numpy as np
+
+from dynamics_delta import (ARM_GRAVITY, ARM_INERTIA, FOREARM_MASS, GRAVITY, PLATFORM_MASS, check_path,
+                            inverse_dynamics, joint_motion, path_derivatives, slowdown_factors,
+                            torque_utilization)
+from fk_delta import get_xyz_batch
+from jacobian_delta import pose_thetas
+
+DT = 1e-4
+
+def _circle(t, radius=0.1, omega=3.0, z=-0.9):
+    """Tilted circle around (0, 0, z) with its exact velocity and acceleration"""
+    c, s = np.cos(omega * t), np.sin(omega * t)
+    xyz = radius * np.column_stack([c, s, 0.5 * s]) + [0.0, 0.0, z]
+    velocity = omega * radius * np.column_stack([-s, c, 0.5 * c])
+    acceleration = -omega**2 * radius * np.column_stack([c, s, 0.5 * s])
+    return xyz, velocity, acceleration
+
+def test_joint_motion_matches_ik_differences():
+    t = np.arange(0, 2, DT)
+    xyz, velocity, acceleration = _circle(t)
+    thetas, rates, accels = joint_motion(xyz, velocity, acceleration)
+    np.testing.assert_allclose(thetas, pose_thetas(xyz))
+    inner = slice(1, -1)
+    np.testing.assert_allclose(rates[inner], np.gradient(thetas, DT, axis=0)[inner], rtol=1e-5, atol=1e-6)
+    second = (thetas[2:] - 2 * thetas[1:-1] + thetas[:-2]) / DT**2
+    np.testing.assert_allclose(accels[inner], second, rtol=1e-3, atol=1e-3)
+
+def _potential(thetas, payload):
+    """Gravitational energy of the arms and the platform mass for (N, 3) joint angles"""
+    xyz, _ = get_xyz_batch(thetas)
+    mass = PLATFORM_MASS + payload + 3 * FOREARM_MASS / 2
+    return -ARM_GRAVITY * np.sin(thetas).sum(axis=1) + mass * GRAVITY * xyz[:, 1, 2]
+
+def test_holding_torque_is_the_gravity_gradient():
+    rng = np.random.default_rng(0)
+    xyz = np.column_stack([rng.uniform(-0.2, 0.2, (20, 2)), rng.uniform(-1.0, -0.85, 20)])
+    thetas = pose_thetas(xyz)
+    still = np.zeros_like(xyz)
+    for payload in (0.0, 0.5):
+        expected = np.empty_like(xyz)
+        for joint in range(3):
+            dt = np.zeros(3)
+            dt[joint] = 1e-6
+            expected[:, joint] = (_potential(thetas + dt, payload) - _potential(thetas - dt, payload)) / 2e-6
+        np.testing.assert_allclose(inverse_dynamics(xyz, still, still, payload), expected, rtol=1e-5, atol=1e-7)
+    # A payload adds load on top of the holding torque
+    assert np.all(np.abs(inverse_dynamics(xyz, still, still, 0.5)) > np.abs(inverse_dynamics(xyz, still, still)))
+
+def test_torque_power_matches_energy_rate():
+    t = np.arange(0, 2, DT)
+    xyz, velocity, acceleration = _circle(t)
+    thetas, rates, _ = joint_motion(xyz, velocity, acceleration)
+    torques = inverse_dynamics(xyz, velocity, acceleration, thetas_rad=thetas)
+    mass = PLATFORM_MASS + 3 * FOREARM_MASS / 2
+    energy = (0.5 * ARM_INERTIA * np.sum(rates**2, axis=1) + 0.5 * mass * np.sum(velocity**2, axis=1)
+              - ARM_GRAVITY * np.sin(thetas).sum(axis=1) + mass * GRAVITY * xyz[:, 2])
+    power = np.sum(torques * rates, axis=1)
+    np.testing.assert_allclose(power[1:-1], np.gradient(energy, DT)[1:-1], rtol=1e-4, atol=1e-5)
+
+def test_path_derivatives_of_a_quadratic():
+    dt = 0.01
+    t = np.arange(0, 1, dt)[:, None]
+    xyz = np.array([1.0, -2.0, 0.5]) * t**2 + np.array([0.3, 0.0, -1.0]) * t
+    velocity, acceleration = path_derivatives(xyz, dt)
+    np.testing.assert_allclose(velocity[1:-1], (np.array([2.0, -4.0, 1.0]) * t + [0.3, 0.0, -1.0])[1:-1])
+    np.testing.assert_allclose(acceleration[2:-2], np.broadcast_to([2.0, -4.0, 1.0], (len(t) - 4, 3)))
+
+def test_slowdown_brings_torques_to_the_limit():
+    t = np.arange(0, 2, 0.001)
+    # High enough that the servos can hold the platform still
+    xyz, velocity, acceleration = _circle(t, radius=0.04, omega=60.0, z=-0.76)
+    k = slowdown_factors(xyz, velocity, acceleration)
+    assert np.all(k >= 1) and np.any(k > 1)
+    utilization = torque_utilization(inverse_dynamics(xyz, velocity / k[:, None], acceleration / k[:, None]**2))
+    assert np.all(utilization <= 1 + 1e-9)
+    np.testing.assert_allclose(np.max(utilization[k > 1], axis=1), 1.0)
+
+    ok, scale, peak = check_path(xyz, 0.001)
+    assert not ok and scale > 1 and np.max(peak) > 1
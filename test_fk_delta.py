@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from fk_delta import FKTracker, fk_coefficients, get_xyz, get_xyz_batch, get_xyz_symbolic
+from ik_delta import get_thetas_batch
+
+ANGLES = [(0.0, 0.0, 0.0), (0.3, -0.2, 0.1), (-0.5, 0.4, 0.6), (0.8, 0.8, -0.3)]
+
+@pytest.mark.parametrize('thetas', ANGLES)
+def test_batch_matches_symbolic_reference(thetas):
+    reference = get_xyz_symbolic(*thetas)
+    xyz, valid = get_xyz_batch([thetas])
+    assert valid[0]
+    expected = sorted(([p['x'], p['y'], p['z']] for p in reference), key=lambda p: -p[2])
+    np.testing.assert_allclose(xyz[0], expected, atol=1e-9)
+
+def test_batch_matches_scalar_and_satisfies_ik():
+    rng = np.random.default_rng(0)
+    thetas = rng.uniform(-np.pi / 2, np.pi / 2, (500, 3))
+    xyz, valid = get_xyz_batch(thetas)
+    for row, poses, ok in zip(thetas[:20], xyz, valid):
+        scalar = get_xyz(*row)
+        assert (scalar is not None) == ok
+        if ok:
+            np.testing.assert_allclose([[p['x'], p['y'], p['z']] for p in scalar], poses)
+    # The lower branch solves the same arm equations as IK: one IK candidate per joint is the input angle
+    _, thetas_deg, reachable = get_thetas_batch(xyz[valid, 1])
+    assert reachable.all()
+    error = np.abs(thetas_deg - np.degrees(thetas[valid])[:, :, None]).min(axis=2)
+    assert error.max() < 1e-6
+
+def test_invalid_rows_are_nan():
+    xyz, valid = get_xyz_batch([[0.0, 0.0, 0.0], [np.nan, 0.0, 0.0]])
+    assert valid.tolist() == [True, False]
+    assert np.isnan(xyz[1]).all()
+
+def test_custom_coefficients_change_geometry():
+    longer = fk_coefficients(l=1.3)
+    default, _ = get_xyz_batch([[0.2, 0.1, 0.0]])
+    other, valid = get_xyz_batch([[0.2, 0.1, 0.0]], coeffs=longer)
+    assert valid[0] and other[0, 1, 2] < default[0, 1, 2]
+
+def _smooth_path(n=200):
+    t = np.linspace(0, 2 * np.pi, n)
+    return np.stack([0.3 * np.sin(t), 0.3 * np.sin(t + 2), 0.2 + 0.3 * np.cos(t)], axis=1)
+
+def test_tracker_follows_lower_branch():
+    thetas = _smooth_path()
+    expected, valid = get_xyz_batch(thetas)
+    assert valid.all()
+    tracker = FKTracker()
+    poses = np.array([tracker.update(*row) for row in thetas])
+    np.testing.assert_allclose(poses, expected[:, 1], atol=1e-8)
+    stats = tracker.stats()
+    assert stats['samples'] == len(thetas) and stats['fallbacks'] == 1
+    assert 0 < stats['mean_iterations'] <= tracker.max_iter
+
+def test_tracker_falls_back_on_jumps_and_reset():
+    tracker = FKTracker()
+    tracker.update(0.0, 0.0, 0.0)
+    iterations = tracker.iterations
+    # A large step moves the pose further than max_jump, so Newton is rejected
+    pose = tracker.update(0.8, 0.8, -0.3)
+    xyz, _ = get_xyz_batch([(0.8, 0.8, -0.3)])
+    np.testing.assert_allclose(pose, xyz[0, 1], atol=1e-9)
+    assert tracker.fallbacks == 2 and tracker.iterations == iterations
+    tracker.reset()
+    tracker.update(0.8, 0.8, -0.3)
+    assert tracker.fallbacks == 3 and tracker.iterations == iterations
+    assert tracker.update(np.nan, 0.0, 0.0) is None
+    assert tracker.pose is None
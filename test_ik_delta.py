@@ -0,0 +1,80 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from fk_delta import get_xyz_batch
+from ik_delta import get_thetas, get_thetas_batch, ik_coefficients, select_branches
+
+def _workspace(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(-0.25, 0.25, (n, 2)), rng.uniform(-1.1, -0.8, n)])
+
+def test_batch_matches_scalar():
+    xyz = np.vstack([_workspace(50), [[5.0, 5.0, 5.0]]])
+    thetas_rad, thetas_deg, reachable = get_thetas_batch(xyz)
+    for row, rad, deg, ok in zip(xyz, thetas_rad, thetas_deg, reachable):
+        scalar = get_thetas(*row)
+        assert (scalar is not None) == ok
+        if ok:
+            np.testing.assert_allclose(rad, [scalar[f'valθ{i}_rad'] for i in (1, 2, 3)])
+            np.testing.assert_allclose(deg, [scalar[f'valθ{i}_deg'] for i in (1, 2, 3)])
+    assert not reachable[-1] and np.isnan(thetas_rad[-1]).all()
+
+def test_batch_round_trips_through_fk():
+    xyz = _workspace(200)
+    thetas_rad, _, reachable = get_thetas_batch(xyz)
+    assert reachable.all()
+    # Each candidate solves its own arm's equation, so either branch maps back to xyz
+    for branch in (0, 1):
+        poses, valid = get_xyz_batch(thetas_rad[:, :, branch])
+        assert valid.all()
+        np.testing.assert_allclose(poses[:, 1], xyz, atol=1e-9)
+
+def test_custom_coefficients_match_default_geometry():
+    xyz = _workspace(20)
+    np.testing.assert_allclose(get_thetas_batch(xyz, ik_coefficients())[0], get_thetas_batch(xyz)[0])
+
+def _path_cost(thetas_deg, joint, branches, previous):
+    """Travel of one joint following the given branch per sample"""
+    angles = thetas_deg[np.arange(len(branches)), joint, list(branches)]
+    cost = np.abs(np.diff(angles)).sum()
+    if previous is not None:
+        cost += abs(angles[0] - previous[joint])
+    return cost
+
+@pytest.mark.parametrize('seed', range(5))
+def test_select_branches_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    thetas_deg = rng.uniform(-90, 90, (7, 3, 2))
+    previous = rng.uniform(-90, 90, 3) if seed % 2 else None
+    angles, _ = select_branches(thetas_deg, previous=previous)
+    for joint in range(3):
+        best = min(_path_cost(thetas_deg, joint, branches, previous)
+                   for branches in itertools.product((0, 1), repeat=len(thetas_deg)))
+        chosen = [int(np.argmin(np.abs(thetas_deg[t, joint] - a))) for t, a in enumerate(angles[:, joint])]
+        assert _path_cost(thetas_deg, joint, chosen, previous) == pytest.approx(best)
+
+def test_select_branches_flags_limits_and_jumps():
+    thetas_deg = np.array([
+        [[10.0, -150.0]] * 3,
+        [[120.0, -150.0]] * 3,   # No branch within the joint limits
+        [[15.0, -150.0]] * 3,
+        [[80.0, -150.0]] * 3,    # 65 degree step from the previous sample
+    ])
+    angles, ok = select_branches(thetas_deg)
+    assert ok.tolist() == [True, False, True, False]
+    assert np.isnan(angles[1]).all()
+    np.testing.assert_allclose(angles[[0, 2, 3], 0], [10.0, 15.0, 80.0])
+
+def test_select_branches_ignores_non_finite_previous():
+    _, thetas_deg, _ = get_thetas_batch(_workspace(10))
+    expected = select_branches(thetas_deg)
+    for previous in (np.full(3, np.nan), [np.nan, np.inf, -np.inf]):
+        angles, ok = select_branches(thetas_deg, previous=previous)
+        np.testing.assert_array_equal(angles, expected[0])
+        np.testing.assert_array_equal(ok, expected[1])
+
+def test_select_branches_empty():
+    angles, ok = select_branches(np.empty((0, 3, 2)))
+    assert angles.shape == (0, 3) and ok.shape == (0,)
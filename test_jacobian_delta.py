@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from fk_delta import get_xyz_batch
+from jacobian_delta import (build_singularity_map, condition_numbers, inverse_condition_batch,
+                            inverse_jacobian_batch, jacobian_batch, max_speed_batch, pose_thetas)
+from motion_profile import joint_limits
+from motor_config import MAX_VELOCITY
+from workspace_atlas import build_atlas
+
+H = 1e-6
+
+def _poses(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    xyz = np.column_stack([rng.uniform(-0.25, 0.25, (n, 2)), rng.uniform(-1.1, -0.8, n)])
+    thetas = pose_thetas(xyz)
+    keep = np.isfinite(thetas).all(axis=1)
+    return xyz[keep], thetas[keep]
+
+def test_inverse_jacobian_matches_ik_differences():
+    xyz, thetas = _poses()
+    expected = np.empty((len(xyz), 3, 3))
+    for axis in range(3):
+        dp = np.zeros(3)
+        dp[axis] = H
+        expected[:, :, axis] = (pose_thetas(xyz + dp) - pose_thetas(xyz - dp)) / (2 * H)
+    np.testing.assert_allclose(inverse_jacobian_batch(xyz, thetas), expected, rtol=1e-5, atol=1e-5)
+
+def test_jacobian_matches_fk_differences():
+    xyz, thetas = _poses()
+    expected = np.empty((len(xyz), 3, 3))
+    for joint in range(3):
+        dt = np.zeros(3)
+        dt[joint] = H
+        # Lower branch: platform below the base
+        plus, _ = get_xyz_batch(thetas + dt)
+        minus, _ = get_xyz_batch(thetas - dt)
+        expected[:, :, joint] = (plus[:, 1] - minus[:, 1]) / (2 * H)
+    jac = jacobian_batch(xyz, thetas)
+    np.testing.assert_allclose(jac, expected, rtol=1e-5, atol=1e-7)
+    np.testing.assert_allclose(jac @ inverse_jacobian_batch(xyz, thetas), np.broadcast_to(np.eye(3), jac.shape),
+                               atol=1e-9)
+
+def test_condition_and_speed_limits():
+    xyz, thetas = _poses()
+    inverse = inverse_jacobian_batch(xyz, thetas)
+    sv = np.linalg.svd(inverse, compute_uv=False)
+    np.testing.assert_allclose(inverse_condition_batch(xyz, thetas), sv[:, -1] / sv[:, 0])
+    np.testing.assert_allclose(condition_numbers(xyz, thetas), sv[:, 0] / sv[:, -1])
+
+    omega = np.radians(joint_limits(MAX_VELOCITY))
+    rng = np.random.default_rng(1)
+    direction = rng.normal(size=(len(xyz), 3))
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    speed = max_speed_batch(xyz, thetas, direction)
+    # At that speed the busiest joint runs exactly at its limit
+    rates = np.abs(np.einsum('nij,nj->ni', inverse, direction)) * speed[:, None]
+    np.testing.assert_allclose(np.max(rates / omega, axis=1), 1.0)
+    # The direction-free limit holds for every direction
+    assert np.all(max_speed_batch(xyz, thetas) <= speed + 1e-12)
+
+def test_singularity_map_matches_direct_evaluation(tmp_path):
+    atlas = build_atlas(str(tmp_path / 'atlas.npy'), step=0.05, processes=1)
+    singularity_map = build_singularity_map(str(tmp_path / 'map.npy'), atlas)
+    for _, xyz, theta_deg in atlas.reachable_points():
+        thetas = np.radians(theta_deg.astype(float))
+        inverse_condition, max_speed = singularity_map.query_batch(xyz)
+        np.testing.assert_allclose(inverse_condition, inverse_condition_batch(xyz, thetas), rtol=1e-6)
+        np.testing.assert_allclose(max_speed, max_speed_batch(xyz, thetas), rtol=1e-6)
+    assert singularity_map.query(1.1, 1.1, -0.9) == {'inverse_condition': None, 'max_speed': None}
+    result = singularity_map.query(*xyz[0])
+    assert result['inverse_condition'] == pytest.approx(float(inverse_condition[0]))
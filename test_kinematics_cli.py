@@ -0,0 +1,35 @@
+import numpy as np
+
+from kinematics_cli import run
+
+# Poses in the normal workspace below the base, with one unreachable row in the middle
+ROWS = [(0.0, 0.0, -0.9), (0.05, 0.02, -0.92), (1.5, 1.5, -0.9), (0.06, -0.03, -0.9), (0.1, 0.05, -0.95)]
+
+def _run(tmp_path, mode, rows, chunk_size, **options):
+    source = tmp_path / f'{mode}_in_{chunk_size}.npy'
+    target = tmp_path / f'{mode}_out_{chunk_size}.npy'
+    np.save(source, np.asarray(rows, dtype=float))
+    run(mode, str(source), str(target), chunk_size=chunk_size, **options)
+    return np.load(target)
+
+def test_ik_path_independent_of_chunk_size_after_unreachable_row(tmp_path):
+    expected = _run(tmp_path, 'ik', ROWS, 10)
+    assert expected[:, 3].tolist() == [1, 1, 0, 1, 1]
+    assert np.isnan(expected[2, :3]).all()
+    for chunk_size in (1, 2, 3, 4):
+        np.testing.assert_array_equal(_run(tmp_path, 'ik', ROWS, chunk_size), expected)
+
+def test_ik_fk_round_trip(tmp_path):
+    angles = _run(tmp_path, 'ik', ROWS, 2)
+    xyz = _run(tmp_path, 'fk', angles[:, :3], 2, degrees=True)
+    ok = angles[:, 3] == 1
+    np.testing.assert_allclose(xyz[ok, :3], np.asarray(ROWS)[ok], atol=1e-9)
+    assert xyz[:, 3].tolist() == ok.tolist()
+
+def test_ik_path_independent_of_chunk_size_on_smooth_path(tmp_path):
+    s = np.linspace(0, 2 * np.pi, 50)
+    rows = np.column_stack([0.2 * np.cos(s), 0.2 * np.sin(s), np.full_like(s, -0.95)])
+    expected = _run(tmp_path, 'ik', rows, 100)
+    assert expected[:, 3].all()
+    for chunk_size in (1, 7, 16):
+        np.testing.assert_allclose(_run(tmp_path, 'ik', rows, chunk_size), expected)
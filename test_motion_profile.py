@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from motion_profile import (duration_matrix, joint_limits, move_durations, normalized_position,
+                            plan_moves, plan_path, sample_move)
+from motor_config import MAX_ACCEL, MAX_JERK, MAX_VELOCITY
+
+DT = 1e-4
+
+def _moves(n=20, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(-90, 90, (n, 3))
+    # Mix of long and short moves so both trapezoid and triangular shapes occur
+    end = np.clip(start + rng.uniform(-1, 1, (n, 3)) * rng.choice([2.0, 180.0], (n, 1)), -90, 90)
+    return start, end
+
+def _sampled(plan, i):
+    t = np.arange(0, plan.duration[i] + 5 * DT, DT)
+    return plan.start[i] + normalized_position(plan, i, t)[:, None] * plan.delta[i]
+
+@pytest.mark.parametrize('profile', ['trapezoid', 'scurve'])
+def test_sampled_moves_respect_limits(profile):
+    start, end = _moves()
+    plan = plan_moves(start, end, profile)
+    limits = [joint_limits(MAX_VELOCITY), joint_limits(MAX_ACCEL)]
+    if profile == 'scurve':
+        limits.append(joint_limits(MAX_JERK))
+    for i in range(len(start)):
+        angles = _sampled(plan, i)
+        np.testing.assert_allclose(angles[0], start[i], atol=1e-9)
+        np.testing.assert_allclose(angles[-1], end[i], atol=1e-9)
+        used = [np.abs(np.diff(angles, n=order, axis=0)).max(axis=0) / DT**order / limit
+                for order, limit in enumerate(limits, 1)]
+        assert np.max(used) <= 1.01
+        # Time-optimal: some joint reaches one of its limits
+        assert np.max(used) > 0.95
+
+def test_joints_are_synchronized():
+    start, end = _moves()
+    plan = plan_moves(start, end, 'scurve')
+    for i in range(len(start)):
+        angles = sample_move(plan, i, rate=200.0)
+        np.testing.assert_allclose(angles[-1], end[i], atol=1e-9)
+        # Every joint covers the same fraction of its travel at every tick
+        moving = np.abs(plan.delta[i]) > 0
+        fraction = (angles[:, moving] - start[i, moving]) / plan.delta[i, moving]
+        np.testing.assert_allclose(fraction, fraction[:, :1].repeat(moving.sum(), axis=1), atol=1e-9)
+
+def test_duration_shortcuts_match_plan():
+    start, end = _moves(seed=1)
+    expected = plan_moves(start, end, 'trapezoid').duration
+    np.testing.assert_allclose(move_durations(start, end), expected, rtol=1e-12)
+    matrix = duration_matrix(start, end)
+    np.testing.assert_allclose(np.diag(matrix), expected, rtol=1e-12)
+    i, k = 3, 7
+    np.testing.assert_allclose(matrix[i, k], plan_moves(start[i], end[k]).duration[0], rtol=1e-12)
+
+def test_still_moves_and_paths():
+    plan = plan_path([[0, 0, 0], [0, 0, 0], [10, -10, 5]])
+    assert plan.duration[0] == 0 and plan.duration[1] > 0
+    np.testing.assert_allclose(normalized_position(plan, 0, [0.0, 1.0]), [1.0, 1.0])
+
+def test_rejects_out_of_range_angles():
+    with pytest.raises(ValueError):
+        plan_moves([[0, 0, 0]], [[0, 95, 0]])
+    with pytest.raises(ValueError):
+        plan_moves([[0, 0, 0]], [[0, 0, 0]], 'linear')
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from motor_config import CALIBRATION, angle_to_position, angles_to_positions, positions_to_angles
+
+def test_linear_pair_as_list_matches_tuple():
+    tables = {3: list(CALIBRATION[3])}
+    angles = np.linspace(-90, 90, 721)
+    expected = angles_to_positions(angles, 3, {3: CALIBRATION[3]})
+    np.testing.assert_array_equal(angles_to_positions(angles, 3, tables), expected)
+    assert [angle_to_position(a, 3, tables) for a in angles] == expected.tolist()
+    np.testing.assert_allclose(positions_to_angles([500], 3, tables), [0.0])
+
+def test_default_conversion_is_exact_formula():
+    slope, intercept = CALIBRATION[6]
+    angles = np.random.default_rng(0).uniform(-90, 90, 10000)
+    expected = np.clip(np.rint(slope * angles + intercept), 0, 1023)
+    np.testing.assert_array_equal(angles_to_positions(angles, 6, {6: CALIBRATION[6]}), expected)
+
+@pytest.mark.parametrize('angle', [float('nan'), float('inf')])
+def test_non_finite_angles_raise(angle):
+    with pytest.raises(ValueError):
+        angle_to_position(angle, 3)
+    with pytest.raises(ValueError):
+        angles_to_positions([0.0, angle], 3)
@@ -0,0 +1,76 @@
+import os
+import pty
+import struct
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+import serial
+
+import serial_engine
+from serial_engine import SerialEngine
+from serial_protocol import (FRAME_ACK, FRAME_SETPOINT, Frame, FrameDecoder, FrameEncoder, encode_reply,
+                             parse_reply, parse_setpoints, pty_loopback)
+
+def test_decoder_skips_text_and_corrupt_frames():
+    encoder, decoder = FrameEncoder(), FrameDecoder()
+    seq, frame = encoder.encode_setpoints([(3, 100), (4, 1023), (6, 0)])
+    corrupt = bytearray(frame)
+    corrupt[-1] ^= 0xFF
+    items = decoder.feed(b'Enter a new position:\r\n' + bytes(corrupt) + bytes(frame))
+    assert items[0] == 'Enter a new position:'
+    assert items[-1].seq == seq
+    assert parse_setpoints(items[-1].payload) == [(3, 100), (4, 1023), (6, 0)]
+    assert decoder.errors > 0
+
+def test_engine_round_trip_over_pty():
+    with pty_loopback(motor_id=3) as ports:
+        port = next(iter(ports))
+        with SerialEngine(ports, protocol='binary') as engine:
+            for i in range(200):
+                assert engine.submit(port, i % 1024).result(timeout=2) == i % 1024
+            with pytest.raises(ValueError):
+                engine.submit(port, 2000).result(timeout=2)
+
+def test_parse_reply_rejects_short_payload():
+    assert parse_reply(struct.pack('<BH', 3, 512)) == (3, 512)
+    assert parse_reply(bytes([3, 1])) == (3, 1)
+    with pytest.raises(ValueError):
+        parse_reply(bytes([3]))
+
+def _short_then_good(fd, stop):
+    """Answer the first setpoint with a 1-byte ACK and an unknown frame type, the rest properly"""
+    decoder = FrameDecoder()
+    replies = 0
+    while not stop.is_set():
+        try:
+            data = os.read(fd, 64)
+        except OSError:
+            return
+        for item in decoder.feed(data):
+            if not isinstance(item, Frame) or item.type != FRAME_SETPOINT:
+                continue
+            (motor_id, position), = parse_setpoints(item.payload)
+            if replies == 0:
+                os.write(fd, encode_reply(item.seq, FRAME_ACK, [motor_id]) + encode_reply(item.seq, 0x55, []))
+            else:
+                os.write(fd, encode_reply(item.seq, FRAME_ACK, struct.pack('<BH', motor_id, position)))
+            replies += 1
+
+def test_short_reply_frame_does_not_kill_reader(monkeypatch):
+    monkeypatch.setattr(serial_engine, 'ACK_TIMEOUT', 0.3)
+    master, slave = pty.openpty()
+    stop = threading.Event()
+    threading.Thread(target=_short_then_good, args=(master, stop), daemon=True).start()
+    port = os.ttyname(slave)
+    ports = {port: {'id': 3, 'ser': serial.Serial(port, 9600, timeout=1)}}
+    try:
+        with SerialEngine(ports, protocol='binary') as engine:
+            with pytest.raises((TimeoutError, FutureTimeout)):
+                engine.submit(port, 100).result(timeout=2)
+            assert engine.submit(port, 200).result(timeout=2) == 200
+    finally:
+        stop.set()
+        ports[port]['ser'].close()
+        os.close(master)
+        os.close(slave)
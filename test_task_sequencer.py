@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import task_sequencer
+from motion_profile import plan_moves
+from task_sequencer import (HOME, CandidateCosts, cost_matrix, nearest_neighbour, sequence_tasks,
+                            target_angles, tour_cost, two_opt)
+
+def _targets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(-0.25, 0.25, (n, 2)), rng.uniform(-1.1, -0.8, n)])
+
+def _cycle_time(picks, places, order, profile, dwell):
+    """Cycle time of visiting the tasks in order from HOME, with every move planned separately"""
+    starts = target_angles(picks[order])
+    ends = starts if places is None else target_angles(places[order])
+    previous = np.vstack([target_angles([HOME]), ends[:-1]])
+    total = plan_moves(previous, starts, profile).duration.sum() + dwell * len(order)
+    return total + plan_moves(starts, ends, profile).duration.sum()
+
+@pytest.mark.parametrize('profile', ['trapezoid', 'scurve'])
+@pytest.mark.parametrize('pick_and_place', [False, True])
+def test_sequence_is_a_permutation_with_the_reported_cost(profile, pick_and_place):
+    picks = _targets(40)
+    places = _targets(40, seed=1) if pick_and_place else None
+    result = sequence_tasks(picks, places, profile=profile, dwell=0.1)
+    assert sorted(result['order']) == list(range(40))
+    assert result['cycle_time_after'] <= result['cycle_time_before']
+    assert result['cycle_time_before'] == pytest.approx(_cycle_time(picks, places, np.arange(40), profile, 0.1))
+    assert result['cycle_time_after'] == pytest.approx(_cycle_time(picks, places, result['order'], profile, 0.1))
+
+def test_candidate_costs_match_the_matrix():
+    starts = target_angles(_targets(200))
+    ends = target_angles(_targets(200, seed=1))
+    home_angles = target_angles([HOME])
+    costs = CandidateCosts(ends, starts, home_angles, 'trapezoid')
+    matrix = cost_matrix(ends, starts, 'trapezoid')
+    a, b = np.meshgrid(np.arange(200), np.arange(200), indexing='ij')
+    np.testing.assert_allclose(costs[a, b], matrix)
+    np.testing.assert_allclose(costs[np.full(200, 200), np.arange(200)], cost_matrix(home_angles, starts, 'trapezoid')[0])
+    assert np.all(costs[np.arange(201), np.full(201, 200)] == 0)
+
+    found = costs.neighbours >= 0
+    assert found.any(axis=1).all()
+    owner = np.repeat(np.arange(201), costs.neighbours.shape[1]).reshape(found.shape)
+    np.testing.assert_allclose(costs.neighbour_cost[found], costs[owner[found], costs.neighbours[found]])
+    assert np.all(np.diff(costs.neighbour_cost, axis=1) >= 0)
+    assert not np.any(costs.neighbours == owner)
+
+def test_candidate_path_is_close_to_dense(monkeypatch):
+    picks = _targets(400)
+    dense = sequence_tasks(picks, time_limit=5.0)
+    monkeypatch.setattr(task_sequencer, 'DENSE_LIMIT', 100)
+    sparse = sequence_tasks(picks, time_limit=5.0)
+    assert sorted(sparse['order']) == list(range(400))
+    assert sparse['cycle_time_after'] == pytest.approx(_cycle_time(picks, None, sparse['order'], 'trapezoid', 0.0))
+    assert sparse['cycle_time_before'] == pytest.approx(dense['cycle_time_before'])
+    assert sparse['cycle_time_after'] <= 1.1 * dense['cycle_time_after']
+
+def test_two_opt_reaches_a_local_optimum_on_asymmetric_costs():
+    rng = np.random.default_rng(3)
+    cost = rng.uniform(0, 1, (12, 12))
+    start = nearest_neighbour(cost, start=0)
+    tour = two_opt(cost, start, time_limit=10.0)
+    assert tour[0] == 0 and sorted(tour) == list(range(12))
+    assert tour_cost(cost, tour) <= tour_cost(cost, start)
+    # No single segment reversal improves it any more
+    best = tour_cost(cost, tour)
+    for i in range(1, 12):
+        for j in range(i + 1, 12):
+            reversed_tour = np.concatenate([tour[:i], tour[i:j + 1][::-1], tour[j + 1:]])
+            assert tour_cost(cost, reversed_tour) >= best - 1e-12
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from fk_delta import get_xyz
+from ik_delta import get_thetas
+from workspace_atlas import build_atlas
+
+@pytest.fixture(scope='module')
+def atlas(tmp_path_factory):
+    return build_atlas(str(tmp_path_factory.mktemp('atlas') / 'atlas.npy'), step=0.05, processes=1)
+
+def _fk(theta_deg):
+    poses = get_xyz(*np.radians(np.asarray(theta_deg, dtype=float)))
+    return min(poses, key=lambda pose: pose['z'])
+
+def test_clamp_reachable_target_returns_exact_ik(atlas):
+    xyz, theta_deg = atlas.clamp(0.011, 0.011, -0.9)
+    np.testing.assert_allclose(xyz, [0.011, 0.011, -0.9])
+    pose = _fk(theta_deg)
+    np.testing.assert_allclose([pose['x'], pose['y'], pose['z']], xyz, atol=1e-9)
+
+def test_clamp_unreachable_target_returns_matching_voxel(atlas):
+    assert not atlas.is_reachable(1.1, 1.1, -0.9)
+    xyz, theta_deg = atlas.clamp(1.1, 1.1, -0.9)
+    assert atlas.is_reachable(*xyz)
+    pose = _fk(theta_deg)
+    # Stored angles are float32
+    np.testing.assert_allclose([pose['x'], pose['y'], pose['z']], xyz, atol=1e-5)
+
+def test_query_batch_matches_query(atlas):
+    rng = np.random.default_rng(0)
+    xyz = np.column_stack([rng.uniform(-1.2, 1.2, (200, 2)), rng.uniform(-1.8, 0.5, 200)])
+    reachable, theta, distance = atlas.query_batch(xyz)
+    for row, ok, angles, d in zip(xyz, reachable, theta, distance):
+        result = atlas.query(*row)
+        assert result['reachable'] == ok
+        assert result['distance'] == pytest.approx(d, nan_ok=True)
+        if ok:
+            np.testing.assert_allclose(result['theta_deg'], angles)
+
+def test_voxels_match_scalar_ik(atlas):
+    rng = np.random.default_rng(1)
+    shape = atlas.shape
+    for flat in rng.choice(np.prod(shape), 300, replace=False):
+        x, y, z = atlas._center(flat)
+        record = atlas._flat[flat]
+        result = get_thetas(x, y, z)
+        expected = None
+        if result is not None:
+            joints = [result['valθ%d_deg' % i] for i in (1, 2, 3)]
+            if all(any(-90 <= t <= 90 for t in branches) for branches in joints):
+                expected = [next(t for t in branches if -90 <= t <= 90) for branches in joints]
+        assert bool(record['reachable']) == (expected is not None)
+        if expected is not None:
+            np.testing.assert_allclose(record['theta'], expected, atol=1e-4)
+
+def test_nearest_is_closest_reachable_voxel(atlas):
+    centres = np.concatenate([xyz for _, xyz, _ in atlas.reachable_points()])
+    rng = np.random.default_rng(2)
+    unreachable = np.flatnonzero(~atlas._flat['reachable'].astype(bool))
+    for flat in rng.choice(unreachable, 100, replace=False):
+        record = atlas._flat[flat]
+        best = np.min(np.linalg.norm(centres - atlas._center(flat), axis=1))
+        assert atlas._flat['reachable'][record['nearest']]
+        assert -record['distance'] == pytest.approx(best, abs=1e-5)
@@ -0,0 +1,224 @@
+import logging
+import math
+import queue
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+
+from ik_delta import get_thetas_path
+from motor_config import JOINT_MOTORS, angles_to_positions
+
+CONTROL_RATE = 50.0  # Setpoints per second
+LOOKAHEAD = 16       # Setpoints computed ahead of the scheduler
+
+class Line:
+    """Straight segment from start to end (meters)"""
+
+    def __init__(self, start, end):
+        self.start = np.asarray(start, dtype=float)
+        self.end = np.asarray(end, dtype=float)
+        self.length = float(np.linalg.norm(self.end - self.start))
+
+    def point_at(self, s):
+        if self.length == 0:
+            return self.end.copy()
+        return self.start + (self.end - self.start) * (s / self.length)
+
+class Arc:
+    """Horizontal circular arc at height z, angles in radians (counter-clockwise if end > start)"""
+
+    def __init__(self, center, radius, start_angle, end_angle):
+        self.center = np.asarray(center, dtype=float)
+        self.radius = radius
+        self.start_angle = start_angle
+        self.end_angle = end_angle
+        self.length = abs(end_angle - start_angle) * radius
+
+    def point_at(self, s):
+        sweep = self.end_angle - self.start_angle
+        angle = self.start_angle + (math.copysign(s / self.radius, sweep) if self.radius else 0.0)
+        return self.center + np.array([self.radius * math.cos(angle), self.radius * math.sin(angle), 0.0])
+
+def waypoints(points):
+    """Lazily turn a waypoint list into Line segments"""
+    points = iter(points)
+    previous = next(points, None)
+    for point in points:
+        yield Line(previous, point)
+        previous = point
+
+def sample_path(segments, speed, rate=CONTROL_RATE):
+    """Yield points spaced speed/rate apart along consecutive segments.
+
+    Leftover distance carries across segment boundaries, so the speed stays
+    constant through corners. The last point of the path is always yielded.
+    """
+    step = speed / rate
+    offset = 0.0
+    last = None
+    for segment in segments:
+        s = offset
+        while s < segment.length:
+            yield segment.point_at(s)
+            s += step
+        offset = s - segment.length
+        last = segment
+    if last is not None:
+        yield last.point_at(last.length)
+
+def setpoint_stream(samples, ports, chunk_size=LOOKAHEAD):
+    """Convert Cartesian samples into {port: position} setpoints, chunk by chunk.
+
+    Each chunk goes through get_thetas_path and the calibration tables in one
+    pass, continuing from the last angles of the previous chunk so the IK
+    branches never flip. Raises ValueError at the first sample that is
+    unreachable within the joint limits or would need a branch flip.
+    """
+    joint_of_port = {port: JOINT_MOTORS.index(info['id']) for port, info in ports.items()}
+    index = 0
+    previous = None
+    samples = iter(samples)
+    while True:
+        chunk = list(islice(samples, chunk_size))
+        if not chunk:
+            return
+        xyz = np.array(chunk)
+        angles, ok = get_thetas_path(xyz, previous=previous)
+        if not ok.all():
+            bad = int(np.argmin(ok))
+            raise ValueError(f"Sample {index + bad} at {xyz[bad]} is unreachable or needs a branch flip")
+        previous = angles[-1]
+        positions = {port: angles_to_positions(angles[:, joint], ports[port]['id'])
+                     for port, joint in joint_of_port.items()}
+        for i in range(len(chunk)):
+            yield {port: int(column[i]) for port, column in positions.items()}
+        index += len(chunk)
+
+class FixedRateScheduler:
+    """Emit items on absolute deadlines t0 + k/rate so timing error never accumulates.
+
+    A producer thread keeps up to lookahead items ready in a bounded queue.
+    When a deadline is missed by more than one period, the missed ticks are
+    skipped rather than bursting items to catch up.
+    """
+
+    def __init__(self, rate=CONTROL_RATE, lookahead=LOOKAHEAD):
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.lookahead = lookahead
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self.ticks = 0
+        self.missed = 0
+        self.underruns = 0
+        self._lateness_sum = 0.0
+        self._lateness_sq = 0.0
+        self.max_lateness = 0.0
+
+    def metrics(self):
+        """{'ticks', 'missed', 'underruns', 'jitter_mean_ms', 'jitter_std_ms', 'jitter_max_ms'}"""
+        n = max(self.ticks, 1)
+        mean = self._lateness_sum / n
+        variance = max(self._lateness_sq / n - mean**2, 0.0)
+        return {
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'underruns': self.underruns,
+            'jitter_mean_ms': 1000 * mean,
+            'jitter_std_ms': 1000 * math.sqrt(variance),
+            'jitter_max_ms': 1000 * self.max_lateness,
+        }
+
+    def run(self, items, emit):
+        """Call emit(item) for every item, one per tick"""
+        buffer = queue.Queue(maxsize=self.lookahead)
+        done = object()
+        errors = []
+
+        def produce():
+            try:
+                for item in items:
+                    buffer.put(item)
+            except Exception as e:  # Re-raised in the caller's thread
+                errors.append(e)
+            finally:
+                buffer.put(done)
+
+        producer = threading.Thread(target=produce, name="trajectory-producer", daemon=True)
+        producer.start()
+
+        start_time = time.perf_counter()
+        tick = 0
+        while True:
+            deadline = start_time + tick * self.period
+            try:
+                item = buffer.get(timeout=max(deadline - time.perf_counter(), 0) + self.period)
+            except queue.Empty:
+                self.underruns += 1
+                item = buffer.get()
+            if item is done:
+                break
+
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            now = time.perf_counter()
+            lateness = now - deadline
+            emit(item)
+
+            self.ticks += 1
+            self._lateness_sum += lateness
+            self._lateness_sq += lateness**2
+            self.max_lateness = max(self.max_lateness, lateness)
+            tick += 1
+            if lateness > self.period:
+                skipped = int(lateness / self.period)
+                self.missed += skipped
+                tick += skipped
+
+        producer.join()
+        if errors:
+            raise errors[0]
+        return self.metrics()
+
+def stream_path(segments, speed, engine, ports, rate=CONTROL_RATE, lookahead=LOOKAHEAD):
+    """Sample a path, run it through IK and calibration, and stream it to engine at rate"""
+    samples = sample_path(segments, speed, rate)
+    setpoints = setpoint_stream(samples, ports, chunk_size=lookahead)
+    scheduler = FixedRateScheduler(rate, lookahead)
+    return scheduler.run(setpoints, engine.submit_all)
+
+def main():
+    from instrumentation import setup_logging
+    from motor_config import BAUD_RATE, make_ports
+    from serial_engine import SerialEngine
+    from serial_manager import ConnectionManager
+
+    # Square with a rounded return, 0.9 m below the base
+    z = -0.9
+    path = list(waypoints([(0, 0, z), (0.1, 0, z), (0.1, 0.1, z), (0, 0.1, z)]))
+    path.append(Arc((0, 0.05, z), 0.05, math.pi / 2, 3 * math.pi / 2))
+
+    setup_logging()
+    # Per-command INFO lines would flood the console at CONTROL_RATE; warnings and errors still show
+    logging.getLogger('serial_engine').setLevel(logging.WARNING)
+    ports = make_ports()
+    manager = ConnectionManager(ports, BAUD_RATE)
+    manager.open_all()
+    engine = SerialEngine(ports, on_error=manager.mark_failed).start()
+    try:
+        metrics = stream_path(path, speed=0.05, engine=engine, ports=ports)
+        print(f"Streamed {metrics['ticks']} setpoints: {metrics['missed']} missed deadlines, "
+              f"jitter {metrics['jitter_mean_ms']:.2f} ± {metrics['jitter_std_ms']:.2f} ms "
+              f"(max {metrics['jitter_max_ms']:.2f} ms)")
+    except KeyboardInterrupt:
+        print("\nProgram interrupted by user.")
+    finally:
+        engine.stop()
+        manager.close_all()
+
+if __name__ == "__main__":
+    main()
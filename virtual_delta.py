@@ -0,0 +1,428 @@
+import argparse
+import heapq
+import os
+import pty
+import re
+import select
+import threading
+import time
+import tty
+
+from motor_config import JOINT_MOTORS, MAX_POS, MIN_POS, PORT_MOTORS, positions_to_angles
+from serial_protocol import ERROR_CHECKSUM, ERROR_RANGE, FRAME_ACK, FRAME_NAK, FRAME_SETPOINT, MAX_PAYLOAD
+
+# Timing of the real rig: Arduino bootloader + setup(), delay(50) in
+# moveMotor(), the 9600 baud link and the AX-12A no-load speed
+# (59 rpm = 354°/s over 1024 positions per 300°)
+RESET_DELAY = 0.6
+MOVE_DELAY = 0.05
+BAUD_RATE = 9600
+SERVO_SPEED = 354 * 1024 / 300  # Positions per second
+HANGUP_CHECK = 0.02  # Seconds between checks for a port being reopened
+
+BANNER = "Enter a position (0 to 1023 or negative for reverse):"
+PROMPT = "Enter a new position:"
+INVALID = "Invalid position! Enter a value between 0 and 1023."
+INITIAL_POS = 512
+
+class Timing:
+    """Delays used by the simulated sketches; Timing.fast() drops them for stress tests"""
+
+    def __init__(self, reset_delay=RESET_DELAY, move_delay=MOVE_DELAY, baud_rate=BAUD_RATE,
+                 servo_speed=SERVO_SPEED):
+        self.reset_delay = reset_delay
+        self.move_delay = move_delay
+        self.byte_time = 10.0 / baud_rate if baud_rate else 0.0  # 8N1: 10 bits per byte
+        self.servo_speed = servo_speed
+
+    @classmethod
+    def fast(cls):
+        return cls(reset_delay=0.01, move_delay=0.0, baud_rate=0, servo_speed=float('inf'))
+
+class VirtualServo:
+    """AX-12A position over time, moving at constant speed towards its goal"""
+
+    def __init__(self, speed, position=INITIAL_POS):
+        self.speed = speed
+        self._from = position
+        self.goal = position
+        self._t0 = 0.0
+
+    def position(self, t=None):
+        t = time.perf_counter() if t is None else t
+        travel = self.goal - self._from
+        done = (t - self._t0) * self.speed if t > self._t0 else 0.0  # Avoid 0 * inf with Timing.fast()
+        if done >= abs(travel):
+            return self.goal
+        return self._from + (done if travel > 0 else -done)
+
+    def move(self, goal, t):
+        self._from = self.position(t)
+        self.goal = goal
+        self._t0 = t
+
+def _to_int(text):
+    """Arduino String.toInt(): leading integer, 0 if there is none"""
+    match = re.match(r'\s*([+-]?\d+)', text)
+    return int(match.group(1)) if match else 0
+
+class VirtualSketch:
+    """One Arduino running an Absolute movement sketch behind a pty
+
+    Bytes are parsed exactly like loop() does; replies are scheduled on the
+    simulator clock so the sketch's blocking delays and the serial link speed
+    show up as latency.
+    """
+
+    def __init__(self, motor_id, timing):
+        self.motor_id = motor_id
+        self.timing = timing
+        self.servo = VirtualServo(timing.servo_speed)
+        self.master, slave = pty.openpty()
+        self.device = os.ttyname(slave)
+        tty.setraw(slave)
+        os.close(slave)  # Hang up until a client opens the port
+        os.set_blocking(self.master, False)
+        self.connected = False
+        self.commands = 0
+        self._reset(0.0)
+
+    def _reset(self, t):
+        self.input_string = ''
+        self.frame = bytearray()
+        self.ready_at = self.booted_at = t + self.timing.reset_delay
+        self.servo.move(INITIAL_POS, t)
+
+    def open(self, t):
+        """The host opened the port: DTR resets the Arduino, which prints its banner after setup()"""
+        self.connected = True
+        self._reset(t)
+        return [(self.ready_at, (BANNER + '\r\n').encode('ascii'))]
+
+    def close(self):
+        self.connected = False
+
+    def _reply(self, data):
+        """Schedule data after the sketch finishes its current work; returns (time, data)"""
+        self.ready_at += len(data) * self.timing.byte_time
+        return self.ready_at, data
+
+    def _move(self, position):
+        self.commands += 1
+        self.ready_at += self.timing.move_delay
+        self.servo.move(position, self.ready_at)
+
+    def _process_text(self):
+        new_pos = _to_int(self.input_string)
+        self.input_string = ''
+        if MIN_POS <= new_pos <= MAX_POS:
+            self._move(new_pos)
+            text = f"Moving to position: {new_pos}\r\n"
+        else:
+            text = INVALID + '\r\n'
+        return self._reply((text + PROMPT + '\r\n').encode('ascii'))
+
+    def _send_frame(self, seq, frame_type, payload):
+        body = bytes([seq, frame_type, len(payload)]) + bytes(payload)
+        return self._reply(b'\xff\xff' + body + bytes([~sum(body) & 0xFF]))
+
+    def _process_frame(self):
+        frame, self.frame = self.frame, bytearray()
+        seq, frame_type, length = frame[2], frame[3], frame[4]
+        if ~sum(frame[2:5 + length]) & 0xFF != frame[5 + length]:
+            return [self._send_frame(seq, FRAME_NAK, [self.motor_id, ERROR_CHECKSUM])]
+        if frame_type != FRAME_SETPOINT:
+            return []
+        replies = []
+        for i in range(5, 5 + length - 2, 3):
+            if frame[i] != self.motor_id:
+                continue
+            new_pos = frame[i + 1] | (frame[i + 2] << 8)
+            if MIN_POS <= new_pos <= MAX_POS:
+                self._move(new_pos)
+                replies.append(self._send_frame(seq, FRAME_ACK, [self.motor_id, new_pos & 0xFF, new_pos >> 8]))
+            else:
+                replies.append(self._send_frame(seq, FRAME_NAK, [self.motor_id, ERROR_RANGE]))
+        return replies
+
+    def feed(self, data, t):
+        """Handle bytes from the host at time t; returns [(time, reply bytes), ...]"""
+        if t < self.booted_at:
+            return []  # Bytes sent while the bootloader runs are lost
+        self.ready_at = max(self.ready_at, t + len(data) * self.timing.byte_time)
+        replies = []
+        for byte in data:
+            # 0xFF never appears in text input, so it marks the start of a binary frame
+            if self.frame or (byte == 0xFF and not self.input_string):
+                if len(self.frame) == 1 and byte != 0xFF:
+                    self.frame = bytearray()  # Not a frame header, resynchronize
+                    continue
+                self.frame.append(byte)
+                if len(self.frame) == 5 and self.frame[4] > MAX_PAYLOAD:
+                    self.frame = bytearray()  # Corrupt length byte
+                elif len(self.frame) >= 5 and len(self.frame) == self.frame[4] + 6:
+                    replies.extend(self._process_frame())
+            elif byte == ord('\n'):
+                replies.append(self._process_text())
+            else:
+                self.input_string += chr(byte)
+        return replies
+
+class VirtualRobot:
+    """Three simulated sketches, one per port, with symlinks named after the COM ports
+
+    With link_dir='.', serial.Serial('COM11') in the control scripts opens the
+    simulated port, so they run unchanged from that directory.
+    """
+
+    def __init__(self, link_dir='.', port_motors=PORT_MOTORS, timing=None):
+        self.link_dir = link_dir
+        self.timing = timing or Timing()
+        self.sketches = {}
+        self.links = {}
+        os.makedirs(link_dir, exist_ok=True)
+        for port, motor_id in port_motors.items():
+            sketch = VirtualSketch(motor_id, self.timing)
+            link = os.path.join(link_dir, port)
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(sketch.device, link)
+            self.sketches[port] = sketch
+            self.links[port] = link
+
+    def servo_positions(self, t=None):
+        """{motor_id: current servo position}"""
+        return {sketch.motor_id: sketch.servo.position(t) for sketch in self.sketches.values()}
+
+    def joint_angles(self, t=None):
+        """Current (θ1, θ2, θ3) in degrees, from the servo positions through the calibration"""
+        positions = self.servo_positions(t)
+        return tuple(float(positions_to_angles(positions[motor_id], motor_id)) for motor_id in JOINT_MOTORS)
+
+    def pose(self, t=None):
+        """Current (x, y, z) of the platform (lower FK branch), or None"""
+        from fk_delta import get_xyz_batch
+        import numpy as np
+
+        xyz, valid = get_xyz_batch(np.radians([self.joint_angles(t)]))
+        return tuple(xyz[0, 1]) if valid[0] else None
+
+    def close(self):
+        for port, sketch in self.sketches.items():
+            os.close(sketch.master)
+            if os.path.islink(self.links[port]):
+                os.remove(self.links[port])
+
+class Simulator:
+    """Runs any number of VirtualRobots from one event-loop thread"""
+
+    def __init__(self, timing=None):
+        self.timing = timing or Timing()
+        self.robots = []
+        self._by_fd = {}
+        self._poll = select.poll()
+        self._hung_up = set()  # fds with no client attached
+        self._events = []  # heap of (time, counter, fd, data)
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._wake_r, self._wake_w = os.pipe()
+        self._poll.register(self._wake_r, select.POLLIN)
+
+    def add_robot(self, link_dir='.', port_motors=PORT_MOTORS):
+        robot = VirtualRobot(link_dir, port_motors, self.timing)
+        with self._lock:
+            for sketch in robot.sketches.values():
+                self._by_fd[sketch.master] = sketch
+                self._hung_up.add(sketch.master)
+            self.robots.append(robot)
+        return robot
+
+    def add_fleet(self, count, base_dir, port_motors=PORT_MOTORS):
+        """Add count robots with their links in base_dir/robot_0, robot_1, ..."""
+        return [self.add_robot(os.path.join(base_dir, f"robot_{i}"), port_motors) for i in range(count)]
+
+    def _schedule(self, fd, replies):
+        for t, data in replies:
+            self._counter += 1
+            heapq.heappush(self._events, (t, self._counter, fd, data))
+
+    def _check_hangups(self, now):
+        """Notice ports that a client has opened since the last check"""
+        probe = select.poll()
+        for fd in self._hung_up:
+            probe.register(fd, select.POLLIN)
+        still_hung_up = {fd for fd, event in probe.poll(0) if event & select.POLLHUP}
+        for fd in self._hung_up - still_hung_up:
+            self._hung_up.discard(fd)
+            self._poll.register(fd, select.POLLIN)
+            self._schedule(fd, self._by_fd[fd].open(now))
+
+    def _hang_up(self, fd):
+        self._poll.unregister(fd)
+        self._hung_up.add(fd)
+        self._by_fd[fd].close()
+        self._events = [e for e in self._events if e[2] != fd]
+        heapq.heapify(self._events)
+
+    def _run(self):
+        next_check = 0.0
+        while self._running:
+            now = time.perf_counter()
+            with self._lock:
+                if now >= next_check:
+                    self._check_hangups(now)
+                    next_check = now + HANGUP_CHECK
+                while self._events and self._events[0][0] <= now:
+                    _, _, fd, data = heapq.heappop(self._events)
+                    try:
+                        os.write(fd, data)
+                    except BlockingIOError:
+                        pass  # Host is not reading; the bytes are lost like an overrun
+                    except OSError:
+                        self._hang_up(fd)
+                deadline = min(self._events[0][0] if self._events else next_check, next_check)
+            timeout = max(deadline - time.perf_counter(), 0)
+            for fd, event in self._poll.poll(timeout * 1000):
+                if fd == self._wake_r:
+                    os.read(fd, 64)
+                    continue
+                with self._lock:
+                    if fd not in self._by_fd or fd in self._hung_up:
+                        continue
+                    try:
+                        data = os.read(fd, 4096) if event & select.POLLIN else b''
+                    except (BlockingIOError, InterruptedError):
+                        continue
+                    except OSError:
+                        data = b''
+                    if not data:
+                        self._hang_up(fd)
+                        continue
+                    self._schedule(fd, self._by_fd[fd].feed(data, time.perf_counter()))
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="virtual-delta", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        os.write(self._wake_w, b'x')
+        if self._thread is not None:
+            self._thread.join()
+        for robot in self.robots:
+            robot.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def stress_test(robots=4, commands=200, protocol='ascii', timing=None, base_dir=None):
+    """Drive a fleet of simulated robots through SerialEngine; returns throughput and latency stats
+
+    Each robot gets its own ConnectionManager and SerialEngine, fed from its
+    own thread with commands sent one setpoint triple at a time.
+    """
+    import tempfile
+    from concurrent.futures import wait
+
+    from serial_engine import ACK_TIMEOUT, SerialEngine
+    from serial_manager import ConnectionManager
+
+    temp = None
+    if base_dir is None:
+        temp = tempfile.TemporaryDirectory()
+        base_dir = temp.name
+    timing = timing or Timing.fast()
+    results = {'robots': robots, 'commands': commands, 'protocol': protocol, 'failed': 0}
+    with Simulator(timing) as simulator:
+        fleet = simulator.add_fleet(robots, base_dir)
+        stacks = []
+        for robot in fleet:
+            ports = {link: {'id': robot.sketches[port].motor_id, 'ser': None}
+                     for port, link in robot.links.items()}
+            manager = ConnectionManager(ports)
+            stacks.append((manager, SerialEngine(ports, protocol=protocol)))
+        for manager, _ in stacks:
+            manager.open_all()
+
+        failures = []
+
+        def drive(engine):
+            for i in range(commands):
+                futures = engine.submit_all({port: (i * 37) % 1024 for port in engine.ports})
+                wait(futures.values(), timeout=ACK_TIMEOUT)
+                failures.extend(f for f in futures.values() if not f.done() or f.exception() is not None)
+
+        for _, engine in stacks:
+            engine.start()
+        start_time = time.perf_counter()
+        drivers = [threading.Thread(target=drive, args=(engine,)) for _, engine in stacks]
+        for driver in drivers:
+            driver.start()
+        for driver in drivers:
+            driver.join()
+        elapsed = time.perf_counter() - start_time
+
+        p50, p99 = [], []
+        for manager, engine in stacks:
+            engine.stop()
+            manager.close_all()
+            for stats in engine.latency_summary().values():
+                if stats['count']:
+                    p50.append(stats['p50_ms'])
+                    p99.append(stats['p99_ms'])
+        results.update({
+            'failed': len(failures),
+            'seconds': elapsed,
+            'setpoints_per_second': robots * commands * 3 / elapsed,
+            'p50_ms': max(p50) if p50 else None,
+            'p99_ms': max(p99) if p99 else None,
+        })
+    if temp is not None:
+        temp.cleanup()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the delta robot's three Arduinos on pty serial ports")
+    parser.add_argument('--robots', type=int, default=1, help="number of simulated robots (default 1)")
+    parser.add_argument('--dir', default='.', help="where to create the COM port links (default: here)")
+    parser.add_argument('--fast', action='store_true', help="skip the reset, move and baud-rate delays")
+    parser.add_argument('--stress', type=int, metavar='COMMANDS',
+                        help="run a throughput test with this many commands per robot, then exit")
+    parser.add_argument('--protocol', choices=['ascii', 'binary'], default='ascii',
+                        help="protocol used by --stress (default ascii)")
+    args = parser.parse_args()
+    timing = Timing.fast() if args.fast else Timing()
+
+    if args.stress:
+        results = stress_test(args.robots, args.stress, args.protocol, timing)
+        print(f"{results['robots']} robots x {results['commands']} commands ({results['protocol']}): "
+              f"{results['setpoints_per_second']:.0f} setpoints/s, p50 {results['p50_ms']:.2f} ms, "
+              f"p99 {results['p99_ms']:.2f} ms, {results['failed']} failed")
+        return
+
+    with Simulator(timing) as simulator:
+        if args.robots == 1:
+            robots = [simulator.add_robot(args.dir)]
+        else:
+            robots = simulator.add_fleet(args.robots, args.dir)
+        for robot in robots:
+            for port, link in robot.links.items():
+                print(f"{link} -> {robot.sketches[port].device} (motor ID {robot.sketches[port].motor_id})")
+        print("Simulating; press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\nStopping simulator.")
+
+if __name__ == "__main__":
+    main()
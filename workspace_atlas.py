@@ -0,0 +1,265 @@
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from ik_delta import get_thetas_batch
+from motor_config import MIN_ANGLE, MAX_ANGLE
+
+# Default sweep: a box enclosing everything reachable within the joint limits, in meters
+DEFAULT_BOUNDS = ((-1.2, 1.2), (-1.2, 1.2), (-1.8, 0.5))
+DEFAULT_STEP = 0.02
+
+# One record per voxel: reachability flag, chosen joint angles (degrees),
+# signed distance to the reachable boundary (meters, positive inside) and
+# the flat index of the nearest reachable voxel (used for clamping)
+ATLAS_DTYPE = np.dtype([
+    ('reachable', 'u1'),
+    ('theta', '<f4', (3,)),
+    ('distance', '<f4'),
+    ('nearest', '<i4'),
+])
+
+def choose_branch(thetas_deg, min_angle=MIN_ANGLE, max_angle=MAX_ANGLE):
+    """Pick one IK branch per joint that lies within the joint limits
+
+    thetas_deg has shape (N, 3, 2) as returned by get_thetas_batch. The first
+    branch is preferred. Returns (chosen, ok) with chosen of shape (N, 3).
+    """
+    in_range = (thetas_deg >= min_angle) & (thetas_deg <= max_angle)
+    use_second = ~in_range[:, :, 0] & in_range[:, :, 1]
+    chosen = np.where(use_second, thetas_deg[:, :, 1], thetas_deg[:, :, 0])
+    ok = np.all(in_range[:, :, 0] | in_range[:, :, 1], axis=1)
+    return chosen, ok
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+def _grid_axes(meta):
+    return [lo + step_i * np.arange(n) for lo, step_i, n in
+            zip(meta['origin'], [meta['step']] * 3, meta['shape'])]
+
+def _sweep_slab(args):
+    """Run IK over x-slab [start, stop) of the grid and store it in the atlas file"""
+    path, meta, start, stop = args
+    xs, ys, zs = _grid_axes(meta)
+    gx, gy, gz = np.meshgrid(xs[start:stop], ys, zs, indexing='ij')
+    xyz = np.stack([gx.ravel(), gy.ravel(), gz.ravel()], axis=1)
+
+    _, thetas_deg, reachable = get_thetas_batch(xyz)
+    chosen, ok = choose_branch(thetas_deg, meta['min_angle'], meta['max_angle'])
+    ok &= reachable
+
+    atlas = np.lib.format.open_memmap(path, mode='r+')
+    slab = atlas[start:stop].reshape(-1)
+    slab['reachable'] = ok
+    slab['theta'] = np.where(ok[:, None], chosen, np.nan)
+    atlas.flush()
+    del atlas
+    return stop - start
+
+def _nearest_seed(seed):
+    """Flat index of the nearest seed voxel for every voxel (jump flooding)
+
+    Returns -1 everywhere when there are no seeds.
+    """
+    shape = seed.shape
+    if not seed.any():
+        return np.full(shape, -1, dtype=np.int64)
+
+    # Voxels without a seed yet point at a far-away sentinel coordinate
+    far = 1 << 14
+    coords = np.indices(shape, dtype=np.int32)
+    nearest = np.where(seed, coords, far)
+    best = np.sum((nearest - coords)**2, axis=0)
+    candidate = np.empty_like(nearest)
+    k = 1 << int(np.ceil(np.log2(max(shape))))
+    while k >= 1:
+        for offset in np.ndindex(3, 3, 3):
+            shift = [(o - 1) * k for o in offset]
+            if not any(shift) or any(abs(s) >= n for s, n in zip(shift, shape)):
+                continue
+            candidate.fill(far)
+            dst = tuple(slice(max(s, 0), n + min(s, 0)) for s, n in zip(shift, shape))
+            src = tuple(slice(max(-s, 0), n + min(-s, 0)) for s, n in zip(shift, shape))
+            candidate[(slice(None),) + dst] = nearest[(slice(None),) + src]
+            d = np.sum((candidate - coords)**2, axis=0)
+            better = d < best
+            nearest[:, better] = candidate[:, better]
+            best[better] = d[better]
+        k //= 2
+    return np.ravel_multi_index(tuple(nearest.astype(np.int64)), shape)
+
+def _distance_field(reachable, step):
+    """Signed distance to the reachable boundary and nearest reachable voxel"""
+    shape = reachable.shape
+    coords = np.stack(np.indices(shape)).reshape(3, -1)
+
+    def distance_to(nearest):
+        flat = nearest.ravel()
+        cc = np.stack(np.unravel_index(np.maximum(flat, 0), shape))
+        d = step * np.sqrt(np.sum((cc - coords)**2, axis=0))
+        return np.where(flat >= 0, d, np.inf).reshape(shape)
+
+    to_reachable = _nearest_seed(reachable)
+    to_unreachable = _nearest_seed(~reachable)
+    distance = np.where(reachable, distance_to(to_unreachable), -distance_to(to_reachable))
+    return distance, to_reachable
+
+def build_atlas(path, bounds=DEFAULT_BOUNDS, step=DEFAULT_STEP,
+                min_angle=MIN_ANGLE, max_angle=MAX_ANGLE, processes=None):
+    """Sweep the voxel grid with IK and write the atlas to path (.npy) plus a .json header"""
+    shape = [int(round((hi - lo) / step)) + 1 for lo, hi in bounds]
+    meta = {
+        'origin': [lo for lo, _ in bounds],
+        'step': step,
+        'shape': shape,
+        'min_angle': min_angle,
+        'max_angle': max_angle,
+    }
+    start_time = time.time()
+    atlas = np.lib.format.open_memmap(path, mode='w+', dtype=ATLAS_DTYPE, shape=tuple(shape))
+    del atlas
+
+    # Hand out slabs along x so every worker writes a contiguous block
+    chunk = max(1, shape[0] // (4 * (processes or os.cpu_count() or 1)))
+    jobs = [(path, meta, i, min(i + chunk, shape[0])) for i in range(0, shape[0], chunk)]
+    with Pool(processes) as pool:
+        for _ in pool.imap_unordered(_sweep_slab, jobs):
+            pass
+
+    atlas = np.lib.format.open_memmap(path, mode='r+')
+    reachable = atlas['reachable'].astype(bool)
+    distance, nearest = _distance_field(reachable, step)
+    atlas['distance'] = distance
+    atlas['nearest'] = nearest
+    atlas.flush()
+    del atlas
+
+    meta['build_seconds'] = time.time() - start_time
+    meta['reachable_voxels'] = int(reachable.sum())
+    with open(_metadata_path(path), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return WorkspaceAtlas(path)
+
+class WorkspaceAtlas:
+    """Read-only, memory-mapped view of an atlas written by build_atlas"""
+
+    def __init__(self, path):
+        with open(_metadata_path(path)) as f:
+            self.meta = json.load(f)
+        self.data = np.load(path, mmap_mode='r')
+        self.origin = np.array(self.meta['origin'])
+        self.step = self.meta['step']
+        self.shape = tuple(self.meta['shape'])
+        self._flat = self.data.reshape(-1)
+
+    def _index(self, x, y, z):
+        """Voxel index of (x, y, z), or None outside the grid"""
+        i = int(round((x - self.origin[0]) / self.step))
+        j = int(round((y - self.origin[1]) / self.step))
+        k = int(round((z - self.origin[2]) / self.step))
+        if 0 <= i < self.shape[0] and 0 <= j < self.shape[1] and 0 <= k < self.shape[2]:
+            return i, j, k
+        return None
+
+    def _center(self, flat_index):
+        return self.origin + self.step * np.array(np.unravel_index(flat_index, self.shape))
+
+    def query(self, x, y, z):
+        """Return {'reachable', 'theta_deg', 'distance'} for the voxel containing (x, y, z)"""
+        index = self._index(x, y, z)
+        if index is None:
+            return {'reachable': False, 'theta_deg': None, 'distance': None}
+        record = self.data[index]
+        return {
+            'reachable': bool(record['reachable']),
+            'theta_deg': record['theta'].tolist() if record['reachable'] else None,
+            'distance': float(record['distance']),
+        }
+
+    def is_reachable(self, x, y, z):
+        """True if (x, y, z) falls in a reachable voxel"""
+        index = self._index(x, y, z)
+        return index is not None and bool(self.data[index]['reachable'])
+
+    def clamp(self, x, y, z):
+        """Return (xyz, theta_deg) of the target, or of the nearest reachable voxel
+
+        A target in a reachable voxel gets its exact IK angles; if exact IK
+        fails there (at the boundary), the voxel centre and its stored angles
+        are returned instead. Otherwise the result is the centre and angles of
+        the nearest reachable voxel, so xyz and theta_deg always match.
+        Returns None if the target lies outside the grid or nothing is reachable.
+        """
+        index = self._index(x, y, z)
+        if index is None:
+            return None
+        record = self.data[index]
+        if record['reachable']:
+            _, thetas_deg, reachable = get_thetas_batch([[x, y, z]])
+            chosen, ok = choose_branch(thetas_deg, self.meta['min_angle'], self.meta['max_angle'])
+            if reachable[0] and ok[0]:
+                return np.array([x, y, z]), chosen[0]
+            return self._center(np.ravel_multi_index(index, self.shape)), record['theta'].copy()
+        if record['nearest'] < 0:
+            return None
+        nearest = self._flat[record['nearest']]
+        return self._center(int(record['nearest'])), nearest['theta'].copy()
+
+    def reachable_points(self, chunk=1 << 16):
+        """Yield (flat_index, xyz, theta_deg) for the reachable voxels, up to chunk voxels at a time"""
+        reachable = np.flatnonzero(self._flat['reachable'])
+        for i in range(0, len(reachable), chunk):
+            index = reachable[i:i + chunk]
+            xyz = self.origin + self.step * np.stack(np.unravel_index(index, self.shape), axis=1)
+            yield index, xyz, self._flat['theta'][index]
+
+    def query_batch(self, xyz):
+        """Vectorized lookup for an (N, 3) array: returns (reachable, theta_deg, distance)"""
+        xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+        ijk = np.rint((xyz - self.origin) / self.step).astype(np.int64)
+        inside = np.all((ijk >= 0) & (ijk < self.shape), axis=1)
+        flat = np.ravel_multi_index(tuple(np.where(inside, ijk.T, 0)), self.shape)
+        records = self._flat[flat]
+        reachable = inside & records['reachable'].astype(bool)
+        theta = np.where(reachable[:, None], records['theta'], np.nan)
+        distance = np.where(inside, records['distance'], np.nan)
+        return reachable, theta, distance
+
+def main():
+    path = 'workspace_atlas.npy'
+    if not os.path.exists(path) or not os.path.exists(_metadata_path(path)):
+        print(f"Building workspace atlas {path} ...")
+        atlas = build_atlas(path)
+        print(f"Built {atlas.shape} grid in {atlas.meta['build_seconds']:.2f} s, "
+              f"{atlas.meta['reachable_voxels']} reachable voxels")
+    else:
+        atlas = WorkspaceAtlas(path)
+
+    try:
+        x = float(input("Enter x coordinate: "))
+        y = float(input("Enter y coordinate: "))
+        z = float(input("Enter z coordinate: "))
+
+        result = atlas.query(x, y, z)
+        if result['reachable']:
+            theta1, theta2, theta3 = result['theta_deg']
+            print(f"Reachable: θ1={theta1:.3f}°, θ2={theta2:.3f}°, θ3={theta3:.3f}°, "
+                  f"{result['distance']:.3f} m inside the boundary")
+        else:
+            clamped = atlas.clamp(x, y, z)
+            if clamped is None:
+                print("Target is outside the atlas grid.")
+            else:
+                xyz, theta_deg = clamped
+                print(f"Not reachable. Nearest reachable point: "
+                      f"x={xyz[0]:.3f}, y={xyz[1]:.3f}, z={xyz[2]:.3f} "
+                      f"(θ = {', '.join(f'{t:.3f}°' for t in theta_deg)})")
+    except ValueError:
+        print("Please enter valid numerical values for x, y, z.")
+
+if __name__ == "__main__":
+    main()